@@ -0,0 +1,221 @@
+import os
+import time
+import math
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = "__global__"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request exceeds a user or the global rate limit"""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"{scope} generation rate limit exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Classic token bucket: ``capacity`` burst, refilled at ``rate`` tokens/second"""
+
+    def __init__(self, capacity: float, rate: float, tokens: Optional[float] = None, updated: Optional[float] = None):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity if tokens is None else min(capacity, tokens)
+        self.updated = time.time() if updated is None else updated
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def take(self, cost: float, now: float) -> float:
+        """Take ``cost`` tokens; returns 0 on success, else seconds until they are available"""
+        self.refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return (cost - self.tokens) / self.rate
+
+    def give_back(self, cost: float):
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+    def level(self, now: float) -> float:
+        self.refill(now)
+        return self.tokens
+
+
+class AdmissionController:
+    """Per-user and global token buckets in front of the generation endpoints.
+
+    Every generation takes a token from the user's bucket and one from the
+    global bucket; an empty bucket rejects the request with the time until
+    the next token. Buckets live in memory, so the common case costs no
+    I/O. With ``ADMISSION_SHARED_STATE`` the buckets are also kept in Mongo
+    and updated with a compare-and-set on a version field, so all workers
+    share one limit. The in-memory buckets still act as a fast path: a
+    worker's own traffic is a lower bound on the shared usage, so a local
+    rejection never needs a Mongo round trip. If Mongo is unavailable the
+    local decision stands (fail open).
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.enabled = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+        self.user_capacity = float(os.environ.get('ADMISSION_USER_BURST', '10'))
+        self.user_rate = float(os.environ.get('ADMISSION_USER_PER_MINUTE', '6')) / 60
+        self.global_capacity = float(os.environ.get('ADMISSION_GLOBAL_BURST', '100'))
+        self.global_rate = float(os.environ.get('ADMISSION_GLOBAL_PER_MINUTE', '300')) / 60
+        self.shared_state = os.environ.get('ADMISSION_SHARED_STATE', 'false').lower() == 'true'
+        self.max_users = int(os.environ.get('ADMISSION_MAX_TRACKED_USERS', '10000'))
+        # Compare-and-set attempts before giving up on the shared bucket
+        self.max_cas_attempts = 5
+
+        self._global = TokenBucket(self.global_capacity, self.global_rate)
+        self._users: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+        self.admitted = 0
+        self.rejected = {"user": 0, "global": 0}
+        self.shared_errors = 0
+
+    def _user_bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = self._users[user_id] = TokenBucket(self.user_capacity, self.user_rate)
+            while len(self._users) > self.max_users:
+                # A user idle long enough to be evicted has a full bucket anyway
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return bucket
+
+    async def admit(self, user_id: str, cost: float = 1.0):
+        """Take ``cost`` tokens for the user, or raise AdmissionRejected"""
+        if not self.enabled:
+            return
+        # A request bigger than a whole burst (a long meal plan) drains the bucket instead of never fitting
+        cost = min(cost, self.user_capacity, self.global_capacity)
+        now = time.time()
+        user_bucket = self._user_bucket(user_id)
+        buckets = [("user", user_bucket), ("global", self._global)]
+
+        # Local fast path; tokens already taken are returned on rejection
+        taken = []
+        for scope, bucket in buckets:
+            wait = bucket.take(cost, now)
+            if wait > 0:
+                for other in taken:
+                    other.give_back(cost)
+                self._reject(scope, wait)
+            taken.append(bucket)
+
+        if self.shared_state and self.collection is not None:
+            await self._admit_shared(user_id, cost, now, taken)
+        self.admitted += 1
+
+    def _reject(self, scope: str, wait: float):
+        self.rejected[scope] += 1
+        raise AdmissionRejected(scope, wait)
+
+    async def _admit_shared(self, user_id: str, cost: float, now: float, local_buckets):
+        shared_taken = []
+        for scope, key, capacity, rate in (
+            ("user", f"user:{user_id}", self.user_capacity, self.user_rate),
+            ("global", GLOBAL_KEY, self.global_capacity, self.global_rate),
+        ):
+            try:
+                wait = await self._take_shared(key, capacity, rate, cost, now)
+            except Exception as e:
+                self.shared_errors += 1
+                logger.error(f"Shared admission state error, using local limits: {str(e)}")
+                return
+            if wait > 0:
+                for bucket in local_buckets:
+                    bucket.give_back(cost)
+                for taken_key in shared_taken:
+                    await self._give_back_shared(taken_key, cost)
+                self._reject(scope, wait)
+            shared_taken.append(key)
+
+    async def _take_shared(self, key: str, capacity: float, rate: float, cost: float, now: float) -> float:
+        """Compare-and-set take on a bucket document; returns seconds to wait, 0 if taken"""
+        for _ in range(self.max_cas_attempts):
+            doc = await self.collection.find_one({"key": key})
+            if doc is None:
+                bucket = TokenBucket(capacity, rate, updated=now)
+                wait = bucket.take(cost, now)
+                try:
+                    await self.collection.insert_one({
+                        "key": key, "tokens": bucket.tokens, "updated": bucket.updated,
+                        "version": 0, "expires_at": self._expires_at(capacity, rate)
+                    })
+                except Exception:
+                    # Another worker created it first; retry against its document
+                    continue
+                return wait
+
+            bucket = TokenBucket(capacity, rate, doc["tokens"], doc["updated"])
+            wait = bucket.take(cost, now)
+            if wait > 0:
+                return wait
+            result = await self.collection.update_one(
+                {"key": key, "version": doc["version"]},
+                {"$set": {"tokens": bucket.tokens, "updated": bucket.updated,
+                          "version": doc["version"] + 1, "expires_at": self._expires_at(capacity, rate)}}
+            )
+            if result.modified_count:
+                return 0.0
+        raise RuntimeError(f"Contention on admission bucket {key}")
+
+    async def _give_back_shared(self, key: str, cost: float):
+        try:
+            await self.collection.update_one({"key": key}, {"$inc": {"tokens": cost, "version": 1}})
+        except Exception as e:
+            logger.error(f"Failed to return admission tokens: {str(e)}")
+
+    @staticmethod
+    def _expires_at(capacity: float, rate: float) -> datetime:
+        # A bucket left alone until it is full again carries no state worth keeping
+        refill_seconds = capacity / rate if rate > 0 else 86400
+        return datetime.utcfromtimestamp(time.time() + refill_seconds + 60)
+
+    async def ensure_indexes(self):
+        if self.collection is None or not self.shared_state:
+            return
+        try:
+            await self.collection.create_index("key", unique=True)
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.error(f"Failed to create admission control indexes: {str(e)}")
+
+    def _levels(self, now: float, limit: int) -> Tuple[float, Dict[str, float]]:
+        levels = {user_id: bucket.level(now) for user_id, bucket in self._users.items()}
+        lowest = sorted(levels.items(), key=lambda item: item[1])[:limit]
+        return self._global.level(now), {user_id: round(level, 2) for user_id, level in lowest}
+
+    def get_stats(self, limit: int = 20) -> Dict[str, Any]:
+        """Bucket levels (global and the emptiest user buckets) and counters"""
+        global_level, user_levels = self._levels(time.time(), limit)
+        return {
+            "enabled": self.enabled,
+            "shared_state": self.shared_state,
+            "user_bucket": {"burst": self.user_capacity, "per_minute": round(self.user_rate * 60, 2)},
+            "global_bucket": {"burst": self.global_capacity, "per_minute": round(self.global_rate * 60, 2),
+                              "level": round(global_level, 2)},
+            "tracked_users": len(self._users),
+            "lowest_user_levels": user_levels,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "shared_errors": self.shared_errors
+        }
@@ -0,0 +1,175 @@
+import os
+import math
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+OBJECTIVES = ("price", "quality")
+
+
+class CartSelection:
+    """One chosen option per ingredient, and what the cart adds up to"""
+
+    def __init__(self, choices: List[int], total_price: float, total_quality: float,
+                 within_budget: bool, price_unit: float):
+        self.choices = choices
+        self.total_price = total_price
+        self.total_quality = total_quality
+        self.within_budget = within_budget
+        # Price resolution the budget was checked at (cents, or coarser for large budgets)
+        self.price_unit = price_unit
+
+
+class CartOptimizer:
+    """Pick one product per ingredient for a cart under a budget.
+
+    Objective ``price`` is the cheapest cart: with one product per
+    ingredient the cheapest combination is the cheapest option of each,
+    so it is a row-wise argmin over the padded price matrix (equal prices
+    go to the higher quality option). Objective ``quality`` maximizes the
+    summed quality score with the total price at most the budget: a
+    multiple-choice knapsack, solved with a dynamic program over the
+    budget in cents where each ingredient's step is vectorized over all
+    budget amounts at once, restricted to the totals from which the
+    remaining ingredients can still fit in the budget. Large budgets are
+    solved at a coarser price unit (prices rounded up, so the cart found
+    never exceeds the budget) to keep the table at most ``max_cells`` wide. When even the cheapest
+    cart is over budget, the cheapest cart is returned as not within
+    budget.
+    """
+
+    def __init__(self):
+        self.max_cells = int(os.environ.get('CART_OPTIMIZER_MAX_CELLS', '20000'))
+
+        self.runs = 0
+        self.over_budget = 0
+        self.total_ms = 0.0
+
+    def optimize(self, prices: List[List[float]], qualities: List[List[float]],
+                 max_budget: Optional[float] = None, objective: str = "price") -> CartSelection:
+        """Choose an option index per ingredient; every ingredient needs at least one option"""
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of: {', '.join(OBJECTIVES)}")
+        if any(not options for options in prices):
+            raise ValueError("every ingredient needs at least one option")
+        if any(not math.isfinite(price) or price < 0 for options in prices for price in options):
+            raise ValueError("prices must be finite and not negative")
+        started = time.perf_counter()
+
+        width = max((len(options) for options in prices), default=0)
+        price_matrix = np.full((len(prices), width), np.inf)
+        quality_matrix = np.full((len(prices), width), -np.inf)
+        for row, (row_prices, row_qualities) in enumerate(zip(prices, qualities)):
+            price_matrix[row, :len(row_prices)] = row_prices
+            quality_matrix[row, :len(row_qualities)] = row_qualities
+
+        cheapest = self._best_per_row(price_matrix, quality_matrix, prefer="price")
+        cheapest_total = float(self._picked(price_matrix, cheapest).sum())
+        within_budget = max_budget is None or cheapest_total <= max_budget + 1e-9
+        price_unit = 0.01
+
+        if not within_budget:
+            choices = cheapest
+            self.over_budget += 1
+        elif objective == "price":
+            choices = cheapest
+        elif max_budget is None:
+            choices = self._best_per_row(price_matrix, quality_matrix, prefer="quality")
+        else:
+            choices, price_unit = self._knapsack(price_matrix, quality_matrix, max_budget, cheapest)
+
+        self.runs += 1
+        self.total_ms += (time.perf_counter() - started) * 1000
+        return CartSelection(
+            choices=[int(choice) for choice in choices],
+            total_price=round(float(self._picked(price_matrix, choices).sum()), 2),
+            total_quality=round(float(self._picked(quality_matrix, choices).sum()), 4),
+            within_budget=within_budget,
+            price_unit=price_unit
+        )
+
+    @staticmethod
+    def _picked(matrix: np.ndarray, choices: np.ndarray) -> np.ndarray:
+        return matrix[np.arange(len(matrix)), choices]
+
+    @staticmethod
+    def _best_per_row(price_matrix: np.ndarray, quality_matrix: np.ndarray, prefer: str) -> np.ndarray:
+        """Row-wise best option on one criterion, ties broken on the other"""
+        if prefer == "price":
+            ties = price_matrix == price_matrix.min(axis=1, keepdims=True)
+            return np.where(ties, quality_matrix, -np.inf).argmax(axis=1)
+        ties = quality_matrix == quality_matrix.max(axis=1, keepdims=True)
+        return np.where(ties, price_matrix, np.inf).argmin(axis=1)
+
+    def _knapsack(self, price_matrix: np.ndarray, quality_matrix: np.ndarray,
+                  max_budget: float, fallback: np.ndarray):
+        """Max total quality with total price <= budget; returns (choices, price unit)"""
+        budget_cents = int(math.floor(max_budget * 100 + 1e-6))
+        unit = max(1, math.ceil(budget_cents / self.max_cells))
+        capacity = budget_cents // unit
+        padded = ~np.isfinite(price_matrix)
+        costs = np.ceil(np.round(np.where(padded, 0, price_matrix) * 100) / unit).astype(np.int64)
+        # Padding and anything dearer than the whole budget can never be picked
+        costs[padded | (costs > capacity)] = capacity + 1
+
+        rows, width = costs.shape
+        cheapest_costs = costs.min(axis=1)
+        # Budget the ingredients after each row must leave room for
+        still_needed = np.concatenate([np.cumsum(cheapest_costs[::-1])[::-1][1:], [0]])
+
+        if int(cheapest_costs.sum()) > capacity:
+            # Rounding prices up to a coarse unit pushed even the cheapest cart over
+            return fallback, unit / 100
+
+        qualities = quality_matrix.astype(np.float32)
+
+        # best[b - low]: highest quality of a cart for the rows so far costing
+        # exactly b units, for the window of totals [low, high] that can still
+        # be completed within the budget. Each row's table is kept, and the
+        # choices are recovered from them afterwards.
+        low = high = 0
+        best = np.zeros(1, dtype=np.float32)
+        tables = [(low, best)]
+        for row in range(rows):
+            affordable = costs[row] <= capacity
+            new_low = low + int(cheapest_costs[row])
+            new_high = min(high + int(costs[row][affordable].max()), capacity - int(still_needed[row]))
+            new_best = np.full(new_high - new_low + 1, -np.inf, dtype=np.float32)
+            for option in np.flatnonzero(affordable):
+                cost = int(costs[row, option])
+                start, stop = max(new_low, low + cost), min(new_high, high + cost)
+                if start <= stop:
+                    target = new_best[start - new_low:stop - new_low + 1]
+                    np.maximum(target, best[start - cost - low:stop - cost - low + 1] + qualities[row, option], out=target)
+            low, high, best = new_low, new_high, new_best
+            tables.append((low, best))
+
+        top = best.max()
+        if not np.isfinite(top):
+            # No cart within the budget after all (kept as a guard)
+            return fallback, unit / 100
+        # Cheapest of the carts with the top quality
+        spent = low + int(np.flatnonzero(best == top)[0])
+        choices = np.empty(rows, dtype=np.int64)
+        for row in range(rows - 1, -1, -1):
+            row_low, row_best = tables[row + 1]
+            prev_low, prev_best = tables[row]
+            value = row_best[spent - row_low]
+            for option in range(width):
+                cost = int(costs[row, option])
+                index = spent - cost - prev_low
+                # Same float32 sum as the forward pass, so the option that made the value matches exactly
+                if cost <= capacity and 0 <= index < len(prev_best) and prev_best[index] + qualities[row, option] == value:
+                    break
+            choices[row] = option
+            spent -= cost
+        return choices, unit / 100
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_cells": self.max_cells,
+            "runs": self.runs,
+            "over_budget": self.over_budget,
+            "avg_ms": round(self.total_ms / self.runs, 3) if self.runs else 0.0
+        }
@@ -0,0 +1,151 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Async callable running the product searches, returning the cart-options response
+CartOptionsBuild = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class CartOptionsPrecompute:
+    """Cart options computed ahead of the request, stored in Mongo.
+
+    After a recipe is saved, ``schedule`` runs its product searches in a
+    background task and stores the cart-options response in the
+    ``grocery_cart_options`` collection, keyed on recipe id and product
+    catalog version (a new catalog means new products, so older entries
+    simply stop matching). A later cart-options call is then one indexed
+    read. A call arriving while the searches are still running waits for
+    them instead of searching again. Entries expire through a TTL index,
+    since the prices in them go stale; responses without any products are
+    not stored, as a failed search also comes back empty.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.enabled = os.environ.get('CART_PRECOMPUTE_ENABLED', 'false').lower() == 'true'
+        self.ttl_seconds = int(os.environ.get('CART_PRECOMPUTE_TTL_SECONDS', '3600'))
+        # Background computations running at once; recipes beyond this are computed on request
+        self.max_pending = int(os.environ.get('CART_PRECOMPUTE_MAX_PENDING', '50'))
+
+        self._pending: Dict[Tuple[str, str], asyncio.Task] = {}
+
+        self.scheduled = 0
+        self.skipped = 0
+        self.stored = 0
+        self.failed = 0
+        self.hits = 0
+        self.joined = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        if self.collection is None or not self.enabled:
+            return
+        try:
+            await self.collection.create_index([("recipe_id", 1), ("catalog_version", 1)], unique=True)
+            await self.collection.create_index("computed_at", expireAfterSeconds=self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"Failed to create cart options indexes: {str(e)}")
+
+    def schedule(self, recipe_id: str, catalog_version: str, build: CartOptionsBuild):
+        """Compute and store a recipe's cart options in the background"""
+        if not self.enabled or self.collection is None:
+            return
+        key = (recipe_id, catalog_version)
+        if key in self._pending:
+            return
+        if len(self._pending) >= self.max_pending:
+            self.skipped += 1
+            return
+
+        async def compute() -> Optional[Dict[str, Any]]:
+            try:
+                options = await build()
+                await self.put(recipe_id, catalog_version, options)
+                return options
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Cart options precompute failed for {recipe_id}: {str(e)}")
+                return None
+            finally:
+                self._pending.pop(key, None)
+
+        self.scheduled += 1
+        self._pending[key] = asyncio.create_task(compute(), name=f"cart-options:{recipe_id}")
+
+    async def get(self, recipe_id: str, user_id: str, catalog_version: str,
+                  join_pending: bool = True) -> Optional[Dict[str, Any]]:
+        """The stored cart options for the user's recipe, or None to compute them
+
+        With ``join_pending`` a computation still running is waited for;
+        without it only a stored result counts.
+        """
+        if not self.enabled or self.collection is None:
+            return None
+
+        task = self._pending.get((recipe_id, catalog_version)) if join_pending else None
+        if task is not None:
+            # Shielded, so a client going away doesn't cancel the shared computation
+            options = await asyncio.shield(task)
+            if options is not None and options.get("user_id") == user_id:
+                self.joined += 1
+                return options
+
+        try:
+            doc = await self.collection.find_one(
+                {"recipe_id": recipe_id, "catalog_version": catalog_version, "user_id": user_id},
+                {"_id": 0, "options": 1}
+            )
+        except Exception as e:
+            logger.error(f"Failed to read cart options: {str(e)}")
+            return None
+        if doc is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return doc["options"]
+
+    async def put(self, recipe_id: str, catalog_version: str, options: Dict[str, Any]):
+        """Store a cart-options response for later requests"""
+        if not self.enabled or self.collection is None or not options.get("total_products"):
+            return
+        try:
+            await self.collection.update_one(
+                {"recipe_id": recipe_id, "catalog_version": catalog_version},
+                {"$set": {
+                    "user_id": options.get("user_id"),
+                    "options": options,
+                    # A datetime, so the TTL index applies
+                    "computed_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+            self.stored += 1
+        except Exception as e:
+            logger.error(f"Failed to store cart options: {str(e)}")
+
+    async def stop(self):
+        """Cancel computations still running"""
+        for task in list(self._pending.values()):
+            task.cancel()
+        self._pending.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.joined + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "scheduled": self.scheduled,
+            "skipped": self.skipped,
+            "stored": self.stored,
+            "failed": self.failed,
+            "hits": self.hits,
+            "joined": self.joined,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.joined) / requests, 3) if requests else 0.0
+        }
@@ -0,0 +1,161 @@
+import os
+import copy
+import json
+import time
+import random
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCache:
+    """Two-tier cache for parsed LLM generations.
+
+    Entries are keyed on a canonical hash of the prompt-relevant request
+    fields. The in-process LRU tier answers repeat requests without a
+    database round trip; the Mongo tier is shared by all workers and expires
+    entries through a TTL index.
+
+    Variety policy: each key holds a pool of up to ``variants_per_key``
+    generations. Until the pool is full every lookup is a miss, so the caller
+    generates a fresh variant and adds it. Once full, lookups serve a random
+    variant, so users asking for the same thing don't all see the same recipe.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.enabled = os.environ.get('GENERATION_CACHE_ENABLED', 'true').lower() == 'true'
+        self.max_keys = int(os.environ.get('GENERATION_CACHE_MAX_KEYS', '1024'))
+        self.ttl_seconds = int(os.environ.get('GENERATION_CACHE_TTL_SECONDS', '86400'))
+        self.variants_per_key = max(1, int(os.environ.get('GENERATION_CACHE_VARIANTS', '5')))
+
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.fallback_hits = 0
+
+    @staticmethod
+    def make_key(namespace: str, fields: Dict[str, Any]) -> str:
+        """Canonical hash of the prompt-relevant fields of a request"""
+        canonical = json.dumps(fields, sort_keys=True, separators=(',', ':'), default=str)
+        digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+        return f"{namespace}:{digest}"
+
+    async def ensure_indexes(self):
+        """Create the key lookup and TTL indexes on the Mongo tier"""
+        if self.collection is None:
+            return
+        try:
+            await self.collection.create_index("key")
+            await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"Failed to create generation cache indexes: {str(e)}")
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached generation for the key, or None if a new one is needed"""
+        if not self.enabled:
+            return None
+
+        variants = self._get_memory(key)
+        if variants is not None and len(variants) >= self.variants_per_key:
+            self.memory_hits += 1
+            return copy.deepcopy(random.choice(variants))
+
+        variants = await self._load_mongo(key)
+        if variants is not None:
+            self._set_memory(key, variants)
+            if len(variants) >= self.variants_per_key:
+                self.mongo_hits += 1
+                return copy.deepcopy(random.choice(variants))
+
+        self.misses += 1
+        return None
+
+    async def get_fallback(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return any cached variant regardless of the variety policy
+        
+        Used when a fresh generation failed, so it works even while the
+        cache is disabled for normal lookups.
+        """
+        variants = self._get_memory(key) or await self._load_mongo(key)
+        if variants:
+            self.fallback_hits += 1
+            return copy.deepcopy(random.choice(variants))
+        return None
+
+    async def put(self, key: str, data: Dict[str, Any]):
+        """Add a freshly generated variant to the key's pool"""
+        if not self.enabled:
+            return
+
+        variants = self._get_memory(key) or []
+        if len(variants) >= self.variants_per_key:
+            return
+        variants = variants + [copy.deepcopy(data)]
+        self._set_memory(key, variants)
+        self.stores += 1
+
+        if self.collection is not None:
+            try:
+                await self.collection.insert_one({
+                    "key": key,
+                    "data": data,
+                    "created_at": datetime.utcnow()
+                })
+            except Exception as e:
+                logger.error(f"Failed to store generation in cache: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.mongo_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "keys_in_memory": len(self._lru),
+            "variants_per_key": self.variants_per_key,
+            "ttl_seconds": self.ttl_seconds,
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "fallback_hits": self.fallback_hits,
+            "hit_ratio": round((self.memory_hits + self.mongo_hits) / lookups, 3) if lookups else 0.0
+        }
+
+    # Tier helpers
+
+    def _get_memory(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.monotonic():
+            del self._lru[key]
+            return None
+        self._lru.move_to_end(key)
+        return entry["variants"]
+
+    def _set_memory(self, key: str, variants: List[Dict[str, Any]]):
+        self._lru[key] = {
+            "variants": variants,
+            "expires_at": time.monotonic() + self.ttl_seconds
+        }
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_keys:
+            self._lru.popitem(last=False)
+
+    async def _load_mongo(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        if self.collection is None:
+            return None
+        try:
+            docs = await self.collection.find({"key": key}).to_list(self.variants_per_key)
+        except Exception as e:
+            logger.error(f"Failed to read generation cache: {str(e)}")
+            return None
+        if not docs:
+            return None
+        return [doc["data"] for doc in docs]
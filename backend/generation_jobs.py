@@ -0,0 +1,193 @@
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+# Async callable running one job: takes the stored request, returns the result document
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+# Maps a handler exception to the error message stored on the job
+ErrorDetailFn = Callable[[Exception], str]
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class GenerationJobs:
+    """Background generation jobs stored in Mongo.
+
+    Submitting a job only writes a ``queued`` document, so the HTTP request
+    returns immediately. A pool of workers claims queued jobs atomically
+    (find_one_and_update), which also lets several server processes share
+    the queue, runs them and stores the result or error on the job. Jobs
+    expire through a TTL index, so results survive client reconnects for a
+    while without piling up.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.enabled = os.environ.get('GENERATION_JOBS_ENABLED', 'true').lower() == 'true'
+        self.workers = int(os.environ.get('GENERATION_JOB_WORKERS', '4'))
+        self.ttl_seconds = int(os.environ.get('GENERATION_JOB_TTL_SECONDS', '86400'))
+        # How often idle workers look for jobs submitted by other processes
+        self.poll_interval = float(os.environ.get('GENERATION_JOB_POLL_SECONDS', '2'))
+        # Running jobs not updated for this long belong to a dead process and are retried
+        self.stale_seconds = float(os.environ.get('GENERATION_JOB_STALE_SECONDS', '600'))
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._error_detail: Optional[ErrorDetailFn] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._updates: Dict[str, asyncio.Event] = {}
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def register(self, kind: str, handler: JobHandler):
+        """Register the handler that runs jobs of a kind"""
+        self._handlers[kind] = handler
+
+    def set_error_detail(self, error_detail: ErrorDetailFn):
+        self._error_detail = error_detail
+
+    async def submit(self, kind: str, request: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Store a queued job and wake a worker"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "status": "queued",
+            "user_id": user_id,
+            "request": request,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        await self.collection.insert_one(job)
+        self.submitted += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": job_id})
+
+    async def wait_for_update(self, job_id: str, timeout: float):
+        """Wait until this process updates the job, or the timeout passes
+
+        Jobs run by another process are only noticed when the caller reads
+        the job again after the timeout.
+        """
+        event = self._updates.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if self._updates.get(job_id) is event:
+                del self._updates[job_id]
+
+    async def ensure_indexes(self):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.create_index("id", unique=True)
+            await self.collection.create_index([("status", 1), ("created_at", 1)])
+            await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"Failed to create generation job indexes: {str(e)}")
+
+    async def start(self):
+        if not self.enabled or self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"Started {self.workers} generation job workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def get_stats(self) -> Dict[str, Any]:
+        counts = {}
+        if self.collection is not None:
+            for status in ("queued", "running") + TERMINAL_STATUSES:
+                try:
+                    counts[status] = await self.collection.count_documents({"status": status})
+                except Exception:
+                    counts[status] = None
+        return {
+            "enabled": self.enabled,
+            "workers": len(self._tasks),
+            "jobs": counts,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+    # Workers
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "running", "updated_at": {"$lt": now - timedelta(seconds=self.stale_seconds)}}
+            ]},
+            {"$set": {"status": "running", "updated_at": now}},
+            sort=[("created_at", 1)]
+        )
+
+    def _notify(self, job_id: str):
+        event = self._updates.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _finish(self, job_id: str, update: Dict[str, Any]):
+        update["updated_at"] = datetime.utcnow()
+        await self.collection.update_one({"id": job_id}, {"$set": update})
+        self._notify(job_id)
+
+    async def _run_job(self, job: Dict[str, Any]):
+        self._notify(job["id"])
+        try:
+            result = await self._handlers[job["kind"]](job["request"])
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Generation job {job['id']} failed: {str(e)}")
+            detail = self._error_detail(e) if self._error_detail else "Generation failed"
+            await self._finish(job["id"], {"status": "failed", "error": detail})
+            return
+        self.completed += 1
+        await self._finish(job["id"], {"status": "completed", "result": result})
+
+    async def _run(self):
+        while True:
+            # Cleared before claiming so a job submitted meanwhile is not missed
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+                if job is not None:
+                    await self._run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Generation job worker error: {str(e)}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,151 @@
+import json
+from typing import List, Dict, Any, Optional
+
+_WHITESPACE = ' \t\r\n'
+_SCALAR_END = ',}]' + _WHITESPACE
+
+
+class IncrementalJSONParser:
+    """Push parser that reports top-level JSON values as soon as they complete.
+
+    Chunks of model output are fed in as they stream. Any text before the
+    first '{' (such as a ```json fence) is skipped. Events are emitted for:
+
+    * ``field``: a top-level key whose scalar or object value just completed
+    * ``item``:  an element of a top-level array that just completed
+
+    The parser is deliberately lenient: it never raises on malformed input,
+    it just stops reporting. The authoritative parse happens once the full
+    text is available.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.done = False
+        self._stack: List[Dict[str, Any]] = []
+        self._in_string = False
+        self._escape = False
+        self._string_buf: List[str] = []
+        self._scalar_buf: List[str] = []
+        self._events: List[Dict[str, Any]] = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of text and return the events it completed"""
+        self._events = []
+        for ch in chunk:
+            if self.done:
+                break
+            self._consume(ch)
+        return self._events
+
+    # Character handling
+
+    def _consume(self, ch: str):
+        if not self.started:
+            if ch == '{':
+                self.started = True
+                self._open('object')
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._string_buf.append(ch)
+                self._escape = False
+            elif ch == '\\':
+                self._string_buf.append(ch)
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                raw = ''.join(self._string_buf)
+                self._string_buf = []
+                try:
+                    value = json.loads('"' + raw + '"')
+                except ValueError:
+                    value = raw
+                self._on_string(value)
+            else:
+                self._string_buf.append(ch)
+            return
+
+        if self._scalar_buf and ch in _SCALAR_END:
+            self._flush_scalar()
+
+        if ch in _WHITESPACE:
+            return
+        if ch == '"':
+            self._in_string = True
+        elif ch == '{':
+            self._open('object')
+        elif ch == '[':
+            self._open('array')
+        elif ch in '}]':
+            self._close()
+        elif ch == ':':
+            if self._stack:
+                self._stack[-1]['expect'] = 'value'
+        elif ch == ',':
+            if self._stack and self._stack[-1]['type'] == 'object':
+                self._stack[-1]['expect'] = 'key'
+        else:
+            self._scalar_buf.append(ch)
+
+    def _on_string(self, value: str):
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top['type'] == 'object' and top['expect'] == 'key':
+            top['key'] = value
+            top['expect'] = 'colon'
+        else:
+            self._complete_value(value)
+
+    def _flush_scalar(self):
+        raw = ''.join(self._scalar_buf)
+        self._scalar_buf = []
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        self._complete_value(value)
+
+    def _open(self, kind: str):
+        self._stack.append({
+            'type': kind,
+            'value': {} if kind == 'object' else [],
+            'key': None,
+            'expect': 'key' if kind == 'object' else 'value'
+        })
+
+    def _close(self):
+        if not self._stack:
+            return
+        container = self._stack.pop()
+        if not self._stack:
+            self.done = True
+            return
+        self._complete_value(container['value'], closing=container['type'])
+
+    # Value placement and event emission
+
+    def _complete_value(self, value: Any, closing: Optional[str] = None):
+        if not self._stack:
+            return
+        parent = self._stack[-1]
+        depth = len(self._stack)
+
+        if parent['type'] == 'object':
+            key = parent['key']
+            parent['value'][key] = value
+            parent['expect'] = 'comma'
+            # Arrays already reported their elements one by one
+            if depth == 1 and closing != 'array':
+                self._events.append({"event": "field", "key": key, "value": value})
+        else:
+            index = len(parent['value'])
+            parent['value'].append(value)
+            if depth == 2:
+                owner = self._stack[0]
+                self._events.append({
+                    "event": "item",
+                    "key": owner['key'],
+                    "index": index,
+                    "value": value
+                })
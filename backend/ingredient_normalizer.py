@@ -0,0 +1,187 @@
+import os
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+# Checked in order; the first entry found anywhere in the ingredient wins
+BEVERAGE_SUBSTITUTIONS = {
+    'ice cubes': 'ice',
+    'ice cube': 'ice',
+    'tapioca pearls': 'tapioca pearls',
+    'boba pearls': 'tapioca pearls',
+    'bubble tea pearls': 'tapioca pearls',
+    'black tea bags': 'black tea',
+    'tea bags': 'black tea',
+    'green tea bags': 'green tea',
+    'oat milk': 'oat milk',
+    'almond milk': 'almond milk',
+    'coconut milk': 'coconut milk',
+    'whole milk': 'milk',
+    'skim milk': 'milk',
+    '2% milk': 'milk',
+    'heavy cream': 'heavy cream',
+    'whipped cream': 'whipped cream',
+    'brown sugar syrup': 'brown sugar',
+    'simple syrup': 'sugar',
+    'honey syrup': 'honey',
+    'maple syrup': 'maple syrup',
+    'agave syrup': 'agave',
+    'mint leaves': 'mint',
+    'fresh mint': 'mint',
+    'lemon juice': 'lemons',
+    'lime juice': 'limes',
+    'orange juice': 'oranges',
+    'pineapple juice': 'pineapple',
+    'coconut water': 'coconut water',
+    'sparkling water': 'sparkling water',
+    'club soda': 'club soda',
+    'soda water': 'club soda'
+}
+
+# Spice blends and cooking staples: a match replaces the whole ingredient
+SPICE_SUBSTITUTIONS = {
+    'italian seasoning': 'italian seasoning',
+    'garlic powder': 'garlic powder',
+    'onion powder': 'onion powder',
+    'black pepper': 'black pepper',
+    'white pepper': 'white pepper',
+    'sea salt': 'sea salt',
+    'kosher salt': 'salt',
+    'table salt': 'salt',
+    'olive oil': 'olive oil',
+    'vegetable oil': 'vegetable oil',
+    'canola oil': 'canola oil',
+    'coconut oil': 'coconut oil',
+    'butter': 'butter',
+    'unsalted butter': 'butter'
+}
+
+_LEADING_MEASURE = re.compile(r'^(\d+[\s\/\-]*\d*\s*)?(cups?|cup|tbsp|tablespoons?|tablespoon|tsp|teaspoons?|teaspoon|lbs?|pounds?|pound|oz|ounces?|ounce|cans?|can|jars?|jar|bottles?|bottle|packages?|package|bags?|bag|cloves?|clove|slices?|slice|pieces?|piece|pinch|dash)\s+')
+_PREPARATION = re.compile(r'\b(fresh|frozen|dried|chopped|diced|minced|sliced|grated|crushed|ground|whole|raw|cooked|boiled|steamed|roasted|baked|organic|extra|virgin|pure|natural|unsalted|salted|low[- ]fat|fat[- ]free|sugar[- ]free)\b\s*')
+_PARENTHESES = re.compile(r'\([^)]*\)')
+_LEADING_QUANTITY = re.compile(r'^\d+[\s\-\/]*\d*\s*')
+_METRIC_QUANTITY = re.compile(r'\b\d+[\s\-\/]*\d*\s*(ml|l|g|kg|mg)\b')
+_WHITESPACE = re.compile(r'\s+')
+_SUFFIX = re.compile(r'\s+(to taste|as needed|optional|for garnish|for serving)$')
+_FALLBACK_QUANTITY = re.compile(r'^\d+\s*')
+_GENERIC_WORDS = frozenset(['for', 'and', 'or', 'with', 'of', 'the', 'a', 'an'])
+
+
+class SubstitutionMatcher:
+    """Aho-Corasick automaton over the keys of a substitution table.
+
+    ``first`` finds the earliest table entry (in table order) occurring
+    anywhere in a text with one pass over the text, instead of one
+    substring search per entry.
+    """
+
+    def __init__(self, table: Dict[str, str]):
+        self.entries: List[Tuple[str, str]] = list(table.items())
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Lowest table index among patterns ending at each state (via failure links too)
+        self._best: List[Optional[int]] = [None]
+
+        for index, (pattern, _) in enumerate(self.entries):
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            if self._best[state] is None or index < self._best[state]:
+                self._best[state] = index
+
+        # Breadth-first, so a state's failure target is finished before the state itself
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                inherited = self._best[self._fail[child]]
+                if inherited is not None and (self._best[child] is None or inherited < self._best[child]):
+                    self._best[child] = inherited
+
+    def first(self, text: str) -> Optional[Tuple[str, str]]:
+        """The (original, replacement) entry listed first among those in ``text``"""
+        goto, fail, best_at = self._goto, self._fail, self._best
+        best = None
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = best_at[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return self.entries[best] if best is not None else None
+
+
+class IngredientNormalizer:
+    """Reduce a recipe ingredient line to the core product to search for.
+
+    "2 cups fresh chopped spinach (packed)" becomes "spinach". Patterns are
+    compiled and the substitution tables turned into automata once at
+    import, and results are memoized since recipes repeat the same
+    ingredient lines over and over.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        if cache_size is None:
+            cache_size = int(os.environ.get('INGREDIENT_NORMALIZER_CACHE_SIZE', '8192'))
+        self.beverages = SubstitutionMatcher(BEVERAGE_SUBSTITUTIONS)
+        self.spices = SubstitutionMatcher(SPICE_SUBSTITUTIONS)
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _normalize(self, ingredient: str) -> str:
+        text = ingredient.lower().strip()
+
+        # Quantities and units at the start, preparation words, notes in parentheses
+        text = _LEADING_MEASURE.sub('', text)
+        text = _PREPARATION.sub('', text)
+        text = _PARENTHESES.sub('', text)
+
+        match = self.beverages.first(text)
+        if match is not None:
+            text = text.replace(match[0], match[1])
+
+        match = self.spices.first(text)
+        if match is not None:
+            text = match[1]
+
+        # Remaining quantities and metric measurements
+        text = _LEADING_QUANTITY.sub('', text)
+        text = _METRIC_QUANTITY.sub('', text)
+
+        text = _WHITESPACE.sub(' ', text).strip()
+        text = _SUFFIX.sub('', text)
+
+        # Too short or generic: only drop the leading quantity of the original
+        if len(text) < 2 or text in _GENERIC_WORDS:
+            fallback = _FALLBACK_QUANTITY.sub('', ingredient.lower().strip())
+            return fallback if len(fallback) > 2 else ingredient.lower().strip()
+
+        return text.strip() if text.strip() else ingredient
+
+    def get_stats(self) -> Dict[str, Any]:
+        info = self.normalize.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "cache_size": info.maxsize,
+            "cached": info.currsize,
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_ratio": round(info.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+ingredient_normalizer = IngredientNormalizer()
@@ -0,0 +1,242 @@
+import os
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+from llm_metrics import metric_category
+from llm_providers import LLMProvider, LLMProviderError, create_provider
+from llm_resilience import CircuitBreaker, Hedger
+
+logger = logging.getLogger(__name__)
+
+
+class LLMTimeoutError(LLMProviderError):
+    """Raised when a completion does not finish within the per-call timeout"""
+
+
+def _estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    # ~4 characters per token
+    return sum(len(message.get("content", "")) for message in messages) // 4
+
+
+class LLMResponse:
+    """Result of a single chat completion"""
+
+    def __init__(self, content: str, model: str, prompt_tokens: int = 0,
+                 completion_tokens: int = 0, latency_ms: float = 0.0):
+        self.content = content
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.latency_ms = latency_ms
+
+
+class AsyncLLMClient:
+    """Shared non-blocking LLM client used by the generation endpoints.
+
+    All completions go through a semaphore so one worker can keep many
+    generations in flight without letting them starve the event loop or
+    exceed the upstream rate limits. The completions themselves come from a
+    pluggable provider (OpenAI, or the local stand-in for offline load tests).
+
+    Completions are hedged against slow outliers, and a circuit breaker
+    makes calls fail fast while the upstream keeps failing.
+    """
+
+    def __init__(self, provider: Optional[LLMProvider] = None):
+        self.max_concurrency = int(os.environ.get('LLM_MAX_CONCURRENCY', '32'))
+        self.timeout_seconds = float(os.environ.get('LLM_TIMEOUT_SECONDS', '60'))
+        self._provider = provider
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.breaker = CircuitBreaker()
+        self.hedger = Hedger()
+        # Optional per-call recorder (LLMMetrics); attached by the server
+        self.metrics = None
+
+        # Running metrics since process start
+        self.in_flight = 0
+        self.total_calls = 0
+        self.total_errors = 0
+        self.total_timeouts = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def provider(self) -> LLMProvider:
+        # Created lazily so LLM_PROVIDER can be set after import
+        if self._provider is None:
+            self._provider = create_provider()
+        return self._provider
+
+    @provider.setter
+    def provider(self, provider: LLMProvider):
+        self._provider = provider
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def complete(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo",
+                       max_tokens: int = 1000, temperature: float = 0.7,
+                       timeout: Optional[float] = None,
+                       response_format: Optional[Dict[str, Any]] = None,
+                       category: str = "uncategorized", operation: str = "generate") -> LLMResponse:
+        """Run a chat completion without blocking the event loop"""
+        category = metric_category(category)
+        timeout = timeout or self.timeout_seconds
+        self.breaker.before_call()
+
+        async def attempt():
+            async with self.semaphore:
+                return await self.provider.complete(messages, model, max_tokens, temperature, response_format)
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            content, prompt_tokens, completion_tokens = await asyncio.wait_for(
+                self.hedger.run(category, attempt),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            self.total_timeouts += 1
+            self.total_errors += 1
+            self.breaker.record_failure()
+            self._record(category, operation, model, started, error="timeout")
+            logger.error(f"LLM call timed out after {timeout}s (model={model})")
+            raise LLMTimeoutError(f"LLM call timed out after {timeout}s")
+        except Exception:
+            self.total_errors += 1
+            self.breaker.record_failure()
+            self._record(category, operation, model, started, error="error")
+            raise
+        finally:
+            self.in_flight -= 1
+
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        self.total_calls += 1
+        self.total_latency_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.breaker.record_success()
+        self.hedger.observe(category, latency_ms / 1000)
+        self._record(category, operation, model, started, prompt_tokens, completion_tokens)
+
+        return LLMResponse(
+            content=content,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=latency_ms
+        )
+
+    async def stream(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo",
+                     max_tokens: int = 1000, temperature: float = 0.7,
+                     timeout: Optional[float] = None,
+                     response_format: Optional[Dict[str, Any]] = None,
+                     category: str = "uncategorized", operation: str = "stream") -> AsyncIterator[str]:
+        """Stream a chat completion, yielding content deltas as they arrive.
+
+        The timeout applies to the whole stream, not to each chunk. Streams
+        are not hedged (the first tokens are already on their way to the
+        user), but they count towards the circuit breaker. A stream the
+        consumer stops reading early is still recorded, with what it used.
+        """
+        category = metric_category(category)
+        timeout = timeout or self.timeout_seconds
+        self.breaker.before_call()
+
+        async with self.semaphore:
+            self.in_flight += 1
+            started = time.perf_counter()
+            deadline = started + timeout
+            completion_chunks = 0
+            iterator = self.provider.stream(messages, model, max_tokens, temperature, response_format).__aiter__()
+            try:
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        delta = await asyncio.wait_for(iterator.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    completion_chunks += 1
+                    yield delta
+            except asyncio.TimeoutError:
+                self.total_timeouts += 1
+                self.total_errors += 1
+                self.breaker.record_failure()
+                self._record(category, operation, model, started, error="timeout")
+                logger.error(f"LLM stream timed out after {timeout}s (model={model})")
+                raise LLMTimeoutError(f"LLM stream timed out after {timeout}s")
+            except (GeneratorExit, asyncio.CancelledError):
+                # Client went away mid-stream; the tokens were still spent
+                self._record(category, operation, model, started, _estimate_prompt_tokens(messages), completion_chunks)
+                raise
+            except Exception:
+                self.total_errors += 1
+                self.breaker.record_failure()
+                self._record(category, operation, model, started, error="error")
+                raise
+            finally:
+                self.in_flight -= 1
+
+        self.breaker.record_success()
+
+        # Streaming responses carry no usage block; each content chunk is ~1 token
+        # and the prompt is estimated at ~4 characters per token
+        latency_ms = (time.perf_counter() - started) * 1000
+        prompt_tokens = _estimate_prompt_tokens(messages)
+        self.total_calls += 1
+        self.total_latency_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_chunks
+        self._record(category, operation, model, started, prompt_tokens, completion_chunks)
+
+    def _record(self, category: str, operation: str, model: str, started: float,
+                prompt_tokens: int = 0, completion_tokens: int = 0, error: Optional[str] = None):
+        if self.metrics is None:
+            return
+        # Keep stand-in traffic apart from real OpenAI usage in the rollups
+        if self.provider.name != "openai":
+            model = f"{self.provider.name}:{model}"
+        self.metrics.record(
+            category=category,
+            operation=operation,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            error=error
+        )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Snapshot of concurrency, latency and token counters"""
+        return {
+            "provider": self.provider.describe(),
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout_seconds,
+            "in_flight": self.in_flight,
+            "total_calls": self.total_calls,
+            "total_errors": self.total_errors,
+            "total_timeouts": self.total_timeouts,
+            "avg_latency_ms": round(self.total_latency_ms / self.total_calls, 1) if self.total_calls else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "circuit_breaker": self.breaker.get_stats(),
+            "hedging": self.hedger.get_stats()
+        }
+
+
+# Create global LLM client instance
+llm_client = AsyncLLMClient()
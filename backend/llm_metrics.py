@@ -0,0 +1,251 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000]
+TOKEN_BUCKETS = [50, 100, 200, 300, 400, 500, 600, 800, 1000, 1500, 2000, 4000]
+
+# Series categories. The recipe category comes straight from the request, so
+# anything else is counted as "other" to keep the number of series bounded.
+CATEGORIES = frozenset({"cuisine", "snack", "beverage", "starbucks", "starbucks_drink", "uncategorized"})
+OTHER_CATEGORY = "other"
+
+
+def metric_category(category: Optional[str]) -> str:
+    return category if category in CATEGORIES else OTHER_CATEGORY
+
+
+def _bucket_label(value: float, bounds: List[int]) -> str:
+    for bound in bounds:
+        if value <= bound:
+            return f"le_{bound}"
+    return "inf"
+
+
+def _bucket_labels(bounds: List[int]) -> List[str]:
+    return [f"le_{bound}" for bound in bounds] + ["inf"]
+
+
+def histogram_quantile(histogram: Dict[str, int], bounds: List[int], quantile: float) -> Optional[int]:
+    """Upper bound of the bucket containing the quantile (None if empty or open-ended)"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = quantile * total
+    seen = 0
+    for bound, label in zip(bounds, _bucket_labels(bounds)):
+        seen += histogram.get(label, 0)
+        if seen >= target:
+            return bound
+    return None
+
+
+class _Series:
+    """Counters and histograms for one (category, operation, model)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.latency_hist = {label: 0 for label in _bucket_labels(LATENCY_BUCKETS_MS)}
+        self.prompt_hist = {label: 0 for label in _bucket_labels(TOKEN_BUCKETS)}
+        self.completion_hist = {label: 0 for label in _bucket_labels(TOKEN_BUCKETS)}
+
+    def add(self, prompt_tokens: int, completion_tokens: int, latency_ms: float, error: Optional[str]):
+        self.calls += 1
+        self.latency_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self.latency_hist[_bucket_label(latency_ms, LATENCY_BUCKETS_MS)] += 1
+        if error:
+            self.errors += 1
+            if error == "timeout":
+                self.timeouts += 1
+            return
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.prompt_hist[_bucket_label(prompt_tokens, TOKEN_BUCKETS)] += 1
+        self.completion_hist[_bucket_label(completion_tokens, TOKEN_BUCKETS)] += 1
+
+    def merge(self, other: "_Series"):
+        """Add another series' counts into this one"""
+        self.calls += other.calls
+        self.errors += other.errors
+        self.timeouts += other.timeouts
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.latency_ms += other.latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, other.max_latency_ms)
+        for histogram, others in ((self.latency_hist, other.latency_hist),
+                                  (self.prompt_hist, other.prompt_hist),
+                                  (self.completion_hist, other.completion_hist)):
+            for label, count in others.items():
+                histogram[label] += count
+
+    def rollup_update(self) -> Dict[str, Any]:
+        """Mongo $inc document for this series"""
+        inc = {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_ms": round(self.latency_ms, 1)
+        }
+        for name, histogram in (("latency_hist", self.latency_hist),
+                                ("prompt_hist", self.prompt_hist),
+                                ("completion_hist", self.completion_hist)):
+            for label, count in histogram.items():
+                if count:
+                    inc[f"{name}.{label}"] = count
+        return inc
+
+
+def summarize(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Readable summary of a series (in memory or a daily rollup document)"""
+    calls = doc.get("calls", 0)
+    succeeded = calls - doc.get("errors", 0)
+    completion_hist = doc.get("completion_hist", {})
+    p99_completion = histogram_quantile(completion_hist, TOKEN_BUCKETS, 0.99)
+    return {
+        "calls": calls,
+        "errors": doc.get("errors", 0),
+        "timeouts": doc.get("timeouts", 0),
+        "prompt_tokens": doc.get("prompt_tokens", 0),
+        "completion_tokens": doc.get("completion_tokens", 0),
+        "avg_prompt_tokens": round(doc.get("prompt_tokens", 0) / succeeded, 1) if succeeded else 0.0,
+        "avg_completion_tokens": round(doc.get("completion_tokens", 0) / succeeded, 1) if succeeded else 0.0,
+        "avg_latency_ms": round(doc.get("latency_ms", 0.0) / calls, 1) if calls else 0.0,
+        "p50_latency_ms": histogram_quantile(doc.get("latency_hist", {}), LATENCY_BUCKETS_MS, 0.5),
+        "p95_latency_ms": histogram_quantile(doc.get("latency_hist", {}), LATENCY_BUCKETS_MS, 0.95),
+        "p95_completion_tokens": histogram_quantile(completion_hist, TOKEN_BUCKETS, 0.95),
+        # Headroom over the observed p99; only meaningful once there is some volume
+        "suggested_max_tokens": int(p99_completion * 1.25) if p99_completion and succeeded >= 20 else None,
+        "latency_hist": doc.get("latency_hist", {}),
+        "prompt_hist": doc.get("prompt_hist", {}),
+        "completion_hist": doc.get("completion_hist", {})
+    }
+
+
+class LLMMetrics:
+    """Per-call token and latency accounting for LLM completions.
+
+    Every call is recorded under its (category, operation, model). Totals
+    since process start are served from memory; the same data is folded
+    into one Mongo document per day and series by a periodic flush, so the
+    rollup survives restarts and covers all workers.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.enabled = os.environ.get('LLM_METRICS_ENABLED', 'true').lower() == 'true'
+        self.flush_interval = float(os.environ.get('LLM_METRICS_FLUSH_SECONDS', '60'))
+        self.started_at = datetime.utcnow()
+
+        self._totals: Dict[Tuple[str, str, str], _Series] = {}
+        # Not yet written to the daily rollup, per (day, category, operation, model)
+        self._pending: Dict[Tuple[str, str, str, str], _Series] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, category: str, operation: str, model: str, prompt_tokens: int = 0,
+               completion_tokens: int = 0, latency_ms: float = 0.0, error: Optional[str] = None):
+        """Account for one completed (or failed) LLM call"""
+        if not self.enabled:
+            return
+        key = (metric_category(category), operation, model)
+        day = datetime.utcnow().strftime("%Y-%m-%d")
+        for series in (self._totals.setdefault(key, _Series()),
+                       self._pending.setdefault((day,) + key, _Series())):
+            series.add(prompt_tokens, completion_tokens, latency_ms, error)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Histograms and totals since process start"""
+        series = []
+        for (category, operation, model), totals in sorted(self._totals.items()):
+            summary = summarize(vars(totals))
+            summary.update({"category": category, "operation": operation, "model": model})
+            series.append(summary)
+        return {
+            "since": self.started_at.isoformat(),
+            "latency_buckets_ms": LATENCY_BUCKETS_MS,
+            "token_buckets": TOKEN_BUCKETS,
+            "series": series
+        }
+
+    async def daily(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Daily rollups for the last ``days`` days, newest first"""
+        if self.collection is None:
+            return []
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        docs = await self.collection.find({"date": {"$gte": since}}).sort("date", -1).to_list(1000)
+        rollups = []
+        for doc in docs:
+            summary = summarize(doc)
+            summary.update({
+                "date": doc["date"],
+                "category": doc["category"],
+                "operation": doc["operation"],
+                "model": doc["model"]
+            })
+            rollups.append(summary)
+        return rollups
+
+    async def ensure_indexes(self):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.create_index(
+                [("date", 1), ("category", 1), ("operation", 1), ("model", 1)], unique=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to create LLM metrics indexes: {str(e)}")
+
+    async def flush(self):
+        """Fold pending calls into the daily rollup documents
+
+        Series that fail to write go back to pending for the next flush.
+        """
+        if self.collection is None or not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        for (day, category, operation, model), series in pending.items():
+            try:
+                await self.collection.update_one(
+                    {"date": day, "category": category, "operation": operation, "model": model},
+                    {"$inc": series.rollup_update(), "$set": {"updated_at": datetime.utcnow()}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Failed to write LLM metrics rollup: {str(e)}")
+                self._pending.setdefault((day, category, operation, model), _Series()).merge(series)
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"LLM metrics flush error: {str(e)}")
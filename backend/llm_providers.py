@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LLMProviderError(Exception):
+    """Raised by a provider when the upstream rejects or fails a completion"""
+
+
+class LLMProvider(ABC):
+    """Backend that turns chat messages into completions.
+
+    ``complete`` returns (content, prompt_tokens, completion_tokens);
+    ``stream`` yields content deltas. Timeouts, concurrency limits and
+    metrics are handled by AsyncLLMClient, not by providers.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def complete(self, messages: List[Dict[str, str]], model: str, max_tokens: int,
+                       temperature: float, response_format: Optional[Dict[str, Any]] = None) -> Tuple[str, int, int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream(self, messages: List[Dict[str, str]], model: str, max_tokens: int,
+               temperature: float, response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        return {"name": self.name}
+
+
+class OpenAIProvider(LLMProvider):
+    """Completions from the OpenAI API"""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, client=None):
+        self.api_key = api_key
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Retries are left to the caller so timeouts stay predictable
+            self._client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    async def complete(self, messages, model, max_tokens, temperature, response_format=None):
+        from openai import OpenAIError
+        extra = {"response_format": response_format} if response_format else {}
+        try:
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **extra
+            )
+        except OpenAIError as e:
+            raise LLMProviderError(f"OpenAI request failed: {str(e)}") from e
+        usage = getattr(response, 'usage', None)
+        return (
+            response.choices[0].message.content or "",
+            getattr(usage, 'prompt_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or 0
+        )
+
+    async def stream(self, messages, model, max_tokens, temperature, response_format=None):
+        from openai import OpenAIError
+        extra = {"response_format": response_format} if response_format else {}
+        try:
+            stream = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                **extra
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except OpenAIError as e:
+            raise LLMProviderError(f"OpenAI stream failed: {str(e)}") from e
+
+
+# Building blocks for the local stand-in's recipes and drinks
+_ADJECTIVES = ["Golden", "Smoky", "Zesty", "Rustic", "Silky", "Crispy", "Herbed", "Spiced", "Sunny", "Velvet"]
+_DISHES = ["Skillet", "Bowl", "Bake", "Stir-Fry", "Salad", "Tacos", "Soup", "Pasta", "Wraps", "Curry"]
+_INGREDIENTS = [
+    ("2 cups", "rice"), ("1 lb", "chicken breast"), ("1", "onion"), ("3 cloves", "garlic"),
+    ("2 tbsp", "olive oil"), ("1 can", "black beans"), ("1 cup", "spinach"), ("2", "tomatoes"),
+    ("1", "bell pepper"), ("1 tsp", "cumin"), ("1 cup", "shredded cheese"), ("1", "lime"),
+    ("2 cups", "broccoli"), ("8 oz", "pasta"), ("1 cup", "greek yogurt"), ("2", "eggs"),
+    ("1 cup", "milk"), ("1/2 cup", "honey"), ("1 cup", "strawberries"), ("1", "avocado")
+]
+_DRINK_BASES = ["Vanilla Bean Frappuccino", "Strawberry Acai Refresher", "Lemonade",
+                "Iced Matcha Latte", "Mango Dragonfruit Refresher", "Caramel Frappuccino"]
+_MODIFICATIONS = ["add vanilla syrup", "add caramel drizzle", "sub oat milk", "add vanilla sweet cream cold foam",
+                  "add strawberry puree", "light ice", "add cinnamon dolce topping", "add matcha powder",
+                  "add raspberry syrup", "blend in a banana"]
+_DRINK_CATEGORIES = ["frappuccino", "refresher", "lemonade", "iced_matcha_latte"]
+
+_REQUESTED_KEYS = re.compile(r"exactly these keys[^:]*:\s*([^\n]+?)\.\s")
+_DRINK_CATEGORY = re.compile(r'"category":\s*"([a-z_]+)"')
+
+
+class LocalProvider(LLMProvider):
+    """Offline stand-in that answers with schema-valid recipes and drinks.
+
+    Content is a pure function of the prompt, so identical requests get
+    identical output. Latency follows a configurable distribution and a
+    configurable share of calls fail, so the whole request pipeline
+    (caching, coalescing, parsing, persistence) can be load-tested without
+    calling OpenAI.
+    """
+
+    name = "local"
+
+    def __init__(self):
+        self.latency_distribution = os.environ.get('LOCAL_LLM_LATENCY_DISTRIBUTION', 'lognormal').lower()
+        self.latency_median_ms = float(os.environ.get('LOCAL_LLM_LATENCY_MEDIAN_MS', '800'))
+        # lognormal: sigma of log-latency; uniform: +/- spread around the median
+        self.latency_spread = float(os.environ.get('LOCAL_LLM_LATENCY_SPREAD', '0.5'))
+        self.error_rate = float(os.environ.get('LOCAL_LLM_ERROR_RATE', '0.0'))
+        self.chunk_size = int(os.environ.get('LOCAL_LLM_STREAM_CHUNK_CHARS', '8'))
+        seed = os.environ.get('LOCAL_LLM_SEED')
+        self._random = random.Random(int(seed)) if seed is not None else random.Random()
+
+        self.calls = 0
+        self.errors = 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "latency_distribution": self.latency_distribution,
+            "latency_median_ms": self.latency_median_ms,
+            "latency_spread": self.latency_spread,
+            "error_rate": self.error_rate,
+            "calls": self.calls,
+            "errors": self.errors
+        }
+
+    async def complete(self, messages, model, max_tokens, temperature, response_format=None):
+        content = await self._respond(messages, self._latency_seconds())
+        return content, self._count_tokens(messages), max(1, len(content) // 4)
+
+    async def stream(self, messages, model, max_tokens, temperature, response_format=None):
+        # A quarter of the latency before the first token, the rest spread over the chunks
+        latency = self._latency_seconds()
+        content = await self._respond(messages, latency / 4)
+        chunks = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+        per_chunk = latency * 3 / 4 / max(1, len(chunks))
+        for chunk in chunks:
+            await asyncio.sleep(per_chunk)
+            yield chunk
+
+    # Simulation
+
+    def _latency_seconds(self) -> float:
+        median = self.latency_median_ms / 1000
+        if self.latency_distribution == 'fixed':
+            return median
+        if self.latency_distribution == 'uniform':
+            return max(0.0, self._random.uniform(median * (1 - self.latency_spread), median * (1 + self.latency_spread)))
+        return self._random.lognormvariate(0, self.latency_spread) * median
+
+    async def _respond(self, messages: List[Dict[str, str]], delay: float) -> str:
+        self.calls += 1
+        await asyncio.sleep(delay)
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            raise LLMProviderError("Simulated upstream failure")
+        return json.dumps(self._payload(messages))
+
+    @staticmethod
+    def _count_tokens(messages: List[Dict[str, str]]) -> int:
+        return sum(len(message.get("content", "")) for message in messages) // 4
+
+    def _payload(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        prompt = "\n".join(message.get("content", "") for message in messages)
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+        is_drink = "drink_name" in prompt or "Starbucks" in prompt
+        payload = self._drink(prompt, rng) if is_drink else self._recipe(rng)
+
+        # Follow-up for missing fields: answer with just the requested keys
+        requested = _REQUESTED_KEYS.search(prompt)
+        if requested:
+            keys = [key.strip() for key in requested.group(1).split(",")]
+            return {key: payload[key] for key in keys if key in payload}
+        return payload
+
+    @staticmethod
+    def _recipe(rng: random.Random) -> Dict[str, Any]:
+        ingredients = rng.sample(_INGREDIENTS, rng.randint(5, 8))
+        return {
+            "title": f"{rng.choice(_ADJECTIVES)} {ingredients[0][1].title()} {rng.choice(_DISHES)}",
+            "description": "A simple, flavorful dish made from everyday ingredients.",
+            "ingredients": [f"{amount} {name}" for amount, name in ingredients],
+            "instructions": [
+                "Prep and measure all ingredients.",
+                f"Cook the {ingredients[0][1]} until done.",
+                f"Add the {ingredients[1][1]} and {ingredients[2][1]} and cook for 5 minutes.",
+                "Season to taste and serve."
+            ],
+            "prep_time": rng.choice([5, 10, 15, 20]),
+            "cook_time": rng.choice([10, 15, 20, 30, 45]),
+            "calories_per_serving": rng.randrange(200, 700, 10),
+            "shopping_list": [name for _, name in ingredients]
+        }
+
+    @staticmethod
+    def _drink(prompt: str, rng: random.Random) -> Dict[str, Any]:
+        base = rng.choice(_DRINK_BASES)
+        modifications = rng.sample(_MODIFICATIONS, 3)
+        category = _DRINK_CATEGORY.search(prompt)
+        return {
+            "drink_name": f"{rng.choice(_ADJECTIVES)} {base.split()[0]} Dream",
+            "description": "A dreamy, sippable treat with a little bit of magic.",
+            "base_drink": base,
+            "modifications": modifications,
+            "ordering_script": f"Hi, can I get a grande {base} with {', '.join(modifications)}?",
+            "pro_tips": ["Ask for it blended extra smooth", "Best enjoyed right away"],
+            "why_amazing": "Balanced sweetness with a fun twist.",
+            "category": category.group(1) if category else rng.choice(_DRINK_CATEGORIES),
+            "vibe": "Sunshine in a cup"
+        }
+
+
+def create_provider(name: Optional[str] = None) -> LLMProvider:
+    """Provider selected by LLM_PROVIDER (openai or local)"""
+    name = (name or os.environ.get('LLM_PROVIDER', 'openai')).lower()
+    if name == 'local':
+        logger.info("Using local stand-in LLM provider")
+        return LocalProvider()
+    if name != 'openai':
+        logger.warning(f"Unknown LLM_PROVIDER '{name}', using openai")
+    return OpenAIProvider(api_key=os.environ.get('OPENAI_API_KEY'))
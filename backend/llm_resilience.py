@@ -0,0 +1,167 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Awaitable, Deque
+
+from llm_providers import LLMProviderError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(LLMProviderError):
+    """Raised instead of calling the upstream while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Stop calling an upstream that keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail immediately. Once ``reset_seconds`` have passed a single
+    probe call is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+
+    def __init__(self):
+        self.failure_threshold = int(os.environ.get('LLM_BREAKER_FAILURE_THRESHOLD', '5'))
+        self.reset_seconds = float(os.environ.get('LLM_BREAKER_RESET_SECONDS', '30'))
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+        self.opens = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not go upstream"""
+        if self.state == "closed":
+            return
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        # A probe that never reported back (e.g. a cancelled call) expires
+        probe_expired = time.monotonic() - self._probe_started >= self.reset_seconds
+        if self.state == "half_open" and (not self._probe_in_flight or probe_expired):
+            self._probe_in_flight = True
+            self._probe_started = time.monotonic()
+            return
+        self.rejected += 1
+        raise CircuitOpenError("LLM upstream circuit is open")
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("LLM circuit closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+                logger.warning(f"LLM circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_seconds,
+            "opens": self.opens,
+            "rejected": self.rejected
+        }
+
+
+class Hedger:
+    """Send a backup request when the first one is slower than usual.
+
+    The hedge delay is a latency percentile of recent successful calls in
+    the same category. Hedging only starts once enough samples exist, and
+    hedges are capped at a share of all calls so a general slowdown does
+    not double the upstream load.
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get('LLM_HEDGE_ENABLED', 'true').lower() == 'true'
+        self.percentile = float(os.environ.get('LLM_HEDGE_PERCENTILE', '95'))
+        self.min_samples = int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', '20'))
+        self.max_ratio = float(os.environ.get('LLM_HEDGE_MAX_RATIO', '0.1'))
+        self.window = int(os.environ.get('LLM_HEDGE_WINDOW', '200'))
+
+        self._latencies: Dict[str, Deque[float]] = {}
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, category: str, latency_seconds: float):
+        """Add the latency of a successful call to the category's window"""
+        self._latencies.setdefault(category, deque(maxlen=self.window)).append(latency_seconds)
+
+    def delay_for(self, category: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None if this call must not hedge"""
+        if not self.enabled:
+            return None
+        samples = self._latencies.get(category)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    async def run(self, category: str, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``attempt``, hedged with a second one if the first is slow
+
+        The first successful result wins and the other attempt is
+        cancelled. If one attempt fails the other is still awaited.
+        """
+        self.calls += 1
+        delay = self.delay_for(category)
+        first = asyncio.ensure_future(attempt())
+        if delay is None:
+            return await first
+
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or self.hedges >= self.max_ratio * self.calls:
+                return await first
+
+            self.hedges += 1
+            second = asyncio.ensure_future(attempt())
+            tasks.add(second)
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        delays = {category: self.delay_for(category) for category in self._latencies}
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "max_ratio": self.max_ratio,
+            "hedge_delay_seconds": {
+                category: round(delay, 3) for category, delay in delays.items() if delay is not None
+            },
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
@@ -0,0 +1,200 @@
+import os
+import re
+import copy
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Set
+
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Async callable doing the real product search, returning plain product dicts
+ProductFetch = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a search query: case and spacing don't matter"""
+    return _WHITESPACE.sub(" ", query.lower()).strip()
+
+
+class ProductSearchCache:
+    """Two-tier cache for product search results.
+
+    Results are keyed on namespace + normalized query. The in-process LRU
+    tier answers repeat lookups without a database round trip; the Mongo
+    tier is shared by all workers and expires entries through a TTL index.
+
+    Stale-while-revalidate: results older than ``fresh_seconds`` are still
+    returned immediately, and a background task fetches current prices for
+    the next lookup. Only after ``ttl_seconds`` does a lookup wait for the
+    upstream again. Concurrent misses and refreshes for the same key share
+    one upstream call. Empty results are not cached, since a failed search
+    also comes back empty.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.enabled = os.environ.get('PRODUCT_CACHE_ENABLED', 'true').lower() == 'true'
+        self.max_keys = int(os.environ.get('PRODUCT_CACHE_MAX_KEYS', '2048'))
+        self.fresh_seconds = float(os.environ.get('PRODUCT_CACHE_FRESH_SECONDS', '3600'))
+        self.ttl_seconds = int(os.environ.get('PRODUCT_CACHE_TTL_SECONDS', '86400'))
+
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self._refreshes: Set[asyncio.Task] = set()
+
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @staticmethod
+    def make_key(namespace: str, query: str) -> str:
+        return f"{namespace}:{normalize_query(query)}"
+
+    async def ensure_indexes(self):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.create_index("key", unique=True)
+            await self.collection.create_index("fetched_at", expireAfterSeconds=self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"Failed to create product cache indexes: {str(e)}")
+
+    async def get_or_fetch(self, namespace: str, query: str, fetch: ProductFetch) -> List[Dict[str, Any]]:
+        """Cached products for the query, fetching them if there are none"""
+        if not self.enabled:
+            return await fetch()
+        key = self.make_key(namespace, query)
+
+        entry = self._get_memory(key)
+        if entry is not None:
+            self.memory_hits += 1
+        else:
+            entry = await self._load_mongo(key)
+            if entry is not None:
+                self.mongo_hits += 1
+                self._set_memory(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return await self._flight.do(key, lambda: self._fetch_and_store(key, fetch))
+
+        if time.time() - entry["fetched_at"] >= self.fresh_seconds:
+            self.stale_served += 1
+            self._schedule_refresh(key, fetch)
+        return copy.deepcopy(entry["products"])
+
+    async def stop(self):
+        """Cancel background refreshes still running"""
+        for task in list(self._refreshes):
+            task.cancel()
+        self._refreshes.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.mongo_hits + self.misses
+        mongo_lookups = self.mongo_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "keys_in_memory": len(self._lru),
+            "fresh_seconds": self.fresh_seconds,
+            "ttl_seconds": self.ttl_seconds,
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            # Share of lookups each tier answered, out of the lookups that reached it
+            "memory_hit_ratio": round(self.memory_hits / lookups, 3) if lookups else 0.0,
+            "mongo_hit_ratio": round(self.mongo_hits / mongo_lookups, 3) if mongo_lookups else 0.0,
+            "hit_ratio": round((self.memory_hits + self.mongo_hits) / lookups, 3) if lookups else 0.0,
+            "stale_served": self.stale_served,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "refreshing": len(self._refreshes),
+            "upstream": self._flight.get_stats()
+        }
+
+    # Fetching
+
+    async def _fetch_and_store(self, key: str, fetch: ProductFetch) -> List[Dict[str, Any]]:
+        products = await fetch()
+        if products:
+            entry = {"products": products, "fetched_at": time.time()}
+            self._set_memory(key, entry)
+            await self._store_mongo(key, entry)
+        return products
+
+    def _schedule_refresh(self, key: str, fetch: ProductFetch):
+        async def refresh():
+            self.refreshes += 1
+            try:
+                await self._flight.do(key, lambda: self._fetch_and_store(key, fetch))
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.error(f"Product cache refresh failed for {key}: {str(e)}")
+
+        # One refresh per key at a time; lookups meanwhile keep serving the stale entry
+        if any(task.get_name() == key for task in self._refreshes):
+            return
+        task = asyncio.create_task(refresh(), name=key)
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    # Tier helpers
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["fetched_at"] >= self.ttl_seconds:
+            del self._lru[key]
+            return None
+        self._lru.move_to_end(key)
+        return entry
+
+    def _set_memory(self, key: str, entry: Dict[str, Any]):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_keys:
+            self._lru.popitem(last=False)
+
+    async def _load_mongo(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.collection is None:
+            return None
+        try:
+            doc = await self.collection.find_one({"key": key})
+        except Exception as e:
+            logger.error(f"Failed to read product cache: {str(e)}")
+            return None
+        if doc is None:
+            return None
+        fetched_at = doc["fetched_at"]
+        if isinstance(fetched_at, datetime):
+            fetched_at = fetched_at.replace(tzinfo=timezone.utc).timestamp()
+        if time.time() - fetched_at >= self.ttl_seconds:
+            # Expired but not yet removed by the TTL monitor
+            return None
+        return {"products": doc["products"], "fetched_at": fetched_at}
+
+    async def _store_mongo(self, key: str, entry: Dict[str, Any]):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.update_one(
+                {"key": key},
+                {"$set": {
+                    "products": entry["products"],
+                    # A datetime, so the TTL index applies
+                    "fetched_at": datetime.utcfromtimestamp(entry["fetched_at"])
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to store product cache entry: {str(e)}")
@@ -0,0 +1,459 @@
+import os
+import re
+import csv
+import json
+import math
+import time
+import bisect
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Iterator, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Async callable returning current prices for product ids (ids it can't price are left out)
+PriceFetch = Callable[[List[str]], Awaitable[Dict[str, float]]]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {"a", "an", "and", "the", "of", "with", "for", "or", "in", "to", "by"}
+
+# Files of an on-disk catalog
+_META = "meta.json"
+_PRODUCTS = "products.json"
+_TERMS = "terms.json"
+_INDEX = "index.npz"
+_PRICES = "prices.npz"
+
+
+# Singulars whose plural adds "es" ("shoes" and "toes" are just "-oe" plus "s")
+_OES_STEMS = {"tomato", "potato", "mango", "avocado", "hero", "echo", "volcano", "buffalo", "mosquito"}
+_CONSONANT_Y = re.compile(r"[^aeiou]y$")
+
+
+def _stem(token: str) -> str:
+    """Fold simple plurals, so "tomatoes" finds "Tomato" and "onion" finds "Onions\"
+
+    "-ies" becomes "-ie", the stem of "cookie" and "brownie"; "berry" and
+    "berries" meet through the alias indexed by ``_alias``.
+    """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-1]
+    if token.endswith("oes") and token[:-2] in _OES_STEMS:
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _alias(stem: str) -> Optional[str]:
+    """The other spelling of an "-ie"/"-y" stem ("berrie" and "berry", "cookie" and "cooky")
+
+    Products are indexed under both, so a query stem of either form matches
+    singular and plural names alike.
+    """
+    if len(stem) > 3 and stem.endswith("ie"):
+        return stem[:-2] + "y"
+    if len(stem) > 3 and _CONSONANT_Y.search(stem):
+        return stem[:-1] + "ie"
+    return None
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(token) for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def index_terms(text: str) -> Tuple[List[str], List[str]]:
+    """Tokens of a product's text, and the aliases indexed alongside them"""
+    tokens = tokenize(text)
+    return tokens, [alias for alias in map(_alias, tokens) if alias is not None]
+
+
+def _read_feed(path: str) -> Iterator[Dict[str, Any]]:
+    """Items of a product feed: JSON lines, a JSON array / {"items": [...]}, or CSV"""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as feed:
+            yield from csv.DictReader(feed)
+        return
+    with open(path, encoding="utf-8") as feed:
+        first = feed.read(1)
+        feed.seek(0)
+        if first in ("[", "{") and not path.endswith(".jsonl"):
+            data = json.load(feed)
+            yield from (data.get("items", []) if isinstance(data, dict) else data)
+            return
+        for line in feed:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _feed_product(item: Dict[str, Any]) -> Optional[List[Any]]:
+    """[id, name, price, image_url, brand] from a Walmart-style feed item, or None if unusable"""
+    product_id = next((item[key] for key in ("itemId", "product_id", "id") if item.get(key) is not None), None)
+    name = (item.get("name") or "").strip()
+    if product_id is None or str(product_id).strip() == "" or not name:
+        return None
+    # A missing or unreadable price is unknown (NaN), not free
+    price = next((item[key] for key in ("salePrice", "price") if item.get(key) not in (None, "")), None)
+    try:
+        price = float(price) if price is not None else math.nan
+    except (TypeError, ValueError):
+        price = math.nan
+    return [
+        str(product_id),
+        name,
+        price,
+        item.get("thumbnailImage") or item.get("image_url") or "",
+        (item.get("brandName") or item.get("brand") or "").strip()
+    ]
+
+
+class ProductCatalog:
+    """Local mirror of the Walmart product catalog with its own search engine.
+
+    ``ingest`` turns a product feed into an on-disk catalog: product
+    columns as JSON plus an inverted index as numpy arrays (a sorted term
+    list, and per term a slice of document ids and term frequencies).
+    Loading it precomputes each posting's BM25 weight, so a search is a
+    few array slices and a sum over candidate documents, well under a
+    millisecond. Query tokens of three or more characters also match
+    terms they are a prefix of, at a discount.
+
+    Searches never call Walmart. Prices older than ``price_max_age``
+    are refreshed in the background through the caller's price fetcher
+    and saved with the catalog on shutdown. ``remote_search`` tells the
+    caller whether an ingredient the catalog can't match may still be
+    searched remotely.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.environ.get(
+            'PRODUCT_CATALOG_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'product_catalog')
+        )
+        self.enabled = os.environ.get('PRODUCT_CATALOG_ENABLED', 'true').lower() == 'true'
+        self.price_max_age = float(os.environ.get('PRODUCT_CATALOG_PRICE_MAX_AGE_SECONDS', '86400'))
+        self.prefix_weight = float(os.environ.get('PRODUCT_CATALOG_PREFIX_WEIGHT', '0.5'))
+        self.max_prefix_terms = int(os.environ.get('PRODUCT_CATALOG_MAX_PREFIX_TERMS', '50'))
+        self.remote_search = os.environ.get('PRODUCT_CATALOG_REMOTE_SEARCH', 'true').lower() == 'true'
+        self.refresh_batch = 20
+
+        self.version: Optional[str] = None
+        self.products: List[List[Any]] = []
+        self.terms: List[str] = []
+        self._term_ids: Dict[str, int] = {}
+        self._doc_ids: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._prices = np.zeros(0, dtype=np.float64)
+        self._price_updated = np.zeros(0, dtype=np.float64)
+        self._prices_dirty = False
+
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.price_refreshes = 0
+        self.price_refresh_errors = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.enabled and bool(self.products)
+
+    # Building
+
+    @classmethod
+    def ingest(cls, feed_path: str, directory: str) -> Dict[str, Any]:
+        """Build an on-disk catalog from a product feed, replacing any existing one"""
+        products: Dict[str, List[Any]] = {}
+        skipped = 0
+        for item in _read_feed(feed_path):
+            product = _feed_product(item)
+            if product is None:
+                skipped += 1
+                continue
+            products[product[0]] = product  # Later feed entries win
+        rows = list(products.values())
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = np.zeros(len(rows), dtype=np.int32)
+        for doc, row in enumerate(rows):
+            tokens, aliases = index_terms(f"{row[1]} {row[4]}")
+            counts = Counter(tokens)
+            # Aliases are alternative spellings, not extra words, so they don't add to the length
+            doc_lengths[doc] = len(tokens)
+            for alias in aliases:
+                counts[alias] += 1
+            for term, frequency in counts.items():
+                postings.setdefault(term, []).append((doc, frequency))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for index, term in enumerate(terms):
+            offsets[index + 1] = offsets[index] + len(postings[term])
+        docs = np.empty(offsets[-1], dtype=np.int32)
+        frequencies = np.empty(offsets[-1], dtype=np.uint16)
+        for index, term in enumerate(terms):
+            entries = np.array(postings[term], dtype=np.int64)
+            docs[offsets[index]:offsets[index + 1]] = entries[:, 0]
+            frequencies[offsets[index]:offsets[index + 1]] = np.minimum(entries[:, 1], 65535)
+
+        products_json = json.dumps([row[:2] + row[3:] for row in rows], separators=(",", ":"))
+        version = hashlib.sha256(products_json.encode("utf-8")).hexdigest()[:16]
+        meta = {
+            "version": version,
+            "products": len(rows),
+            "terms": len(terms),
+            "skipped": skipped,
+            "source": os.path.basename(feed_path),
+            "built_at": datetime.utcnow().isoformat()
+        }
+
+        os.makedirs(directory, exist_ok=True)
+        cls._write(directory, _PRODUCTS, lambda f: f.write(products_json))
+        cls._write(directory, _TERMS, lambda f: json.dump(terms, f))
+        cls._write(directory, _INDEX, lambda f: np.savez_compressed(
+            f, offsets=offsets, docs=docs, frequencies=frequencies, doc_lengths=doc_lengths
+        ), binary=True)
+        prices = np.array([row[2] for row in rows], dtype=np.float64)
+        cls._write(directory, _PRICES, lambda f: np.savez(
+            f, prices=prices,
+            # Unknown prices count as never updated, so the first search refreshes them
+            updated=np.where(np.isnan(prices), 0.0, time.time())
+        ), binary=True)
+        # Written last: a catalog without meta.json is incomplete and not loaded
+        cls._write(directory, _META, lambda f: json.dump(meta, f))
+        return meta
+
+    @staticmethod
+    def _write(directory: str, name: str, write, binary: bool = False):
+        path = os.path.join(directory, name)
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb" if binary else "w", encoding=None if binary else "utf-8") as f:
+            write(f)
+        os.replace(temporary, path)
+
+    # Loading
+
+    def load(self) -> bool:
+        """Load the on-disk catalog; False if there is none"""
+        if not self.enabled:
+            return False
+        meta_path = os.path.join(self.directory, _META)
+        if not os.path.exists(meta_path):
+            logger.info(f"No product catalog at {self.directory}")
+            return False
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(os.path.join(self.directory, _PRODUCTS), encoding="utf-8") as f:
+                products = json.load(f)
+            with open(os.path.join(self.directory, _TERMS), encoding="utf-8") as f:
+                terms = json.load(f)
+            index = np.load(os.path.join(self.directory, _INDEX))
+            prices = np.load(os.path.join(self.directory, _PRICES))
+        except Exception as e:
+            logger.error(f"Failed to load product catalog: {str(e)}")
+            return False
+
+        offsets = index["offsets"]
+        docs = index["docs"]
+        frequencies = index["frequencies"].astype(np.float32)
+        doc_lengths = index["doc_lengths"].astype(np.float32)
+
+        # BM25 weight of every posting, so a search only sums them
+        count = len(products)
+        document_frequency = np.diff(offsets).astype(np.float32)
+        idf = np.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+        posting_idf = np.repeat(idf, np.diff(offsets))
+        average_length = float(doc_lengths.mean()) if count else 1.0
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths[docs] / max(average_length, 1e-9))
+        weights = posting_idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+
+        self.version = meta["version"]
+        self.products = products
+        self.terms = terms
+        self._term_ids = {term: index for index, term in enumerate(terms)}
+        self._doc_ids = {product[0]: doc for doc, product in enumerate(products)}
+        self._offsets = offsets
+        self._docs = docs
+        self._weights = weights.astype(np.float32)
+        self._prices = prices["prices"].astype(np.float64)
+        self._price_updated = prices["updated"].astype(np.float64)
+        logger.info(f"Loaded product catalog {self.version}: {count} products, {len(terms)} terms")
+        return True
+
+    def save_prices(self):
+        """Write refreshed prices back to the on-disk catalog"""
+        if not self._prices_dirty or not self.products:
+            return
+        try:
+            self._write(self.directory, _PRICES, lambda f: np.savez(
+                f, prices=self._prices, updated=self._price_updated
+            ), binary=True)
+            self._prices_dirty = False
+        except Exception as e:
+            logger.error(f"Failed to save catalog prices: {str(e)}")
+
+    # Searching
+
+    def _token_postings(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Documents matching one query token and their best weight for it"""
+        docs, weights = [], []
+        term_id = self._term_ids.get(token)
+        if term_id is not None:
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            docs.append(self._docs[start:end])
+            weights.append(self._weights[start:end])
+        if len(token) >= 3 and self.prefix_weight > 0:
+            first = bisect.bisect_left(self.terms, token)
+            last = min(bisect.bisect_left(self.terms, token + "\uffff"), first + self.max_prefix_terms)
+            for term_id in range(first, last):
+                if self.terms[term_id] == token:
+                    continue
+                start, end = self._offsets[term_id], self._offsets[term_id + 1]
+                docs.append(self._docs[start:end])
+                weights.append(self._weights[start:end] * self.prefix_weight)
+        if not docs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if len(docs) == 1:
+            return docs[0], weights[0]
+        docs, weights = np.concatenate(docs), np.concatenate(weights)
+        # Several terms matched the same document: keep the best one
+        order = np.lexsort((-weights, docs))
+        docs, weights = docs[order], weights[order]
+        first_of_doc = np.concatenate(([True], docs[1:] != docs[:-1]))
+        return docs[first_of_doc], weights[first_of_doc]
+
+    def search(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """Best matching products: most query tokens matched first, then BM25 score"""
+        if not self.loaded:
+            return []
+        started = time.perf_counter()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        matches = [self._token_postings(token) for token in tokens]
+        matches = [(docs, weights) for docs, weights in matches if len(docs)]
+        results: List[Dict[str, Any]] = []
+        if matches:
+            docs = np.concatenate([docs for docs, _ in matches])
+            weights = np.concatenate([weights for _, weights in matches])
+            if len(docs) * 8 > len(self.products):
+                # Common terms: summing into a dense per-product array beats sorting postings
+                candidates = None
+                scores = np.bincount(docs, weights=weights, minlength=len(self.products))
+                covered = np.bincount(docs, minlength=len(self.products))
+            else:
+                candidates, inverse = np.unique(docs, return_inverse=True)
+                scores = np.bincount(inverse, weights=weights)
+                covered = np.bincount(inverse)
+            # Coverage first, score second, as one sort key (scores stay below the coverage step)
+            ranking = covered * (float(scores.max()) + 1.0) + scores
+            top = min(limit, int(np.count_nonzero(covered)))
+            best = np.argpartition(-ranking, top - 1)[:top] if top < len(ranking) else np.arange(len(ranking))
+            best = best[np.argsort(-ranking[best])][:top]
+            results = [
+                self._product(int(index if candidates is None else candidates[index]), float(scores[index]))
+                for index in best
+            ]
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return results
+
+    def _product(self, doc: int, score: float) -> Dict[str, Any]:
+        product_id, name, image_url, brand = self.products[doc]
+        return {
+            "product_id": product_id,
+            "name": name,
+            # None while the feed had no price and no refresh has found one
+            "price": None if np.isnan(self._prices[doc]) else float(self._prices[doc]),
+            "image_url": image_url,
+            "brand": brand,
+            "price_updated_at": float(self._price_updated[doc]),
+            "score": round(score, 4)
+        }
+
+    # Price refresh
+
+    def schedule_price_refresh(self, products: List[Dict[str, Any]], fetch_prices: PriceFetch):
+        """Refresh stale prices of found products in the background"""
+        now = time.time()
+        stale = [
+            product["product_id"] for product in products
+            if now - product["price_updated_at"] >= self.price_max_age and product["product_id"] not in self._refreshing
+        ]
+        if not stale:
+            return
+        self._refreshing.update(stale)
+
+        async def refresh():
+            try:
+                for start in range(0, len(stale), self.refresh_batch):
+                    batch = stale[start:start + self.refresh_batch]
+                    self.update_prices(await fetch_prices(batch))
+                self.price_refreshes += 1
+            except Exception as e:
+                self.price_refresh_errors += 1
+                logger.error(f"Catalog price refresh failed: {str(e)}")
+            finally:
+                self._refreshing.difference_update(stale)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def update_prices(self, prices: Dict[str, float]):
+        if not prices:
+            return
+        now = time.time()
+        for product_id, price in prices.items():
+            doc = self._doc_ids.get(product_id)
+            if doc is not None:
+                self._prices[doc] = price
+                self._price_updated[doc] = now
+        self._prices_dirty = True
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+        self.save_prices()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stale = int(np.sum(time.time() - self._price_updated >= self.price_max_age)) if self.products else 0
+        return {
+            "enabled": self.enabled,
+            "loaded": self.loaded,
+            "remote_search": self.remote_search,
+            "directory": self.directory,
+            "version": self.version,
+            "products": len(self.products),
+            "terms": len(self.terms),
+            "postings": int(len(self._docs)),
+            "stale_prices": stale,
+            "unknown_prices": int(np.count_nonzero(np.isnan(self._prices))),
+            "searches": self.searches,
+            "avg_search_microseconds": round(self.search_seconds / self.searches * 1e6, 1) if self.searches else 0.0,
+            "price_refreshes": self.price_refreshes,
+            "price_refresh_errors": self.price_refresh_errors,
+            "refreshing": len(self._refreshing)
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the local product catalog from a Walmart product feed")
+    parser.add_argument("feed", help="Feed file: JSON lines, JSON array or CSV with itemId/name/salePrice/thumbnailImage")
+    parser.add_argument("--dir", default=None, help="Catalog directory (default: PRODUCT_CATALOG_DIR)")
+    args = parser.parse_args()
+    directory = args.dir or ProductCatalog().directory
+    print(json.dumps(ProductCatalog.ingest(args.feed, directory), indent=2))
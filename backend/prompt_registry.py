@@ -0,0 +1,237 @@
+import re
+import json
+import string
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_PATH = Path(__file__).parent / 'prompt_templates.json'
+
+# Static prompt blocks. These are sent verbatim at the start of the
+# conversation (system message) on every request, so the provider sees an
+# identical prefix and can serve it from its prompt cache. Do not interpolate
+# request data into them.
+RECIPE_SYSTEM_PROMPT = "You are a professional chef. Always respond with valid JSON only."
+
+STARBUCKS_SYSTEM_PROMPT = "You are a creative Starbucks drink expert who creates whimsical, aesthetic drinks with drive-thru friendly ordering instructions. Always respond with valid JSON only."
+
+RECIPE_OUTPUT_INSTRUCTIONS = """
+Return ONLY a valid JSON object with this exact structure:
+
+{
+    "title": "Recipe Name",
+    "description": "Brief description",
+    "ingredients": ["ingredient 1", "ingredient 2"],
+    "instructions": ["step 1", "step 2"],
+    "prep_time": 15,
+    "cook_time": 30,
+    "calories_per_serving": 350,
+    "shopping_list": ["ingredient_name_1", "ingredient_name_2"]
+}
+
+Recipe Category Guidelines:
+
+SNACKS: Focus on healthy and refreshing snack options such as:
+- Acai bowls (frozen acai puree, granola, fresh berries, honey, superfoods)
+- Fruit lemon slices chili (fresh fruits, lemon juice, chili powder, lime, Mexican spices)
+- Frozen yogurt berry bites (Greek yogurt, mixed berries, natural sweeteners, bite-sized treats)
+
+BEVERAGES: Generate specific beverage recipes based on user selection:
+
+1. LEMONADE-BASED DRINK: Refreshing, fruity, or herbal lemonades perfect for summer with unique fruit combinations, natural sweeteners, and fresh herbs
+
+2. THAI TEA-BASED DRINK: Authentic Thai tea layered or infused with other flavors (fruit, spices, milk alternatives, or syrups) with traditional preparation methods
+
+3. BOBA DRINK: Milk-based or fruit-based bubble tea using tapioca, popping boba, or creative textures with authentic bubble tea shop quality
+
+For each beverage, include:
+🧋 Creative, original drink name
+✨ Brief flavor description (1–2 sentences that describe taste and style)
+🧾 List of ingredients with exact quantities and units (cups, tablespoons, ounces)
+🍳 Step-by-step instructions including brewing, mixing, and serving techniques
+💡 Optional tips or variations (e.g., vegan swap, flavor twist, serving method)
+
+Make each drink visually Instagram-worthy with professional techniques (shaking, layering, temperature control).
+
+CRITICAL FOR BEVERAGE SHOPPING LIST: The shopping_list must contain ONLY clean ingredient names without any quantities, measurements, or preparation instructions. For beverage specifically:
+- If ingredients include "2 shots espresso" and "1/2 cup brown sugar syrup", the shopping_list should be ["espresso beans", "brown sugar"]
+- If ingredients include "1/4 cup fresh mint leaves" and "ice cubes", the shopping_list should be ["mint", "ice"]
+- If ingredients include "1 cup oat milk" and "3/4 cup cooked tapioca pearls", the shopping_list should be ["oat milk", "tapioca pearls"]
+- Remove ALL quantities (2 shots, 1/2 cup, 1/4 cup, etc.) and measurements (cups, tablespoons, ounces)
+- Remove ALL preparation words (fresh, cooked, diced, chopped, etc.)
+- Use clean, searchable ingredient names suitable for Walmart product search
+
+Example beverage ingredients format:
+- "2 shots espresso" instead of "espresso"
+- "1/2 cup brown sugar syrup" instead of "brown sugar"
+- "1 cup oat milk" instead of "milk"
+- "3/4 cup cooked tapioca pearls" instead of "tapioca"
+
+CUISINE: Traditional dishes from specific cultures and regions with authentic ingredients and cooking methods.
+
+The shopping_list should be a separate bullet-pointed shopping list that includes only the names of the ingredients (no amounts, no measurements). For example:
+- If ingredients include "1 cup diced tomatoes" and "2 tbsp olive oil", the shopping_list should be ["tomatoes", "olive oil"]
+- If ingredients include "1 can chickpeas, drained" and "1/2 cup BBQ sauce", the shopping_list should be ["chickpeas", "BBQ sauce"]
+- If beverage ingredients include "2 shots espresso" and "1/2 cup brown sugar syrup", the shopping_list should be ["espresso beans", "brown sugar"]
+- BEVERAGE SPECIFIC: If ingredients include "4 lemons", "1/2 cup pineapple chunks", "1/4 cup fresh mint leaves", the shopping_list should be ["lemons", "pineapple", "mint"]
+- BEVERAGE SPECIFIC: If ingredients include "1 cup oat milk", "ice cubes", "1/2 cup honey", the shopping_list should be ["oat milk", "ice", "honey"]
+- Clean ingredient names without quantities, measurements, or preparation instructions
+
+BEVERAGE EXAMPLES for reference (create one specific recipe based on user selection):
+- Lemonade: Lavender Honey Lemonade with fresh herbs and edible flowers  
+- Thai Tea: Coconut Mango Thai Tea with layered presentation and tropical fruit
+- Boba: Taro Coconut Milk Tea with homemade taro paste and chewy tapioca pearls
+
+IMPORTANT FOR SPICES AND SEASONINGS: If the recipe uses spices, seasonings, or herbs, list each one individually and specifically in the shopping_list instead of using generic terms like "spices", "seasoning", "herbs", or "seasoning blend". For example:
+- If ingredients include "2 tsp mixed spices (turmeric, cumin, coriander)", the shopping_list should include ["turmeric", "cumin", "coriander"]
+- If ingredients include "1 tbsp garam masala and chili powder", the shopping_list should include ["garam masala", "chili powder"] 
+- If ingredients include "salt, pepper, and paprika to taste", the shopping_list should include ["salt", "pepper", "paprika"]
+- If ingredients include "Italian seasoning blend", the shopping_list should include ["oregano", "basil", "thyme", "rosemary"]
+- If ingredients include "Cajun seasoning", the shopping_list should include ["paprika", "cayenne pepper", "garlic powder", "onion powder", "oregano", "thyme"]
+- If ingredients include "taco seasoning", the shopping_list should include ["cumin", "chili powder", "paprika", "oregano", "garlic powder"]
+- If ingredients include "Chinese five-spice", the shopping_list should include ["star anise", "cloves", "cinnamon", "fennel seeds", "szechuan peppercorns"]
+- If ingredients include "fresh herbs", specify exactly which herbs like ["parsley", "cilantro", "basil"] instead of generic "herbs"
+- This ensures users can select specific spices and brands from Walmart rather than searching for generic "spices" or pre-made seasoning blends
+"""
+
+# Placeholders a template may use, per template kind
+ALLOWED_FIELDS = {
+    "recipe": {"servings", "recipe_type"},
+    "starbucks": {"flavor_context"},
+}
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count (words and punctuation marks)"""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+class PromptTemplateError(Exception):
+    """Raised when a prompt template fails validation"""
+
+
+class PromptTemplate:
+    """A single validated prompt template"""
+
+    def __init__(self, kind: str, name: str, text: str, version: int, static: bool = False):
+        self.kind = kind
+        self.name = name
+        self.text = text
+        self.version = version
+        # Static blocks are sent verbatim, so their braces are literal JSON
+        self.static = static
+        self.fields = [] if static else sorted(
+            {field for _, field, _, _ in string.Formatter().parse(text) if field}
+        )
+        self.token_count = estimate_tokens(text)
+        self.fingerprint = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+    def validate(self):
+        if self.static:
+            if not self.text.strip():
+                raise PromptTemplateError(f"Static block {self.name} is empty")
+            return
+        unknown = set(self.fields) - ALLOWED_FIELDS[self.kind]
+        if unknown:
+            raise PromptTemplateError(f"Template {self.name} uses unknown fields: {sorted(unknown)}")
+        try:
+            self.render(**{field: "x" for field in ALLOWED_FIELDS[self.kind]})
+        except (ValueError, IndexError, KeyError) as e:
+            raise PromptTemplateError(f"Template {self.name} does not render: {str(e)}")
+
+    def render(self, **values) -> str:
+        if self.static:
+            return self.text
+        return self.text.format(**values)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "token_count": self.token_count,
+            "fields": self.fields
+        }
+
+
+class PromptRegistry:
+    """Prompt templates per (category, type), loaded and validated once.
+
+    Templates live in prompt_templates.json. Adding a new drink or snack type
+    only needs a new entry there; unknown types fall back to the category's
+    "default" template, and unknown categories to the cuisine templates.
+    """
+
+    def __init__(self, path: Path = TEMPLATES_PATH):
+        self.path = path
+        self.recipe_templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self.starbucks_templates: Dict[str, PromptTemplate] = {}
+        self.static_blocks = {
+            "recipe_system": PromptTemplate("recipe", "static:recipe_system", RECIPE_SYSTEM_PROMPT, 1, static=True),
+            "recipe_output_instructions": PromptTemplate("recipe", "static:recipe_output_instructions", RECIPE_OUTPUT_INSTRUCTIONS, 1, static=True),
+            "starbucks_system": PromptTemplate("starbucks", "static:starbucks_system", STARBUCKS_SYSTEM_PROMPT, 1, static=True),
+        }
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        recipe_templates = {}
+        for category, types in data.get("recipe", {}).items():
+            recipe_templates[category] = {
+                recipe_type: self._build("recipe", f"recipe:{category}:{recipe_type}", spec)
+                for recipe_type, spec in types.items()
+            }
+            if "default" not in recipe_templates[category]:
+                raise PromptTemplateError(f"Recipe category {category} has no default template")
+        if "cuisine" not in recipe_templates:
+            raise PromptTemplateError("Recipe templates must define the cuisine category")
+
+        starbucks_templates = {
+            drink_type: self._build("starbucks", f"starbucks:{drink_type}", spec)
+            for drink_type, spec in data.get("starbucks", {}).items()
+        }
+        if "default" not in starbucks_templates:
+            raise PromptTemplateError("Starbucks templates must define a default template")
+
+        for template in self.static_blocks.values():
+            template.validate()
+
+        self.recipe_templates = recipe_templates
+        self.starbucks_templates = starbucks_templates
+        logger.info(
+            f"Loaded {sum(len(t) for t in recipe_templates.values())} recipe and "
+            f"{len(starbucks_templates)} Starbucks prompt templates"
+        )
+
+    def _build(self, kind: str, name: str, spec: Dict[str, Any]) -> PromptTemplate:
+        text = spec["text"]
+        if isinstance(text, list):
+            text = "\n".join(text)
+        template = PromptTemplate(kind, name, text, int(spec.get("version", 1)))
+        template.validate()
+        return template
+
+    def recipe_template(self, recipe_category: str, recipe_type: str) -> PromptTemplate:
+        templates = self.recipe_templates.get(recipe_category) or self.recipe_templates["cuisine"]
+        return templates.get(recipe_type) or templates["default"]
+
+    def starbucks_template(self, drink_type: str) -> PromptTemplate:
+        return self.starbucks_templates.get(drink_type) or self.starbucks_templates["default"]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "static_blocks": [t.describe() for t in self.static_blocks.values()],
+            "recipe": [t.describe() for types in self.recipe_templates.values() for t in types.values()],
+            "starbucks": [t.describe() for t in self.starbucks_templates.values()]
+        }
+
+
+# Create global prompt registry, validated at import so bad templates fail startup
+prompt_registry = PromptRegistry()
+prompt_registry.load()
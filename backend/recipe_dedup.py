@@ -0,0 +1,262 @@
+import os
+import re
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_TOKEN_PATTERN = re.compile(r"[a-z]+")
+# Quantity and unit words carry no identity ("2 cups rice" ~ "1 cup rice")
+_STOPWORDS = {
+    "a", "an", "and", "the", "of", "with", "for", "to", "or", "in", "on",
+    "cup", "cups", "tbsp", "tsp", "tablespoon", "tablespoons", "teaspoon", "teaspoons",
+    "oz", "ounce", "ounces", "lb", "lbs", "pound", "pounds", "g", "kg", "ml", "l",
+    "pinch", "dash", "can", "cans", "clove", "cloves", "slice", "slices", "piece", "pieces",
+    "large", "small", "medium", "fresh", "chopped", "diced", "minced", "sliced", "optional",
+    "add", "grande", "tall", "venti"
+}
+
+
+def _tokens(text: str) -> List[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def shingles(parts: List[str]) -> Set[str]:
+    """Word unigrams and bigrams of each part (title, each ingredient, ...)"""
+    result: Set[str] = set()
+    for part in parts:
+        tokens = _tokens(part)
+        result.update(tokens)
+        result.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    return result
+
+
+def fingerprint_parts(namespace: str, data: Dict[str, Any]) -> List[str]:
+    """The fields that identify a recipe or drink: its name and what goes in it"""
+    if namespace == "starbucks_recipes":
+        return [data.get("drink_name", ""), data.get("base_drink", "")] + list(data.get("modifications") or [])
+    return [data.get("title", "")] + list(data.get("ingredients") or [])
+
+
+class MinHasher:
+    """MinHash signatures over 32-bit shingle hashes, vectorized with numpy"""
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items: Set[str]) -> np.ndarray:
+        if not items:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=4).digest(), 'little') for item in items],
+            dtype=np.uint64
+        )
+        # (a * h + b) mod p for every permutation (rows) and shingle (columns)
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+
+
+class _LSHIndex:
+    """Banded LSH over MinHash signatures for one collection"""
+
+    def __init__(self, bands: int, rows: int, max_items: int):
+        self.bands = bands
+        self.rows = rows
+        self.max_items = max_items
+        self.signatures: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.titles: Dict[str, str] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def candidates(self, signature: np.ndarray) -> Set[str]:
+        found: Set[str] = set()
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            found.update(buckets.get(key, ()))
+        return found
+
+    def add(self, item_id: str, signature: np.ndarray, title: str):
+        if item_id in self.signatures:
+            return
+        self.signatures[item_id] = signature
+        self.titles[item_id] = title
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            buckets.setdefault(key, set()).add(item_id)
+        while len(self.signatures) > self.max_items:
+            self._remove(next(iter(self.signatures)))
+
+    def _remove(self, item_id: str):
+        signature = self.signatures.pop(item_id)
+        self.titles.pop(item_id, None)
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del buckets[key]
+
+
+class DuplicateMatch:
+    """The canonical recipe a new generation duplicates"""
+
+    def __init__(self, canonical_id: str, title: str, similarity: float):
+        self.canonical_id = canonical_id
+        self.title = title
+        self.similarity = similarity
+
+
+class RecipeDeduplicator:
+    """Near-duplicate detection for generated recipes and drinks.
+
+    Each saved recipe gets a MinHash signature over its title and
+    ingredients (drink name, base and modifications for drinks). A banded
+    LSH index finds candidates in constant time; candidates whose estimated
+    Jaccard similarity reaches the threshold are duplicates. Signatures are
+    kept in Mongo so the index survives restarts.
+
+    Policy ``link`` saves a duplicate in full, with ``canonical_id``
+    pointing at the original; ``regenerate`` first retries the generation
+    once with a hint to differ from the original, then links if it is still
+    a duplicate.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.policy = os.environ.get('DEDUP_POLICY', 'link').lower()  # off, link, regenerate
+        self.threshold = float(os.environ.get('DEDUP_SIMILARITY_THRESHOLD', '0.7'))
+        self.bands = int(os.environ.get('DEDUP_LSH_BANDS', '16'))
+        self.rows = int(os.environ.get('DEDUP_LSH_ROWS', '4'))
+        self.max_items = int(os.environ.get('DEDUP_INDEX_MAX_ITEMS', '50000'))
+        self.ttl_seconds = int(os.environ.get('DEDUP_FINGERPRINT_TTL_SECONDS', str(30 * 86400)))
+
+        self.hasher = MinHasher(self.bands * self.rows)
+        self._indexes: Dict[str, _LSHIndex] = {}
+
+        self.checked = 0
+        self.duplicates = 0
+        self.regenerated = 0
+        self.linked = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy in ("link", "regenerate")
+
+    def _index(self, namespace: str) -> _LSHIndex:
+        if namespace not in self._indexes:
+            self._indexes[namespace] = _LSHIndex(self.bands, self.rows, self.max_items)
+        return self._indexes[namespace]
+
+    def signature(self, namespace: str, data: Dict[str, Any]) -> np.ndarray:
+        return self.hasher.signature(shingles(fingerprint_parts(namespace, data)))
+
+    def find_duplicate(self, namespace: str, data: Dict[str, Any],
+                       signature: Optional[np.ndarray] = None) -> Optional[DuplicateMatch]:
+        """The most similar indexed recipe at or above the threshold, if any"""
+        if not self.enabled:
+            return None
+        self.checked += 1
+        if signature is None:
+            signature = self.signature(namespace, data)
+        index = self._index(namespace)
+        best: Optional[Tuple[str, float]] = None
+        for candidate_id in index.candidates(signature):
+            similarity = float(np.mean(index.signatures[candidate_id] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate_id, similarity)
+        if best is None:
+            return None
+        self.duplicates += 1
+        return DuplicateMatch(best[0], index.titles.get(best[0], ""), best[1])
+
+    def find_duplicate_among(self, batch: List[Tuple[str, str, np.ndarray]],
+                             signature: np.ndarray) -> Optional[DuplicateMatch]:
+        """Like find_duplicate, against (id, title, signature) of recipes not indexed yet
+
+        For a batch being saved together, such as a meal plan's recipes.
+        """
+        if not self.enabled:
+            return None
+        best: Optional[Tuple[str, str, float]] = None
+        for item_id, title, other in batch:
+            similarity = float(np.mean(other == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = (item_id, title, similarity)
+        if best is None:
+            return None
+        self.duplicates += 1
+        return DuplicateMatch(*best)
+
+    async def add(self, namespace: str, item_id: str, data: Dict[str, Any],
+                  signature: Optional[np.ndarray] = None):
+        """Index a saved canonical recipe"""
+        if not self.enabled:
+            return
+        if signature is None:
+            signature = self.signature(namespace, data)
+        title = data.get("title") or data.get("drink_name") or ""
+        self._index(namespace).add(item_id, signature, title)
+        if self.collection is None:
+            return
+        try:
+            await self.collection.insert_one({
+                "id": item_id,
+                "namespace": namespace,
+                "title": title,
+                "signature": [int(value) for value in signature],
+                "created_at": datetime.utcnow()
+            })
+        except Exception as e:
+            logger.error(f"Failed to store recipe fingerprint: {str(e)}")
+
+    async def ensure_indexes(self):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.create_index([("namespace", 1), ("created_at", -1)])
+            await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"Failed to create recipe fingerprint indexes: {str(e)}")
+
+    async def load(self):
+        """Rebuild the in-memory LSH index from stored fingerprints"""
+        if not self.enabled or self.collection is None:
+            return
+        try:
+            docs = await self.collection.find().sort("created_at", -1).to_list(self.max_items)
+        except Exception as e:
+            logger.error(f"Failed to load recipe fingerprints: {str(e)}")
+            return
+        expected = self.bands * self.rows
+        # Oldest first, so eviction order matches insertion order
+        for doc in reversed(docs):
+            if len(doc.get("signature", [])) != expected:
+                continue
+            signature = np.array(doc["signature"], dtype=np.uint64)
+            self._index(doc["namespace"]).add(doc["id"], signature, doc.get("title", ""))
+        logger.info(f"Loaded {len(docs)} recipe fingerprints")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows": self.rows,
+            "indexed": {namespace: len(index.signatures) for namespace, index in self._indexes.items()},
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "regenerated": self.regenerated,
+            "linked": self.linked,
+            "duplication_rate": round(self.duplicates / self.checked, 3) if self.checked else 0.0
+        }
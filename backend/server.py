@@ -1,4 +1,6 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -11,21 +13,15 @@ logging.basicConfig(level=logging.INFO)
 
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 import uuid
 from datetime import datetime, timedelta
 from dateutil import parser
 # Removed ObjectId import as it's not needed and causes serialization issues
-import openai
-from openai import OpenAI
 import json
-import httpx
 import asyncio
 import time
-import base64
-import re
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
+import math
 import bcrypt
 import sys
 import os
@@ -40,16 +36,9 @@ from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timedelta
 from dateutil import parser
-import openai
-from openai import OpenAI
 import json
-import httpx
 import asyncio
 import time
-import base64
-import re
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
 import bcrypt
 import sys
 import os
@@ -91,8 +80,83 @@ def mongo_to_dict(obj):
         return result
     return obj
 
-# OpenAI setup
-openai_client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+# OpenAI setup - shared async client so completions never block the event loop
+from llm_client import llm_client, LLMTimeoutError
+from llm_resilience import CircuitOpenError
+from llm_providers import LLMProviderError
+from incremental_json import IncrementalJSONParser
+from generation_cache import GenerationCache
+from generation_jobs import GenerationJobs, TERMINAL_STATUSES
+from recipe_dedup import RecipeDeduplicator
+from admission_control import AdmissionController, AdmissionRejected
+from walmart_client import WalmartClient, WalmartSigner
+from product_cache import ProductSearchCache
+from ingredient_normalizer import ingredient_normalizer
+from product_catalog import ProductCatalog
+from cart_precompute import CartOptionsPrecompute
+from cart_optimizer import CartOptimizer, OBJECTIVES as OPTIMIZER_OBJECTIVES
+from starbucks_generator import LocalDrinkGenerator
+from warm_pool import WarmPool
+from single_flight import SingleFlight
+from prompt_registry import prompt_registry, RECIPE_SYSTEM_PROMPT, RECIPE_OUTPUT_INSTRUCTIONS, STARBUCKS_SYSTEM_PROMPT
+from structured_output import structured_output, StructuredOutputError, JSON_RESPONSE_FORMAT
+from llm_metrics import LLMMetrics
+
+# Cache of parsed generations shared by the recipe and Starbucks endpoints
+generation_cache = GenerationCache(db.generation_cache)
+
+# Pre-generated inventory for popular selections, filled in the background
+warm_pool = WarmPool(db.warm_pool, db.warm_pool_spend)
+
+# Identical generations already in flight share one OpenAI call
+generation_flight = SingleFlight()
+
+# Background generation jobs for clients that can't hold a request open
+generation_jobs = GenerationJobs(db.generation_jobs)
+
+# Near-duplicate detection for saved recipes and drinks
+recipe_dedup = RecipeDeduplicator(db.recipe_fingerprints)
+
+# Per-user and global rate limits on generation requests
+admission_control = AdmissionController(db.admission_buckets)
+
+# Keep-alive connection pool for Walmart API calls, opened at startup
+walmart_client = WalmartClient()
+
+# Walmart auth headers: key parsed once, signatures reused for a short window
+walmart_signer = WalmartSigner()
+
+# Walmart search results per ingredient, served stale while prices refresh in the background
+product_search_cache = ProductSearchCache(db.product_search_cache)
+
+# Local product catalog mirror, searched without calling Walmart (loaded at startup)
+product_catalog = ProductCatalog()
+
+# Cart options worked out right after a recipe is generated, read back on request
+cart_precompute = CartOptionsPrecompute(db.grocery_cart_options)
+
+# Picks one product per ingredient: cheapest cart, or best cart within a budget
+cart_optimizer = CartOptimizer()
+
+# Zero-LLM drinks recombined from the curated corpus for a share of Starbucks traffic
+# (the corpus helpers are defined further down; it is indexed on first use)
+local_drink_generator = LocalDrinkGenerator(lambda: get_curated_recipes_data(), lambda base: categorize_recipe(base))
+
+# Token/latency accounting for every OpenAI call, rolled up daily in Mongo
+llm_metrics = LLMMetrics(db.llm_usage_daily)
+llm_client.metrics = llm_metrics
+
+# Completion limits per generation category, e.g. LLM_MAX_TOKENS_BY_CATEGORY="snack=700,beverage=600"
+DEFAULT_MAX_TOKENS = int(os.environ.get('LLM_MAX_TOKENS', '1000'))
+MAX_TOKENS_BY_CATEGORY = {
+    name.strip(): int(limit)
+    for name, limit in (
+        item.split('=', 1) for item in os.environ.get('LLM_MAX_TOKENS_BY_CATEGORY', '').split(',') if '=' in item
+    )
+}
+
+def _max_tokens_for(category: str) -> int:
+    return MAX_TOKENS_BY_CATEGORY.get(category, DEFAULT_MAX_TOKENS)
 
 # Create the main app without a prefix
 app = FastAPI(title="AI Recipe & Grocery App", version="2.0.0")
@@ -195,6 +259,9 @@ class Recipe(BaseModel):
     # New fields for healthy recipes
     calories_per_serving: Optional[int] = None
     is_healthy: bool = False
+    # Budget the cart optimizer keeps the recipe's products under
+    is_budget_friendly: bool = False
+    max_budget: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     user_id: Optional[str] = None
     # Shopping list for Walmart API (just ingredient names)
@@ -205,6 +272,33 @@ class Recipe(BaseModel):
             datetime: lambda v: v.isoformat()
         }
 
+class MealPlanMeal(BaseModel):
+    label: Optional[str] = None  # e.g. "Monday dinner"
+    recipe_category: Optional[str] = None
+    cuisine_type: Optional[str] = None
+    # Per-meal overrides of the plan-wide settings
+    dietary_preferences: Optional[List[str]] = None
+    prep_time_max: Optional[int] = None
+    servings: Optional[int] = None
+    difficulty: Optional[str] = None
+    is_healthy: Optional[bool] = None
+    max_calories_per_serving: Optional[int] = None
+
+class MealPlanRequest(BaseModel):
+    user_id: str
+    name: Optional[str] = None
+    meals: List[MealPlanMeal]
+    # Plan-wide settings applied to every meal
+    dietary_preferences: List[str] = []
+    ingredients_on_hand: List[str] = []
+    prep_time_max: Optional[int] = None
+    servings: int = 4
+    difficulty: str = "medium"
+    is_healthy: bool = False
+    max_calories_per_serving: Optional[int] = None
+    is_budget_friendly: bool = False
+    max_budget: Optional[float] = None
+
 class StarbucksRequest(BaseModel):
     user_id: str
     drink_type: str  # frappuccino, refresher, lemonade, iced_matcha_latte, random
@@ -339,181 +433,197 @@ class GroceryCart(BaseModel):
             datetime: lambda v: v.isoformat()
         }
 
-# Password hashing utilities
+# Generation helpers: cache keys for the generation cache and warm pool, prompts, rate limits
+def _recipe_cache_key(request: RecipeGenRequest) -> str:
+    """Generation cache key built from the prompt-relevant request fields"""
+    recipe_category = request.recipe_category or 'cuisine'
+    template = prompt_registry.recipe_template(recipe_category, request.cuisine_type or 'general')
+    return GenerationCache.make_key("recipe", {
+        "template": template.fingerprint,
+        "recipe_category": recipe_category,
+        "cuisine_type": (request.cuisine_type or 'general').strip().lower(),
+        "difficulty": request.difficulty.strip().lower(),
+        "servings": request.servings,
+        "dietary_preferences": sorted(p.strip().lower() for p in request.dietary_preferences),
+        "ingredients_on_hand": sorted(i.strip().lower() for i in request.ingredients_on_hand),
+        "prep_time_max": request.prep_time_max,
+        "max_calories_per_serving": request.max_calories_per_serving if request.is_healthy else None,
+        "max_budget": request.max_budget if request.is_budget_friendly else None
+    })
+
+def _starbucks_cache_key(request: StarbucksRequest) -> str:
+    """Generation cache key for a (resolved) Starbucks drink request"""
+    return GenerationCache.make_key("starbucks", {
+        "template": prompt_registry.starbucks_template(request.drink_type).fingerprint,
+        "drink_type": request.drink_type,
+        "flavor_inspiration": (request.flavor_inspiration or '').strip().lower()
+    })
+
+def _build_starbucks_prompt(drink_type: str, flavor_inspiration: Optional[str] = None) -> str:
+    """Build the OpenAI prompt for a Starbucks drink type"""
+    # Add flavor inspiration if provided
+    flavor_context = ""
+    if flavor_inspiration:
+        flavor_context = f" inspired by {flavor_inspiration} flavors"
+    
+    # Any other drink type gets the "random mystery" template
+    template = prompt_registry.starbucks_template(drink_type)
+    return template.render(flavor_context=flavor_context)
+
+def _variation_hint(title: str) -> str:
+    """Prompt suffix asking for something clearly different from an existing generation"""
+    return (f" Make it clearly different from an existing recipe called \"{title}\": "
+            f"use a different name and a different main ingredient or technique.")
+
+def _build_starbucks_drink(request: StarbucksRequest, recipe_data: Dict[str, Any]) -> StarbucksRecipe:
+    """Create the StarbucksRecipe object from parsed AI output"""
+    # Create Starbucks recipe object
+    starbucks_drink = StarbucksRecipe(
+        drink_name=recipe_data['drink_name'],
+        description=recipe_data['description'],
+        base_drink=recipe_data['base_drink'],
+        modifications=recipe_data['modifications'],
+        ordering_script=recipe_data['ordering_script'],
+        pro_tips=[],  # Empty list since we're not using pro_tips anymore
+        why_amazing=recipe_data.get('vibe', ''),  # Use vibe as why_amazing
+        category=recipe_data['category'],
+        user_id=request.user_id
+    )
+    
+    # Add ingredients_breakdown if present
+    if 'ingredients_breakdown' in recipe_data:
+        starbucks_drink.ingredients_breakdown = recipe_data['ingredients_breakdown']
+    
+    return starbucks_drink
+
+async def _admit(user_id: str, cost: float = 1):
+    """Apply the generation rate limits, raising 429 with Retry-After when exceeded"""
+    try:
+        await admission_control.admit(user_id, cost)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many generation requests, please try again later",
+            headers={"Retry-After": e.retry_after_header}
+        )
+
+async def _take_ready_generation(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return an already generated recipe for the key from the cache or warm pool"""
+    recipe_data = await generation_cache.get(cache_key)
+    if recipe_data is not None:
+        return recipe_data
+    
+    recipe_data = await warm_pool.take(cache_key)
+    if recipe_data is not None:
+        # A fresh pool variant also grows the cache's variety pool
+        await generation_cache.put(cache_key, recipe_data)
+    return recipe_data
+
+async def _generate_or_fallback(cache_key: str, generate_and_cache) -> Dict[str, Any]:
+    """Run a (coalesced) generation, falling back to any cached variant
+    
+    When the LLM upstream fails, times out or its circuit is open, a
+    previously generated recipe for the same selection is better than an
+    error, even if the variety pool is not full yet.
+    """
+    try:
+        return await generation_flight.do(cache_key, generate_and_cache)
+    except LLMProviderError as e:
+        fallback = await generation_cache.get_fallback(cache_key)
+        if fallback is None:
+            raise
+        logging.warning(f"Serving cached generation after LLM failure: {str(e)}")
+        return fallback
+
+async def _generate_starbucks_data(request: StarbucksRequest, variation_hint: Optional[str] = None):
+    """Generate and validate a Starbucks drink with OpenAI
+    
+    Returns the parsed AI output and the LLM response it came from.
+    """
+    prompt = _build_starbucks_prompt(request.drink_type, request.flavor_inspiration)
+    if variation_hint:
+        prompt += variation_hint
+    
+    # Generate the drink using OpenAI
+    response = await llm_client.complete(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": STARBUCKS_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=_max_tokens_for("starbucks_drink"),
+        temperature=0.8,  # Higher temperature for more creativity
+        response_format=JSON_RESPONSE_FORMAT,
+        category="starbucks_drink"
+    )
+    
+    # Parse the response, repairing and completing it if needed
+    recipe_data = structured_output.parse(response.content)
+    recipe_data = await _complete_payload(
+        recipe_data,
+        StarbucksRecipe,
+        {"pro_tips": [], "why_amazing": recipe_data.get('vibe', ''), "user_id": request.user_id},
+        STARBUCKS_SYSTEM_PROMPT,
+        "starbucks_drink"
+    )
+    
+    # Fail here rather than caching output the model builder rejects
+    _build_starbucks_drink(request, recipe_data)
+    return recipe_data, response
+
+async def _generate_and_save_starbucks_drink(request: StarbucksRequest) -> Dict[str, Any]:
+    """Generate a Starbucks drink, save it and return the stored document"""
+    # Handle random drink type
+    if request.drink_type == "random":
+        import random
+        drink_types = ["frappuccino", "refresher", "lemonade", "iced_matcha_latte"]
+        request.drink_type = random.choice(drink_types)
+        
+    if local_drink_generator.should_serve(request.drink_type, request.flavor_inspiration):
+        # Recombined from the curated corpus, no OpenAI call
+        recipe_data = local_drink_generator.generate(request.drink_type)
+        
+        async def regenerate(variation_hint: str) -> Dict[str, Any]:
+            return _build_starbucks_drink(request, local_drink_generator.generate(request.drink_type)).dict()
+    else:
+        cache_key = _starbucks_cache_key(request)
+        
+        recipe_data = await _take_ready_generation(cache_key)
+        if recipe_data is None:
+            async def generate_and_cache():
+                data, _ = await _generate_starbucks_data(request)
+                await generation_cache.put(cache_key, data)
+                return data
+            
+            recipe_data = await _generate_or_fallback(cache_key, generate_and_cache)
+        
+        async def regenerate(variation_hint: str) -> Dict[str, Any]:
+            data, _ = await _generate_starbucks_data(request, variation_hint)
+            return _build_starbucks_drink(request, data).dict()
+    
+    starbucks_drink = _build_starbucks_drink(request, recipe_data)
+    
+    drink_dict, signature = await _deduplicate("starbucks_recipes", starbucks_drink.dict(), regenerate)
+    
+    # Save to database
+    await _save_recipes("starbucks_recipes", [(drink_dict, signature)])
+    
+    # Return the created drink
+    return mongo_to_dict(drink_dict)
+
 @api_router.post("/generate-starbucks-drink")
 async def generate_starbucks_drink(request: StarbucksRequest):
     """Generate a creative Starbucks secret menu drink with drive-thru ordering script"""
+    await _admit(request.user_id)
     try:
-        # Handle random drink type
-        if request.drink_type == "random":
-            import random
-            drink_types = ["frappuccino", "refresher", "lemonade", "iced_matcha_latte"]
-            request.drink_type = random.choice(drink_types)
-            
-        # Build specialized prompts for each drink type
-        prompt_parts = []
-        
-        # Add flavor inspiration if provided
-        flavor_context = ""
-        if request.flavor_inspiration:
-            flavor_context = f" inspired by {request.flavor_inspiration} flavors"
-            
-        # Define specific prompts for each drink type
-        if request.drink_type == "frappuccino":
-            prompt = f"""Create a **whimsical and aesthetic Starbucks-style Frappuccino** recipe using only real or customizable ingredients found at Starbucks, crafted for **ordering at the drive-thru**{flavor_context}.
-
-Requirements:
-* A **creative name** (do not reuse the name in the recipe steps)
-* Use exactly **3 to 5 Starbucks ingredients** (e.g., caramel syrup, oat milk, cookie topping, espresso shot, vanilla sweet cream foam)
-* Include at least **one twist or aesthetic effect** (e.g., blended espresso layer, raspberry syrup swirl, matcha drizzle)
-* Provide a **clear order line** the user can say at the drive-thru
-* End with a **vibe description** (e.g., "Tastes like a candy cloud on a starry night")
-
-Respond with JSON in this exact format:
-{{
-  "drink_name": "Creative unique name",
-  "description": "Vibe description (e.g., 'Tastes like a candy cloud on a starry night')",
-  "base_drink": "Base Frappuccino to order",
-  "modifications": ["ingredient 1", "ingredient 2", "ingredient 3"],
-  "ordering_script": "Hi, can I get a grande [frappuccino base], with [ingredient 1], [ingredient 2], [ingredient 3]...",
-  "category": "frappuccino",
-  "vibe": "Poetic one-liner"
-}}"""
-
-        elif request.drink_type == "lemonade":
-            prompt = f"""Create a **creative lemonade-based drink** using only Starbucks ingredients, optimized for **drive-thru ordering**{flavor_context}.
-
-Requirements:
-* Use **3 to 5 ingredients**, such as: lemonade, fruit inclusions, cold foam, tea base, or flavored syrup
-* Choose **a fresh or playful aesthetic** (no reused names in the steps)
-* Include a **clearly worded order line**
-* End with a **vibe line**
-
-Respond with JSON in this exact format:
-{{
-  "drink_name": "Creative unique name",
-  "description": "Vibe description",
-  "base_drink": "Base lemonade drink to order",
-  "modifications": ["ingredient 1", "ingredient 2", "ingredient 3"],
-  "ordering_script": "Hi, can I get a grande Lemonade with [ingredient 1], [ingredient 2], [ingredient 3]...",
-  "category": "lemonade",
-  "vibe": "Short description"
-}}"""
-
-        elif request.drink_type == "refresher":
-            prompt = f"""Create a **bold, colorful Starbucks Refresher** made with real ingredients and easily ordered at the **drive-thru**{flavor_context}.
-
-Requirements:
-* Choose 1 refresher base (Strawberry Açaí, Mango Dragonfruit, Pineapple Passionfruit)
-* Add 2–4 more components (e.g., fruit inclusions, syrups, cold foam, tea layer, milk alternative)
-* Provide a **drive-thru phrasing**
-* Avoid repeating the drink name in instructions
-* Finish with a mood-setting **vibe line**
-
-Respond with JSON in this exact format:
-{{
-  "drink_name": "Creative unique name",
-  "description": "Vibe description",
-  "base_drink": "Base refresher to order",
-  "modifications": ["ingredient 1", "ingredient 2", "ingredient 3"],
-  "ordering_script": "Hi, can I get a grande [refresher base] with [ingredient 1], [ingredient 2], [ingredient 3]...",
-  "category": "refresher",
-  "vibe": "Short poetic line"
-}}"""
-
-        elif request.drink_type == "iced_matcha_latte":
-            prompt = f"""Design a **unique iced matcha latte** using Starbucks ingredients. Keep it drive-thru friendly{flavor_context}.
-
-Requirements:
-* Base of iced matcha + 2 to 4 additional ingredients (oat milk, brown sugar, espresso, cold foam, syrup, etc.)
-* Include one **uncommon pairing or visual effect** (e.g., strawberry purée swirl, espresso float)
-* Give **drive-thru phrasing**
-* Do not use the drink's name in instructions
-* End with a **vibe description**
-
-Respond with JSON in this exact format:
-{{
-  "drink_name": "Creative unique name",
-  "description": "Vibe description",
-  "base_drink": "Base iced matcha drink to order",
-  "modifications": ["ingredient 1", "ingredient 2", "ingredient 3"],
-  "ordering_script": "Hi, can I get a grande Iced Matcha Latte with [ingredient 1], [ingredient 2], [ingredient 3]...",
-  "category": "iced_matcha_latte",
-  "vibe": "Mood line"
-}}"""
-
-        else:  # This handles any other drink type as "random mystery"
-            prompt = f"""Create a **hybrid or mystery drink** using a mix of Starbucks drink types and ingredients. Make it unique, surprising, and drive-thru ready{flavor_context}.
-
-Requirements:
-* Pick 3 to 5 ingredients from across drink categories (e.g., refresher base + matcha + foam)
-* Invent a **fun, mysterious name** that isn't referenced again
-* Include a **clearly spoken drive-thru order line**
-* Finish with a poetic **vibe summary**
-
-Respond with JSON in this exact format:
-{{
-  "drink_name": "Creative unique name",
-  "description": "Vibe description",
-  "base_drink": "Base drink combination to order",
-  "modifications": ["ingredient 1", "ingredient 2", "ingredient 3"],
-  "ordering_script": "Hi, can I get a grande [base drink] with [ingredient 1], [ingredient 2], [ingredient 3]...",
-  "category": "mystery",
-  "vibe": "Short mood line"
-}}"""
-
-        # Generate the drink using OpenAI
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a creative Starbucks drink expert who creates whimsical, aesthetic drinks with drive-thru friendly ordering instructions. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.8  # Higher temperature for more creativity
-        )
-        
-        # Parse the response
-        recipe_json = response.choices[0].message.content.strip()
-        
-        # Clean up the JSON (remove markdown formatting if present)
-        if recipe_json.startswith("```json"):
-            recipe_json = recipe_json[7:]
-        if recipe_json.endswith("```"):
-            recipe_json = recipe_json[:-3]
-        
-        recipe_data = json.loads(recipe_json)
-        
-        # Create Starbucks recipe object
-        starbucks_drink = StarbucksRecipe(
-            drink_name=recipe_data['drink_name'],
-            description=recipe_data['description'],
-            base_drink=recipe_data['base_drink'],
-            modifications=recipe_data['modifications'],
-            ordering_script=recipe_data['ordering_script'],
-            pro_tips=[],  # Empty list since we're not using pro_tips anymore
-            why_amazing=recipe_data.get('vibe', ''),  # Use vibe as why_amazing
-            category=recipe_data['category'],
-            user_id=request.user_id
-        )
-        
-        # Add ingredients_breakdown if present
-        if 'ingredients_breakdown' in recipe_data:
-            starbucks_drink.ingredients_breakdown = recipe_data['ingredients_breakdown']
-        
-        # Save to database
-        drink_dict = starbucks_drink.dict()
-        result = await db.starbucks_recipes.insert_one(drink_dict)
-        
-        # Return the created drink
-        if result.inserted_id:
-            inserted_drink = await db.starbucks_recipes.find_one({"_id": result.inserted_id})
-            return mongo_to_dict(inserted_drink)
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save drink to database")
+        return await _generate_and_save_starbucks_drink(request)
             
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, StructuredOutputError):
         raise HTTPException(status_code=500, detail="Failed to parse drink recipe from AI")
+    except LLMTimeoutError:
+        raise HTTPException(status_code=504, detail="Starbucks drink generation timed out")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Starbucks drink generation is temporarily unavailable")
     except Exception as e:
         print(f"Error generating Starbucks drink: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate Starbucks drink")
@@ -988,6 +1098,7 @@ def get_curated_recipes_data():
     ]
 
 # User Recipe Sharing Endpoints
+
 @api_router.post("/share-recipe")
 async def share_recipe(recipe_request: ShareRecipeRequest, user_id: str):
     """Allow users to share their favorite recipes with the community"""
@@ -1172,6 +1283,7 @@ async def get_recipe_stats():
         logger.error(f"Error getting recipe stats: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get recipe stats")
 
+# Password hashing utilities
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
     salt = bcrypt.gensalt()
@@ -1736,6 +1848,143 @@ async def cache_status():
     except Exception as e:
         return {"error": str(e)}
 
+@api_router.get("/debug/llm-status")
+async def llm_status():
+    """Debug endpoint exposing LLM concurrency, latency and token counters"""
+    return {
+        "llm": llm_client.get_metrics(),
+        "single_flight": generation_flight.get_stats(),
+        "structured_output": structured_output.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/metrics/llm")
+async def llm_metrics_status(days: int = 7):
+    """Token and latency histograms per category, since start and as daily rollups"""
+    try:
+        daily = await llm_metrics.daily(days=max(1, min(days, 90)))
+    except Exception as e:
+        logging.error(f"LLM metrics rollup read error: {str(e)}")
+        daily = []
+    return {
+        **llm_metrics.snapshot(),
+        "max_tokens": {"default": DEFAULT_MAX_TOKENS, "by_category": MAX_TOKENS_BY_CATEGORY},
+        "daily": daily
+    }
+
+@api_router.get("/metrics/admission")
+async def admission_metrics():
+    """Generation rate limit bucket levels and admitted/rejected counters"""
+    return {
+        **admission_control.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/generation-cache")
+async def generation_cache_status():
+    """Debug endpoint exposing generation cache hit/miss counters"""
+    return {
+        "generation_cache": generation_cache.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/warm-pool")
+async def warm_pool_status():
+    """Debug endpoint exposing warm pool stock, refill spend and serve counters"""
+    return {
+        "warm_pool": await warm_pool.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/prompt-templates")
+async def prompt_templates_status():
+    """Debug endpoint listing loaded prompt templates with versions and token counts"""
+    return {
+        "templates": prompt_registry.describe(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/recipe-duplicates")
+async def recipe_duplicates_status():
+    """Debug endpoint showing near-duplicate detection counters and duplication rate"""
+    return {
+        "recipe_dedup": recipe_dedup.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/starbucks-generator")
+async def starbucks_generator_status():
+    """Debug endpoint showing the local Starbucks drink generator's share and speed"""
+    return {
+        "local_generator": local_drink_generator.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/walmart-client")
+async def walmart_client_status():
+    """Debug endpoint showing the Walmart HTTP pool settings and request counters"""
+    return {
+        "walmart_client": walmart_client.get_stats(),
+        "signer": walmart_signer.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/product-cache")
+async def product_cache_status():
+    """Debug endpoint showing product search cache hit ratios per tier and refresh counters"""
+    return {
+        "product_search_cache": product_search_cache.get_stats(),
+        "ingredient_normalizer": ingredient_normalizer.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/catalog/search")
+async def search_product_catalog(q: str, limit: int = 10):
+    """Search the local product catalog (BM25 with prefix matching)"""
+    if not product_catalog.loaded:
+        raise HTTPException(status_code=503, detail="Product catalog is not loaded")
+    started = time.perf_counter()
+    results = product_catalog.search(q, limit=max(1, min(limit, 50)))
+    return {
+        "query": q,
+        "catalog_version": product_catalog.version,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+@api_router.get("/debug/product-catalog")
+async def product_catalog_status():
+    """Debug endpoint showing the local product catalog's size, search speed and price freshness"""
+    return {
+        "product_catalog": product_catalog.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/cart-precompute")
+async def cart_precompute_status():
+    """Debug endpoint showing how often cart options were ready before they were requested"""
+    return {
+        "cart_precompute": cart_precompute.get_stats(),
+        "catalog_version": _catalog_version(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/cart-optimizer")
+async def cart_optimizer_status():
+    """Debug endpoint showing cart optimizer runs and solve time"""
+    return {
+        "cart_optimizer": cart_optimizer.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/debug/generation-jobs")
+async def generation_jobs_status():
+    """Debug endpoint showing generation job workers and queue counts"""
+    return {
+        "generation_jobs": await generation_jobs.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 @api_router.get("/walmart-v2/test")
 async def walmart_v2_test():
     """🧱 NEW V2 WALMART INTEGRATION TEST - Following Blueprint"""
@@ -1820,101 +2069,7 @@ def _get_walmart_signature():
 
 def _extract_core_ingredient(ingredient: str) -> str:
     """Extract the core ingredient name from complex recipe descriptions"""
-    
-    # Convert to lowercase for processing
-    ingredient_lower = ingredient.lower().strip()
-    
-    # Remove common recipe measurements and quantities at the beginning
-    ingredient_lower = re.sub(r'^(\d+[\s\/\-]*\d*\s*)?(cups?|cup|tbsp|tablespoons?|tablespoon|tsp|teaspoons?|teaspoon|lbs?|pounds?|pound|oz|ounces?|ounce|cans?|can|jars?|jar|bottles?|bottle|packages?|package|bags?|bag|cloves?|clove|slices?|slice|pieces?|piece|pinch|dash)\s+', '', ingredient_lower)
-    
-    # Remove common preparation words
-    ingredient_lower = re.sub(r'\b(fresh|frozen|dried|chopped|diced|minced|sliced|grated|crushed|ground|whole|raw|cooked|boiled|steamed|roasted|baked|organic|extra|virgin|pure|natural|unsalted|salted|low[- ]fat|fat[- ]free|sugar[- ]free)\b\s*', '', ingredient_lower)
-    
-    # Remove preparation instructions in parentheses
-    ingredient_lower = re.sub(r'\([^)]*\)', '', ingredient_lower)
-    
-    # Special handling for beverage ingredients
-    beverage_substitutions = {
-        'ice cubes': 'ice',
-        'ice cube': 'ice',
-        'tapioca pearls': 'tapioca pearls',
-        'boba pearls': 'tapioca pearls',
-        'bubble tea pearls': 'tapioca pearls',
-        'black tea bags': 'black tea',
-        'tea bags': 'black tea',
-        'green tea bags': 'green tea',
-        'oat milk': 'oat milk',
-        'almond milk': 'almond milk',
-        'coconut milk': 'coconut milk',
-        'whole milk': 'milk',
-        'skim milk': 'milk',
-        '2% milk': 'milk',
-        'heavy cream': 'heavy cream',
-        'whipped cream': 'whipped cream',
-        'brown sugar syrup': 'brown sugar',
-        'simple syrup': 'sugar',
-        'honey syrup': 'honey',
-        'maple syrup': 'maple syrup',
-        'agave syrup': 'agave',
-        'mint leaves': 'mint',
-        'fresh mint': 'mint',
-        'lemon juice': 'lemons',
-        'lime juice': 'limes',
-        'orange juice': 'oranges',
-        'pineapple juice': 'pineapple',
-        'coconut water': 'coconut water',
-        'sparkling water': 'sparkling water',
-        'club soda': 'club soda',
-        'soda water': 'club soda'
-    }
-    
-    # Apply beverage-specific substitutions
-    for original, replacement in beverage_substitutions.items():
-        if original in ingredient_lower:
-            ingredient_lower = ingredient_lower.replace(original, replacement)
-            break
-    
-    # Handle spice blends and specific cooking terms
-    spice_substitutions = {
-        'italian seasoning': 'italian seasoning',
-        'garlic powder': 'garlic powder',
-        'onion powder': 'onion powder',
-        'black pepper': 'black pepper',
-        'white pepper': 'white pepper',
-        'sea salt': 'sea salt',
-        'kosher salt': 'salt',
-        'table salt': 'salt',
-        'olive oil': 'olive oil',
-        'vegetable oil': 'vegetable oil',
-        'canola oil': 'canola oil',
-        'coconut oil': 'coconut oil',
-        'butter': 'butter',
-        'unsalted butter': 'butter'
-    }
-    
-    # Apply spice and cooking substitutions
-    for original, replacement in spice_substitutions.items():
-        if original in ingredient_lower:
-            ingredient_lower = replacement
-            break
-    
-    # Remove any remaining quantities and measurements
-    ingredient_lower = re.sub(r'^\d+[\s\-\/]*\d*\s*', '', ingredient_lower)
-    ingredient_lower = re.sub(r'\b\d+[\s\-\/]*\d*\s*(ml|l|g|kg|mg)\b', '', ingredient_lower)
-    
-    # Remove extra whitespace and clean up
-    ingredient_lower = re.sub(r'\s+', ' ', ingredient_lower).strip()
-    
-    # Remove common suffixes that don't help with searching
-    ingredient_lower = re.sub(r'\s+(to taste|as needed|optional|for garnish|for serving)$', '', ingredient_lower)
-    
-    # If we end up with something too short or generic, try to use the original
-    if len(ingredient_lower) < 2 or ingredient_lower in ['for', 'and', 'or', 'with', 'of', 'the', 'a', 'an']:
-        # Fall back to just removing obvious quantities from the start
-        fallback = re.sub(r'^\d+\s*', '', ingredient.lower().strip())
-        return fallback if len(fallback) > 2 else ingredient.lower().strip()
-    
-    return ingredient_lower.strip() if ingredient_lower.strip() else ingredient
+    return ingredient_normalizer.normalize(ingredient)
 
 async def _get_walmart_product_options(ingredient: str, max_options: int = 3) -> List[WalmartProduct]:
     """OLD function - REPLACED with V2 simple implementation"""
@@ -1934,271 +2089,567 @@ async def _get_walmart_product_options(ingredient: str, max_options: int = 3) ->
     
     return products
 
-@api_router.post("/recipes/generate")
-async def generate_recipe(request: RecipeGenRequest):
-    """Generate a recipe using OpenAI"""
-    try:
-        # Build the prompt based on recipe category
-        prompt_parts = []
-        
-        # Determine recipe category and build appropriate prompt
-        recipe_category = request.recipe_category or 'cuisine'
-        recipe_type = request.cuisine_type or 'general'
-        
-        if recipe_category == "snack":
-            if recipe_type == "acai bowls":
-                prompt_parts.append(f"Create a delicious and nutritious acai bowl recipe for {request.servings} people. Focus on frozen acai puree, healthy superfoods, fresh toppings, granola, and colorful presentation. Include preparation techniques for the perfect consistency.")
-            elif recipe_type == "fruit lemon slices chili":
-                prompt_parts.append(f"Create a spicy and refreshing fruit lemon slices with chili recipe for {request.servings} people. Focus on fresh fruits, lemon juice, chili powder, lime, and traditional Mexican-style seasoning. Include cutting techniques and spice combinations.")
-            elif recipe_type == "frozen yogurt berry bites":
-                prompt_parts.append(f"""Create an incredibly creative and Instagram-worthy frozen yogurt berry recipe for {request.servings} people. Think beyond basic bites - create something like 'Galaxy Swirl Yogurt Bark', 'Berry Cheesecake Bombs', 'Unicorn Yogurt Clusters', or 'Rainbow Protein Pops'. 
-
-Focus on:
-🌟 Creative presentation (layered colors, marbled effects, fun shapes)
-🧊 Multiple textures (crunchy toppings, smooth yogurt, chewy add-ins)
-🍓 Gourmet flavor combinations (lavender honey, matcha white chocolate, strawberry basil)
-✨ Instagram-worthy appearance (vibrant colors, artistic drizzles, edible flowers)
-🥄 Pro techniques (tempering chocolate, creating ombré effects, using molds)
-
-Include Greek yogurt as the base but elevate it with:
-- Superfood add-ins (chia seeds, acai powder, spirulina)
-- Gourmet flavor extracts (rose water, vanilla bean, almond)
-- Artisanal toppings (edible gold, freeze-dried fruits, nuts, coconut flakes)
-- Creative freezing techniques (layering, swirling, molding)
-
-Make this a show-stopping healthy dessert that looks like it came from a high-end dessert boutique!""")
-            else:
-                prompt_parts.append(f"Create a {recipe_type} snack recipe for {request.servings} people. Focus on tasty, satisfying snacks that are perfect for any time of day.")
-        
-        elif recipe_category == "beverage":
-            # Generate specific beverage type based on user selection
-            if recipe_type == "boba tea":
-                prompt_parts.append(f"""Create a detailed brown sugar boba tea or fruit boba tea recipe for {request.servings} people. Include tapioca pearl cooking instructions, tea brewing methods, syrup preparation, and assembly techniques. Make it authentic bubble tea shop quality.
-
-🧋 Creative, original drink name
-✨ Brief flavor description (1–2 sentences that describe taste and style)
-🧾 List of ingredients with exact quantities and units
-🍳 Step-by-step instructions including pearl cooking, tea brewing, and assembly
-💡 Optional tips or variations (e.g., vegan swap, flavor twist, serving method)
-
-Can be milk-based or fruit-based, and use tapioca, popping boba, or creative textures. Make the drink visually Instagram-worthy with professional techniques.""")
-
-            elif recipe_type == "thai tea":
-                prompt_parts.append(f"""Create an authentic Thai tea recipe for {request.servings} people. Include traditional orange tea preparation, condensed milk ratios, spice blending, and the signature layered presentation technique.
+def _build_recipe_prompt(request: RecipeGenRequest) -> str:
+    """Build the request-specific part of the OpenAI prompt for a recipe
+    
+    The static output instructions are sent separately in the system message
+    (see _build_recipe_messages).
+    """
+    recipe_category = request.recipe_category or 'cuisine'
+    recipe_type = request.cuisine_type or 'general'
+    
+    template = prompt_registry.recipe_template(recipe_category, recipe_type)
+    prompt_parts = [template.render(servings=request.servings, recipe_type=recipe_type)]
+    
+    prompt_parts.append(f"Difficulty level: {request.difficulty}.")
+    
+    if request.dietary_preferences:
+        prompt_parts.append(f"Dietary preferences: {', '.join(request.dietary_preferences)}.")
+    
+    if request.ingredients_on_hand:
+        prompt_parts.append(f"Try to use these ingredients: {', '.join(request.ingredients_on_hand)}.")
+    
+    if request.prep_time_max:
+        prompt_parts.append(f"Maximum prep time: {request.prep_time_max} minutes.")
+    
+    # Healthy mode requirements
+    if request.is_healthy and request.max_calories_per_serving:
+        prompt_parts.append(f"This should be a healthy recipe with maximum {request.max_calories_per_serving} calories per serving.")
+    
+    # Budget mode requirements  
+    if request.is_budget_friendly and request.max_budget:
+        prompt_parts.append(f"Keep the total ingredient cost under ${request.max_budget}.")
+    
+    return " ".join(prompt_parts)
 
-🧋 Creative, original drink name
-✨ Brief flavor description (1–2 sentences that describe taste and style)
-🧾 List of ingredients with exact quantities and units
-🍳 Step-by-step instructions including tea brewing, spice mixing, and layering
-💡 Optional tips or variations (e.g., vegan swap, flavor twist, serving method)
+def _build_recipe_messages(request: RecipeGenRequest, variation_hint: Optional[str] = None) -> List[Dict[str, str]]:
+    """Chat messages for a recipe request
+    
+    The system message only holds static blocks so every request shares the
+    same prefix and the provider can serve it from its prompt cache.
+    """
+    system_prompt = RECIPE_SYSTEM_PROMPT
+    # Only add generic recipe instructions for non-Starbucks categories
+    if (request.recipe_category or 'cuisine') != "starbucks":
+        system_prompt = f"{RECIPE_SYSTEM_PROMPT}\n{RECIPE_OUTPUT_INSTRUCTIONS}"
+    
+    prompt = _build_recipe_prompt(request)
+    if variation_hint:
+        prompt += variation_hint
+    
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
 
-Layered or infused with other flavors (like fruit, spices, milk alternatives, or syrups) with traditional preparation methods. Make the drink visually Instagram-worthy.""")
+def _recipe_payload_schema(request: RecipeGenRequest, recipe_data: Dict[str, Any]):
+    """Model the AI payload is validated against, and the fields the server fills in"""
+    if (request.recipe_category or 'cuisine') == "starbucks":
+        return StarbucksRecipe, {
+            "pro_tips": recipe_data.get('pro_tips') or [],
+            "why_amazing": recipe_data.get('why_amazing') or recipe_data.get('vibe', ''),
+            "user_id": request.user_id
+        }
+    return Recipe, {
+        "servings": request.servings,
+        "cuisine_type": request.cuisine_type or "general",
+        "dietary_tags": request.dietary_preferences,
+        "difficulty": request.difficulty,
+        "is_healthy": request.is_healthy,
+        "user_id": request.user_id
+    }
 
-            elif recipe_type == "special lemonades":
-                prompt_parts.append(f"""Create a special flavored lemonade recipe for {request.servings} people. Include unique fruit combinations, natural sweeteners, fresh herbs, and creative presentation. Focus on refreshing summer drinks with gourmet touches.
+async def _complete_payload(recipe_data: Dict[str, Any], model, context: Dict[str, Any],
+                            system_prompt: str, category: str) -> Dict[str, Any]:
+    """Validate parsed AI output and re-query the model for only the bad fields
+    
+    Missing or invalid fields are dropped and requested in a small follow-up
+    completion instead of regenerating the whole recipe.
+    """
+    invalid = structured_output.invalid_fields(recipe_data, model, context)
+    if not invalid:
+        return recipe_data
+    
+    logging.info(f"Re-querying AI for missing fields: {invalid}")
+    structured_output.requeried += 1
+    partial = {key: value for key, value in recipe_data.items() if key not in invalid}
+    response = await llm_client.complete(
+        model="gpt-3.5-turbo",
+        messages=structured_output.missing_fields_messages(partial, invalid, system_prompt),
+        max_tokens=400,
+        temperature=0.3,
+        response_format=JSON_RESPONSE_FORMAT,
+        category=category,
+        operation="repair"
+    )
+    patch = structured_output.parse(response.content)
+    partial.update({key: patch[key] for key in invalid if key in patch})
+    
+    still_invalid = structured_output.invalid_fields(partial, model, context)
+    if still_invalid:
+        raise StructuredOutputError(f"AI output is missing fields: {still_invalid}")
+    return partial
 
-🧋 Creative, original drink name
-✨ Brief flavor description (1–2 sentences that describe taste and style)
-🧾 List of ingredients with exact quantities and units
-🍳 Step-by-step instructions including preparation and presentation
-💡 Optional tips or variations (e.g., vegan swap, flavor twist, serving method)
+def _build_recipe_from_data(request: RecipeGenRequest, recipe_data: Dict[str, Any]):
+    """Create the Recipe (or StarbucksRecipe) object from parsed AI output
 
-Refreshing, fruity, or herbal — perfect for summer with unique fruit combinations, natural sweeteners, and fresh herbs. Make the drink visually Instagram-worthy.""")
+    Returns the model instance and the collection it should be saved to.
+    """
+    recipe_category = request.recipe_category or 'cuisine'
 
-            else:
-                prompt_parts.append(f"""Create a detailed {recipe_type} beverage recipe for {request.servings} people. Focus on refreshing, flavorful drinks with exact measurements and professional techniques.
+    # Create recipe object based on category
+    if recipe_category == "starbucks":
+        # Create Starbucks recipe
+        recipe = StarbucksRecipe(
+            drink_name=recipe_data['drink_name'],
+            description=recipe_data['description'],
+            base_drink=recipe_data['base_drink'],
+            modifications=recipe_data['modifications'],
+            ordering_script=recipe_data['ordering_script'],
+            pro_tips=recipe_data.get('pro_tips') or [],
+            why_amazing=recipe_data.get('why_amazing') or recipe_data.get('vibe', ''),
+            category=recipe_data['category'],
+            user_id=request.user_id
+        )
+        collection_name = "starbucks_recipes"
+    else:
+        # Create regular recipe
+        recipe = Recipe(
+            title=recipe_data['title'],
+            description=recipe_data['description'],
+            ingredients=recipe_data['ingredients'],
+            instructions=recipe_data['instructions'],
+            prep_time=recipe_data['prep_time'],
+            cook_time=recipe_data['cook_time'],
+            servings=request.servings,
+            cuisine_type=request.cuisine_type or "general",
+            dietary_tags=request.dietary_preferences,
+            difficulty=request.difficulty,
+            calories_per_serving=recipe_data.get('calories_per_serving'),
+            is_healthy=request.is_healthy,
+            is_budget_friendly=request.is_budget_friendly,
+            max_budget=request.max_budget if request.is_budget_friendly else None,
+            user_id=request.user_id,
+            shopping_list=recipe_data.get('shopping_list', [])
+        )
+        collection_name = "recipes"
+    
+    return recipe, collection_name
 
-🧋 Creative, original drink name
-✨ Brief flavor description (1–2 sentences that describe taste and style)
-🧾 List of ingredients with exact quantities and units
-🍳 Step-by-step instructions
-💡 Optional tips or variations (e.g., vegan swap, flavor twist, serving method)
+async def _generate_recipe_data(request: RecipeGenRequest, variation_hint: Optional[str] = None):
+    """Generate and validate a recipe with OpenAI
+    
+    Returns the parsed AI output and the LLM response it came from.
+    """
+    category = request.recipe_category or 'cuisine'
+    
+    # Call OpenAI
+    response = await llm_client.complete(
+        model="gpt-3.5-turbo",
+        messages=_build_recipe_messages(request, variation_hint),
+        max_tokens=_max_tokens_for(category),
+        temperature=0.7,
+        response_format=JSON_RESPONSE_FORMAT,
+        category=category
+    )
+    
+    # Parse the response, repairing and completing it if needed
+    recipe_data = structured_output.parse(response.content)
+    model, context = _recipe_payload_schema(request, recipe_data)
+    recipe_data = await _complete_payload(recipe_data, model, context, RECIPE_SYSTEM_PROMPT, category)
+    
+    # Fail here rather than caching output the model builder rejects
+    _build_recipe_from_data(request, recipe_data)
+    return recipe_data, response
 
-Make the drink visually Instagram-worthy and perfect for any season.""")
-        
-        else:  # cuisine category
-            if recipe_type == "snacks & bowls":
-                prompt_parts.append(f"Create a healthy snack or bowl recipe for {request.servings} people. Focus on nutritious snacks, smoothie bowls, acai bowls, poke bowls, grain bowls, or energy bites.")
-            else:
-                prompt_parts.append(f"Create a {recipe_type or 'delicious'} recipe for {request.servings} people.")
-        
-        prompt_parts.append(f"Difficulty level: {request.difficulty}.")
-        
-        if request.dietary_preferences:
-            prompt_parts.append(f"Dietary preferences: {', '.join(request.dietary_preferences)}.")
-        
-        if request.ingredients_on_hand:
-            prompt_parts.append(f"Try to use these ingredients: {', '.join(request.ingredients_on_hand)}.")
-        
-        if request.prep_time_max:
-            prompt_parts.append(f"Maximum prep time: {request.prep_time_max} minutes.")
-        
-        # Healthy mode requirements
-        if request.is_healthy and request.max_calories_per_serving:
-            prompt_parts.append(f"This should be a healthy recipe with maximum {request.max_calories_per_serving} calories per serving.")
-        
-        # Budget mode requirements  
-        if request.is_budget_friendly and request.max_budget:
-            prompt_parts.append(f"Keep the total ingredient cost under ${request.max_budget}.")
-        
-        # Only add generic recipe instructions for non-Starbucks categories
-        if recipe_category != "starbucks":
-            prompt_parts.append("""
-Return ONLY a valid JSON object with this exact structure:
+async def _get_recipe_data(request: RecipeGenRequest, shared: bool = True) -> Dict[str, Any]:
+    """Recipe data for a request from the cache, the warm pool or a new generation
+    
+    With shared=False a fresh generation is always made, without joining an
+    identical call already in flight.
+    """
+    cache_key = _recipe_cache_key(request)
+    
+    async def generate_and_cache():
+        data, _ = await _generate_recipe_data(request)
+        await generation_cache.put(cache_key, data)
+        return data
+    
+    if not shared:
+        return await generate_and_cache()
+    
+    recipe_data = await _take_ready_generation(cache_key)
+    if recipe_data is None:
+        recipe_data = await _generate_or_fallback(cache_key, generate_and_cache)
+    return recipe_data
 
-{
-    "title": "Recipe Name",
-    "description": "Brief description",
-    "ingredients": ["ingredient 1", "ingredient 2"],
-    "instructions": ["step 1", "step 2"],
-    "prep_time": 15,
-    "cook_time": 30,
-    "calories_per_serving": 350,
-    "shopping_list": ["ingredient_name_1", "ingredient_name_2"]
-}
+async def _deduplicate(namespace: str, recipe_dict: Dict[str, Any], regenerate=None):
+    """Check a new recipe against saved ones before it is stored
+    
+    A near-duplicate is regenerated once with a variation hint when the
+    policy and ``regenerate`` allow it, and otherwise linked to its
+    canonical recipe through ``canonical_id``. Returns the recipe dict to
+    save and the signature to index it under (None for duplicates).
+    """
+    if not recipe_dedup.enabled:
+        return recipe_dict, None
+    
+    signature = recipe_dedup.signature(namespace, recipe_dict)
+    match = recipe_dedup.find_duplicate(namespace, recipe_dict, signature)
+    
+    # Exact matches are cache or warm-pool replays of one generation;
+    # regenerating those would defeat the cache
+    if match and regenerate is not None and recipe_dedup.policy == "regenerate" and match.similarity < 1.0:
+        recipe_dedup.regenerated += 1
+        try:
+            recipe_dict = await regenerate(_variation_hint(match.title))
+            signature = recipe_dedup.signature(namespace, recipe_dict)
+            match = recipe_dedup.find_duplicate(namespace, recipe_dict, signature)
+        except Exception as e:
+            logging.error(f"Regeneration of duplicate failed: {str(e)}")
+    
+    if match:
+        recipe_dedup.linked += 1
+        recipe_dict["canonical_id"] = match.canonical_id
+        return recipe_dict, None
+    return recipe_dict, signature
+
+async def _save_recipes(collection_name: str, saved: List[Tuple[Dict[str, Any], Optional[Any]]]):
+    """Store generated recipes with their dedup signatures (from _deduplicate)
+    
+    Indexes the new fingerprints and, for regular recipes, starts the
+    cart options precompute. Every path that saves generations goes
+    through here.
+    """
+    docs = [recipe_dict for recipe_dict, _ in saved]
+    if len(docs) == 1:
+        await db[collection_name].insert_one(docs[0])
+    else:
+        # One batch write for a meal plan's recipes
+        await db[collection_name].insert_many(docs)
+    for recipe_dict, signature in saved:
+        if signature is not None:
+            await recipe_dedup.add(collection_name, recipe_dict["id"], recipe_dict, signature)
+        if collection_name == "recipes":
+            _precompute_cart_options(recipe_dict)
+
+async def _generate_and_save_recipe(request: RecipeGenRequest) -> Dict[str, Any]:
+    """Generate a recipe, save it and return the stored document"""
+    recipe_data = await _get_recipe_data(request)
+    
+    recipe, collection_name = _build_recipe_from_data(request, recipe_data)
+    
+    async def regenerate(variation_hint: str) -> Dict[str, Any]:
+        data, _ = await _generate_recipe_data(request, variation_hint)
+        return _build_recipe_from_data(request, data)[0].dict()
+    
+    recipe_dict, signature = await _deduplicate(collection_name, recipe.dict(), regenerate)
+    
+    # Save to database
+    await _save_recipes(collection_name, [(recipe_dict, signature)])
+    
+    return mongo_to_dict(recipe_dict)
 
-Recipe Category Guidelines:
-
-SNACKS: Focus on healthy and refreshing snack options such as:
-- Acai bowls (frozen acai puree, granola, fresh berries, honey, superfoods)
-- Fruit lemon slices chili (fresh fruits, lemon juice, chili powder, lime, Mexican spices)
-- Frozen yogurt berry bites (Greek yogurt, mixed berries, natural sweeteners, bite-sized treats)
-
-BEVERAGES: Generate specific beverage recipes based on user selection:
-
-1. LEMONADE-BASED DRINK: Refreshing, fruity, or herbal lemonades perfect for summer with unique fruit combinations, natural sweeteners, and fresh herbs
-
-2. THAI TEA-BASED DRINK: Authentic Thai tea layered or infused with other flavors (fruit, spices, milk alternatives, or syrups) with traditional preparation methods
-
-3. BOBA DRINK: Milk-based or fruit-based bubble tea using tapioca, popping boba, or creative textures with authentic bubble tea shop quality
-
-For each beverage, include:
-🧋 Creative, original drink name
-✨ Brief flavor description (1–2 sentences that describe taste and style)
-🧾 List of ingredients with exact quantities and units (cups, tablespoons, ounces)
-🍳 Step-by-step instructions including brewing, mixing, and serving techniques
-💡 Optional tips or variations (e.g., vegan swap, flavor twist, serving method)
-
-Make each drink visually Instagram-worthy with professional techniques (shaking, layering, temperature control).
-
-CRITICAL FOR BEVERAGE SHOPPING LIST: The shopping_list must contain ONLY clean ingredient names without any quantities, measurements, or preparation instructions. For beverage specifically:
-- If ingredients include "2 shots espresso" and "1/2 cup brown sugar syrup", the shopping_list should be ["espresso beans", "brown sugar"]
-- If ingredients include "1/4 cup fresh mint leaves" and "ice cubes", the shopping_list should be ["mint", "ice"]
-- If ingredients include "1 cup oat milk" and "3/4 cup cooked tapioca pearls", the shopping_list should be ["oat milk", "tapioca pearls"]
-- Remove ALL quantities (2 shots, 1/2 cup, 1/4 cup, etc.) and measurements (cups, tablespoons, ounces)
-- Remove ALL preparation words (fresh, cooked, diced, chopped, etc.)
-- Use clean, searchable ingredient names suitable for Walmart product search
-
-Example beverage ingredients format:
-- "2 shots espresso" instead of "espresso"
-- "1/2 cup brown sugar syrup" instead of "brown sugar"
-- "1 cup oat milk" instead of "milk"
-- "3/4 cup cooked tapioca pearls" instead of "tapioca"
-
-CUISINE: Traditional dishes from specific cultures and regions with authentic ingredients and cooking methods.
-
-The shopping_list should be a separate bullet-pointed shopping list that includes only the names of the ingredients (no amounts, no measurements). For example:
-- If ingredients include "1 cup diced tomatoes" and "2 tbsp olive oil", the shopping_list should be ["tomatoes", "olive oil"]
-- If ingredients include "1 can chickpeas, drained" and "1/2 cup BBQ sauce", the shopping_list should be ["chickpeas", "BBQ sauce"]
-- If beverage ingredients include "2 shots espresso" and "1/2 cup brown sugar syrup", the shopping_list should be ["espresso beans", "brown sugar"]
-- BEVERAGE SPECIFIC: If ingredients include "4 lemons", "1/2 cup pineapple chunks", "1/4 cup fresh mint leaves", the shopping_list should be ["lemons", "pineapple", "mint"]
-- BEVERAGE SPECIFIC: If ingredients include "1 cup oat milk", "ice cubes", "1/2 cup honey", the shopping_list should be ["oat milk", "ice", "honey"]
-- Clean ingredient names without quantities, measurements, or preparation instructions
-
-BEVERAGE EXAMPLES for reference (create one specific recipe based on user selection):
-- Lemonade: Lavender Honey Lemonade with fresh herbs and edible flowers  
-- Thai Tea: Coconut Mango Thai Tea with layered presentation and tropical fruit
-- Boba: Taro Coconut Milk Tea with homemade taro paste and chewy tapioca pearls
-
-IMPORTANT FOR SPICES AND SEASONINGS: If the recipe uses spices, seasonings, or herbs, list each one individually and specifically in the shopping_list instead of using generic terms like "spices", "seasoning", "herbs", or "seasoning blend". For example:
-- If ingredients include "2 tsp mixed spices (turmeric, cumin, coriander)", the shopping_list should include ["turmeric", "cumin", "coriander"]
-- If ingredients include "1 tbsp garam masala and chili powder", the shopping_list should include ["garam masala", "chili powder"] 
-- If ingredients include "salt, pepper, and paprika to taste", the shopping_list should include ["salt", "pepper", "paprika"]
-- If ingredients include "Italian seasoning blend", the shopping_list should include ["oregano", "basil", "thyme", "rosemary"]
-- If ingredients include "Cajun seasoning", the shopping_list should include ["paprika", "cayenne pepper", "garlic powder", "onion powder", "oregano", "thyme"]
-- If ingredients include "taco seasoning", the shopping_list should include ["cumin", "chili powder", "paprika", "oregano", "garlic powder"]
-- If ingredients include "Chinese five-spice", the shopping_list should include ["star anise", "cloves", "cinnamon", "fennel seeds", "szechuan peppercorns"]
-- If ingredients include "fresh herbs", specify exactly which herbs like ["parsley", "cilantro", "basil"] instead of generic "herbs"
-- This ensures users can select specific spices and brands from Walmart rather than searching for generic "spices" or pre-made seasoning blends
-""")
-        
-        prompt = " ".join(prompt_parts)
-        
-        # Call OpenAI
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a professional chef. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
-        
-        # Parse the response
-        recipe_json = response.choices[0].message.content.strip()
-        
-        # Clean up the JSON (remove markdown formatting if present)
-        if recipe_json.startswith("```json"):
-            recipe_json = recipe_json[7:]
-        if recipe_json.endswith("```"):
-            recipe_json = recipe_json[:-3]
-        
-        recipe_data = json.loads(recipe_json)
-        
-        # Create recipe object based on category
-        if recipe_category == "starbucks":
-            # Create Starbucks recipe
-            recipe = StarbucksRecipe(
-                drink_name=recipe_data['drink_name'],
-                description=recipe_data['description'],
-                base_drink=recipe_data['base_drink'],
-                modifications=recipe_data['modifications'],
-                ordering_script=recipe_data['ordering_script'],
-                pro_tips=recipe_data['pro_tips'],
-                why_amazing=recipe_data['why_amazing'],
-                category=recipe_data['category'],
-                user_id=request.user_id
-            )
-            collection_name = "starbucks_recipes"
-        else:
-            # Create regular recipe
-            recipe = Recipe(
-                title=recipe_data['title'],
-                description=recipe_data['description'],
-                ingredients=recipe_data['ingredients'],
-                instructions=recipe_data['instructions'],
-                prep_time=recipe_data['prep_time'],
-                cook_time=recipe_data['cook_time'],
-                servings=request.servings,
-                cuisine_type=request.cuisine_type or "general",
-                dietary_tags=request.dietary_preferences,
-                difficulty=request.difficulty,
-                calories_per_serving=recipe_data.get('calories_per_serving'),
-                is_healthy=request.is_healthy,
-                user_id=request.user_id,
-                shopping_list=recipe_data.get('shopping_list', [])
-            )
-            collection_name = "recipes"
-        
-        # Save to database
-        recipe_dict = recipe.dict()
-        result = await db[collection_name].insert_one(recipe_dict)
-        
-        # Get the inserted document and return it
-        if result.inserted_id:
-            inserted_recipe = await db[collection_name].find_one({"_id": result.inserted_id})
-            return mongo_to_dict(inserted_recipe)
-        
-        return recipe_dict
+@api_router.post("/recipes/generate")
+async def generate_recipe(request: RecipeGenRequest):
+    """Generate a recipe using OpenAI"""
+    await _admit(request.user_id)
+    try:
+        return await _generate_and_save_recipe(request)
         
-    except json.JSONDecodeError as e:
+    except (json.JSONDecodeError, StructuredOutputError) as e:
         logging.error(f"JSON parse error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to parse recipe from AI")
+    except LLMTimeoutError:
+        raise HTTPException(status_code=504, detail="Recipe generation timed out")
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Recipe generation is temporarily unavailable")
     except Exception as e:
         logging.error(f"Recipe generation error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate recipe")
 
+MEAL_PLAN_MAX_MEALS = int(os.environ.get('MEAL_PLAN_MAX_MEALS', '21'))
+MEAL_PLAN_MAX_CONCURRENCY = int(os.environ.get('MEAL_PLAN_MAX_CONCURRENCY', '4'))
+
+def _meal_request(plan: MealPlanRequest, meal: MealPlanMeal) -> RecipeGenRequest:
+    """Recipe request for one meal: plan-wide settings plus the meal's overrides"""
+    fields = plan.dict(exclude={'name', 'meals'})
+    fields.update(meal.dict(exclude={'label'}, exclude_none=True))
+    return RecipeGenRequest(**fields)
+
+def _generation_error_detail(error: Exception) -> str:
+    """Same error wording as /recipes/generate, for per-meal failures"""
+    if isinstance(error, (json.JSONDecodeError, StructuredOutputError)):
+        return "Failed to parse recipe from AI"
+    if isinstance(error, LLMTimeoutError):
+        return "Recipe generation timed out"
+    if isinstance(error, CircuitOpenError):
+        return "Recipe generation is temporarily unavailable"
+    return "Failed to generate recipe"
+
+@api_router.post("/meal-plans/generate")
+async def generate_meal_plan(plan_request: MealPlanRequest):
+    """Generate every meal of a plan concurrently and save them in one batch
+    
+    Meals are generated with bounded parallelism. Meals that fail are
+    reported in the plan instead of failing the whole request; the request
+    only fails if no meal could be generated.
+    """
+    if not plan_request.meals:
+        raise HTTPException(status_code=400, detail="A meal plan needs at least one meal")
+    if len(plan_request.meals) > MEAL_PLAN_MAX_MEALS:
+        raise HTTPException(status_code=400, detail=f"A meal plan can have at most {MEAL_PLAN_MAX_MEALS} meals")
+    # Every meal is a generation
+    await _admit(plan_request.user_id, len(plan_request.meals))
+    
+    requests = [_meal_request(plan_request, meal) for meal in plan_request.meals]
+    semaphore = asyncio.Semaphore(MEAL_PLAN_MAX_CONCURRENCY)
+    
+    # Repeats of the same selection within a plan get their own generation
+    # instead of sharing one, so the week isn't the same recipe seven times
+    seen_keys = set()
+    shared = []
+    for request in requests:
+        cache_key = _recipe_cache_key(request)
+        shared.append(cache_key not in seen_keys)
+        seen_keys.add(cache_key)
+    
+    async def generate_meal(request: RecipeGenRequest, shared_generation: bool):
+        async with semaphore:
+            recipe_data = await _get_recipe_data(request, shared=shared_generation)
+        return _build_recipe_from_data(request, recipe_data)
+    
+    results = await asyncio.gather(
+        *(generate_meal(request, shared_generation) for request, shared_generation in zip(requests, shared)),
+        return_exceptions=True
+    )
+    
+    meals = []
+    recipes = []
+    batches: Dict[str, List[Tuple[Dict[str, Any], Optional[Any]]]] = {}
+    for index, (meal, result) in enumerate(zip(plan_request.meals, results)):
+        entry = {
+            "index": index,
+            "label": meal.label,
+            "recipe_category": requests[index].recipe_category,
+            "cuisine_type": requests[index].cuisine_type
+        }
+        if isinstance(result, Exception):
+            logging.error(f"Meal plan generation error for meal {index}: {str(result)}")
+            entry.update({"status": "failed", "error": _generation_error_detail(result)})
+        else:
+            recipe, collection_name = result
+            recipe_dict, signature = await _deduplicate(collection_name, recipe.dict())
+            batch = batches.setdefault(collection_name, [])
+            if signature is not None:
+                # Also a duplicate of an earlier meal of this plan, which isn't indexed until saved
+                match = recipe_dedup.find_duplicate_among([
+                    (saved["id"], saved.get('title') or saved.get('drink_name') or "", saved_signature)
+                    for saved, saved_signature in batch if saved_signature is not None
+                ], signature)
+                if match:
+                    recipe_dedup.linked += 1
+                    recipe_dict["canonical_id"] = match.canonical_id
+                    signature = None
+            batch.append((recipe_dict, signature))
+            recipes.append(recipe_dict)
+            entry.update({
+                "status": "generated",
+                "recipe_id": recipe.id,
+                "collection": collection_name,
+                "title": recipe_dict.get('title') or recipe_dict.get('drink_name')
+            })
+        meals.append(entry)
+    
+    if not recipes:
+        raise HTTPException(status_code=500, detail="Failed to generate any meals for the plan")
+    
+    try:
+        # One batch write per collection (normally just recipes)
+        for collection_name, saved in batches.items():
+            await _save_recipes(collection_name, saved)
+        
+        generated = len(recipes)
+        plan = {
+            "id": create_unique_id(),
+            "user_id": plan_request.user_id,
+            "name": plan_request.name,
+            "status": "complete" if generated == len(meals) else "partial",
+            "meals": meals,
+            "recipe_ids": [recipe["id"] for recipe in recipes],
+            "total_meals": len(meals),
+            "generated_meals": generated,
+            "failed_meals": len(meals) - generated,
+            "created_at": datetime.utcnow()
+        }
+        await db.meal_plans.insert_one(plan)
+    except Exception as e:
+        logging.error(f"Meal plan save error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to save meal plan")
+    
+    return {
+        "plan": mongo_to_dict(plan),
+        "recipes": [mongo_to_dict(recipe) for recipe in recipes]
+    }
+
+@api_router.get("/meal-plans/{plan_id}")
+async def get_meal_plan(plan_id: str):
+    """Get a meal plan by ID"""
+    plan = await db.meal_plans.find_one({"id": plan_id})
+    if not plan:
+        raise HTTPException(status_code=404, detail="Meal plan not found")
+    return mongo_to_dict(plan)
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@api_router.post("/recipes/generate/stream")
+async def generate_recipe_stream(request: RecipeGenRequest):
+    """Generate a recipe using OpenAI, streamed as Server-Sent Events
+    
+    Events: 'field' (title, description, prep_time, ...) and 'item' (each
+    ingredient/instruction/shopping_list entry) are sent as soon as they are
+    complete. The saved recipe is sent last as a 'recipe' event, or an
+    'error' event if generation fails.
+    """
+    await _admit(request.user_id)
+    cache_key = _recipe_cache_key(request)
+    category = request.recipe_category or 'cuisine'
+    
+    async def event_stream():
+        parser = IncrementalJSONParser()
+        chunks = []
+        try:
+            yield _sse_event("start", {"user_id": request.user_id})
+            
+            cached = await _take_ready_generation(cache_key)
+            if cached is not None:
+                # Replay the cached generation through the same event shape
+                recipe, collection_name = _build_recipe_from_data(request, cached)
+                for event in parser.feed(json.dumps(cached)):
+                    yield _sse_event(event.pop("event"), event)
+                recipe_dict, signature = await _deduplicate(collection_name, recipe.dict())
+                await _save_recipes(collection_name, [(recipe_dict, signature)])
+                yield _sse_event("recipe", mongo_to_dict(recipe_dict))
+                return
+            
+            async for delta in llm_client.stream(
+                model="gpt-3.5-turbo",
+                messages=_build_recipe_messages(request),
+                max_tokens=_max_tokens_for(category),
+                temperature=0.7,
+                response_format=JSON_RESPONSE_FORMAT,
+                category=category
+            ):
+                chunks.append(delta)
+                for event in parser.feed(delta):
+                    yield _sse_event(event.pop("event"), event)
+            
+            # Authoritative parse of the full completion, then save as usual
+            recipe_data = structured_output.parse("".join(chunks))
+            model, context = _recipe_payload_schema(request, recipe_data)
+            recipe_data = await _complete_payload(recipe_data, model, context, RECIPE_SYSTEM_PROMPT, category)
+            recipe, collection_name = _build_recipe_from_data(request, recipe_data)
+            await generation_cache.put(cache_key, recipe_data)
+            # Already streamed to the client, so duplicates are linked, not regenerated
+            recipe_dict, signature = await _deduplicate(collection_name, recipe.dict())
+            await _save_recipes(collection_name, [(recipe_dict, signature)])
+            
+            yield _sse_event("recipe", mongo_to_dict(recipe_dict))
+            
+        except (json.JSONDecodeError, StructuredOutputError) as e:
+            logging.error(f"JSON parse error (stream): {str(e)}")
+            yield _sse_event("error", {"detail": "Failed to parse recipe from AI"})
+        except LLMTimeoutError:
+            yield _sse_event("error", {"detail": "Recipe generation timed out"})
+        except CircuitOpenError:
+            yield _sse_event("error", {"detail": "Recipe generation is temporarily unavailable"})
+        except Exception as e:
+            logging.error(f"Recipe stream generation error: {str(e)}")
+            yield _sse_event("error", {"detail": "Failed to generate recipe"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _submit_generation_job(kind: str, request: BaseModel) -> JSONResponse:
+    if not generation_jobs.enabled:
+        raise HTTPException(status_code=503, detail="Generation jobs are disabled")
+    await _admit(request.user_id)
+    try:
+        job = await generation_jobs.submit(kind, request.dict(), user_id=request.user_id)
+    except Exception as e:
+        logging.error(f"Job submit error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to queue generation job")
+    return JSONResponse(status_code=202, content={
+        "job_id": job["id"],
+        "status": job["status"],
+        "poll_url": f"/api/jobs/{job['id']}",
+        "events_url": f"/api/jobs/{job['id']}/events"
+    })
+
+@api_router.post("/recipes/generate/jobs")
+async def submit_recipe_job(request: RecipeGenRequest):
+    """Queue a recipe generation and return a job id immediately
+    
+    Poll /api/jobs/{job_id} or subscribe to /api/jobs/{job_id}/events for
+    the result. The generation finishes even if the client disconnects.
+    """
+    return await _submit_generation_job("recipe", request)
+
+@api_router.post("/generate-starbucks-drink/jobs")
+async def submit_starbucks_job(request: StarbucksRequest):
+    """Queue a Starbucks drink generation and return a job id immediately"""
+    return await _submit_generation_job("starbucks_drink", request)
+
+@api_router.get("/jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    """Get a generation job's status, and its result once completed"""
+    job = await generation_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return mongo_to_dict(job)
+
+@api_router.get("/jobs/{job_id}/events")
+async def stream_generation_job(job_id: str):
+    """Server-Sent Events for a generation job
+    
+    Sends a 'status' event whenever the status changes, then 'completed'
+    with the result or 'failed' with the error, and closes.
+    """
+    job = await generation_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        current = job
+        last_status = None
+        while True:
+            if current is None:
+                yield _sse_event("failed", {"job_id": job_id, "error": "Job expired"})
+                return
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield _sse_event("status", {"job_id": job_id, "status": last_status})
+            if last_status in TERMINAL_STATUSES:
+                if last_status == "completed":
+                    yield _sse_event("completed", {"job_id": job_id, "result": mongo_to_dict(current["result"])})
+                else:
+                    yield _sse_event("failed", {"job_id": job_id, "error": current["error"]})
+                return
+            
+            await generation_jobs.wait_for_update(job_id, timeout=1.0)
+            current = await generation_jobs.get(job_id)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/recipes/{recipe_id}")
 async def get_recipe_by_id(recipe_id: str):
     """Get a specific recipe by ID"""
@@ -2319,49 +2770,70 @@ class CartOptions(BaseModel):
 # Simple Walmart API function without complex authentication
 import os
 import time
-import base64
-import requests
 from typing import List
-from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import padding
 
 async def search_walmart_products(ingredient: str) -> List[WalmartProduct]:
+    """Walmart products for an ingredient
+    
+    Served from the local product catalog when it has a match; otherwise
+    from the Walmart API through the product search cache.
+    """
+    # "2 cups all-purpose flour, sifted" and "flour" are the same search
+    core_ingredient = _extract_core_ingredient(ingredient)
+    if product_catalog.loaded:
+        matches = product_catalog.search(core_ingredient)
+        product_catalog.schedule_price_refresh(matches, _fetch_walmart_prices)
+        # Products whose price isn't known yet wait for the refresh before they are offered
+        matches = [match for match in matches if match["price"] is not None]
+        if matches:
+            return [WalmartProduct(
+                product_id=match["product_id"],
+                name=match["name"],
+                price=match["price"],
+                image_url=match["image_url"],
+                available=True
+            ) for match in matches]
+        if not product_catalog.remote_search:
+            return []
+    
+    async def fetch():
+        return [product.dict() for product in await _search_walmart_api(core_ingredient)]
+    
+    products = await product_search_cache.get_or_fetch("walmart", core_ingredient, fetch)
+    return [WalmartProduct(**product) for product in products]
+
+async def _fetch_walmart_prices(product_ids: List[str]) -> Dict[str, float]:
+    """Current Walmart sale prices for catalog products (Walmart items lookup)"""
+    headers = await walmart_signer.headers()
+    if headers is None:
+        return {}
+    response = await walmart_client.get(
+        "https://developer.api.walmart.com/api-proxy/service/affil/product/v2/items",
+        headers=headers,
+        params={"ids": ",".join(product_ids)}
+    )
+    if response.status_code != 200:
+        logging.warning(f"Walmart price lookup error {response.status_code}")
+        return {}
+    return {
+        str(item["itemId"]): float(item["salePrice"])
+        for item in response.json().get("items", [])
+        if "itemId" in item and item.get("salePrice") is not None
+    }
+
+async def _search_walmart_api(ingredient: str) -> List[WalmartProduct]:
     """
     Real Walmart API product search using ingredient names
     """
     print(f"🔍 Searching Walmart API for: '{ingredient}'")
     
     try:
-        # Get credentials from environment
-        consumer_id = os.environ.get('WALMART_CONSUMER_ID')
-        private_key_pem = os.environ.get('WALMART_PRIVATE_KEY')
-        key_version = os.environ.get('WALMART_KEY_VERSION', '1')
-        
-        if not all([consumer_id, private_key_pem]):
+        # Signed authentication headers (credentials from environment)
+        headers = await walmart_signer.headers()
+        if headers is None:
             print("❌ Missing Walmart API credentials")
             return []
         
-        # Load private key
-        private_key = serialization.load_pem_private_key(
-            private_key_pem.encode(), 
-            password=None
-        )
-        
-        # Generate authentication signature
-        timestamp = str(int(time.time() * 1000))
-        message = f"{consumer_id}\n{timestamp}\n{key_version}\n".encode("utf-8")
-        signature = private_key.sign(message, padding.PKCS1v15(), hashes.SHA256())
-        signature_b64 = base64.b64encode(signature).decode("utf-8")
-        
-        # Set up headers
-        headers = {
-            "WM_CONSUMER.ID": consumer_id,
-            "WM_CONSUMER.INTIMESTAMP": timestamp,
-            "WM_SEC.KEY_VERSION": key_version,
-            "WM_SEC.AUTH_SIGNATURE": signature_b64,
-            "Content-Type": "application/json"
-        }
-        
         # Make API request
         url = f"https://developer.api.walmart.com/api-proxy/service/affil/product/v2/search"
         params = {
@@ -2369,7 +2841,7 @@ async def search_walmart_products(ingredient: str) -> List[WalmartProduct]:
             "numItems": 4
         }
         
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = await walmart_client.get(url, headers=headers, params=params)
         
         if response.status_code == 200:
             data = response.json()
@@ -2398,15 +2870,136 @@ async def search_walmart_products(ingredient: str) -> List[WalmartProduct]:
         print(f"❌ Error searching Walmart for '{ingredient}': {str(e)}")
         return []
 
+# Product searches in flight per cart-options request, and how long one ingredient may take
+CART_OPTIONS_CONCURRENCY = int(os.environ.get('CART_OPTIONS_CONCURRENCY', '6'))
+CART_OPTIONS_INGREDIENT_TIMEOUT_SECONDS = float(os.environ.get('CART_OPTIONS_INGREDIENT_TIMEOUT_SECONDS', '8'))
+
+async def _search_ingredient(ingredient: str, semaphore: asyncio.Semaphore) -> List[WalmartProduct]:
+    """Walmart products for one ingredient, or none if the search times out"""
+    async with semaphore:
+        print(f"🔍 Searching products for: {ingredient}")
+        try:
+            return await asyncio.wait_for(
+                search_walmart_products(ingredient),
+                timeout=CART_OPTIONS_INGREDIENT_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            print(f"⏱️ Product search timed out for {ingredient}")
+            return []
+
+async def _search_ingredients(ingredients: List[str]) -> List[List[WalmartProduct]]:
+    """Walmart products for each ingredient, searched concurrently, in input order
+    
+    An ingredient whose search takes longer than the per-ingredient timeout
+    comes back with no products instead of holding up the rest.
+    """
+    semaphore = asyncio.Semaphore(CART_OPTIONS_CONCURRENCY)
+    return await asyncio.gather(*(_search_ingredient(ingredient, semaphore) for ingredient in ingredients))
+
+async def _search_ingredients_as_completed(ingredients: List[str]) -> AsyncIterator[Tuple[int, List[WalmartProduct]]]:
+    """(index, products) for each ingredient, in the order the searches finish
+    
+    Same concurrency and timeout as _search_ingredients. Searches still
+    running when the consumer stops iterating are cancelled.
+    """
+    semaphore = asyncio.Semaphore(CART_OPTIONS_CONCURRENCY)
+    
+    async def search(index: int, ingredient: str) -> Tuple[int, List[WalmartProduct]]:
+        return index, await _search_ingredient(ingredient, semaphore)
+    
+    tasks = [asyncio.create_task(search(index, ingredient)) for index, ingredient in enumerate(ingredients)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def _catalog_version() -> str:
+    """Version of the products cart options are built from, for keying stored results"""
+    return product_catalog.version if product_catalog.loaded else "remote"
+
+async def _build_cart_options(recipe_id: str, user_id: str, shopping_list: List[str]) -> Dict[str, Any]:
+    """Search products for a shopping list and build the cart-options response"""
+    if not shopping_list:
+        return {
+            "recipe_id": recipe_id,
+            "user_id": user_id,
+            "ingredients": [],
+            "message": "No ingredients found in recipe",
+            "total_products": 0
+        }
+    
+    # Search for products for all ingredients concurrently, keeping shopping list order
+    ingredient_options = []
+    total_products = 0
+    
+    results = await _search_ingredients(shopping_list)
+    
+    for ingredient, products in zip(shopping_list, results):
+        if products:
+            ingredient_options.append(IngredientOptions(
+                ingredient_name=ingredient,
+                options=products
+            ))
+            total_products += len(products)
+            print(f"✅ Found {len(products)} real Walmart products for {ingredient}")
+        else:
+            print(f"⚠️ No products found for {ingredient}")
+    
+    # Create response - always return structure, even if no products found
+    ingredient_options_list = []
+    for ingredient_option in ingredient_options:
+        ingredient_dict = {
+            "ingredient_name": ingredient_option.ingredient_name,
+            "options": [product.dict() for product in ingredient_option.options]
+        }
+        ingredient_options_list.append(ingredient_dict)
+    
+    response_data = {
+        "recipe_id": recipe_id,
+        "user_id": user_id,
+        "ingredient_options": ingredient_options_list,
+        "total_products": total_products
+    }
+    
+    if total_products == 0:
+        response_data["message"] = "No Walmart products found for this recipe's ingredients."
+        print("⚠️ No Walmart products found for any ingredients")
+    else:
+        print(f"🎉 Cart options created: {total_products} total products for {len(ingredient_options)} ingredients")
+    
+    return response_data
+
+def _precompute_cart_options(recipe: Dict[str, Any]):
+    """Start the product searches for a just-saved recipe in the background"""
+    shopping_list = recipe.get('shopping_list') or []
+    if shopping_list:
+        cart_precompute.schedule(
+            recipe["id"],
+            _catalog_version(),
+            lambda: _build_cart_options(recipe["id"], recipe["user_id"], shopping_list)
+        )
+
 @api_router.post("/grocery/cart-options")
 async def get_cart_options(
     recipe_id: str = Query(..., description="Recipe ID"),
     user_id: str = Query(..., description="User ID")
 ):
-    """NEW SIMPLE Walmart integration - Get cart options for recipe ingredients"""
+    """NEW SIMPLE Walmart integration - Get cart options for recipe ingredients
+    
+    Served from the cart options precomputed after generation when there
+    are any for the current product catalog.
+    """
     try:
         print(f"🛒 NEW CART OPTIONS: recipe_id={recipe_id}, user_id={user_id}")
         
+        catalog_version = _catalog_version()
+        precomputed = await cart_precompute.get(recipe_id, user_id, catalog_version)
+        if precomputed is not None:
+            print(f"⚡ Precomputed cart options for recipe {recipe_id}")
+            return precomputed
+        
         # Get recipe from database
         recipe = await db.recipes.find_one({"id": recipe_id, "user_id": user_id})
         if not recipe:
@@ -2417,62 +3010,282 @@ async def get_cart_options(
         
         print(f"✅ Found recipe: {recipe_title} with {len(shopping_list)} ingredients")
         
-        if not shopping_list:
-            return {
+        response_data = await _build_cart_options(recipe_id, user_id, shopping_list)
+        await cart_precompute.put(recipe_id, catalog_version, response_data)
+        return response_data
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error in cart options: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error creating cart options: {str(e)}")
+
+CART_STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+def _ndjson_record(record_type: str, data: Dict[str, Any]) -> str:
+    """Format a single newline-delimited JSON record"""
+    return json.dumps(jsonable_encoder({"type": record_type, **data})) + "\n"
+
+@api_router.post("/grocery/cart-options/stream")
+async def stream_cart_options(
+    recipe_id: str = Query(..., description="Recipe ID"),
+    user_id: str = Query(..., description="User ID"),
+    format: str = Query("ndjson", description="ndjson or sse")
+):
+    """Cart options for a recipe, streamed as each ingredient's search finishes
+    
+    Sends one 'ingredient' record per ingredient with products (its
+    shopping list index, ingredient_name and options) in the order the
+    searches complete (all at once when they were already stored), then a
+    'summary' record with total_products and the ingredients nothing was
+    found for. Errors end the stream with an 'error' record. As NDJSON
+    each line carries its kind in "type"; as Server-Sent Events it is the
+    event name.
+    """
+    if format not in CART_STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(CART_STREAM_FORMATS)}")
+    
+    recipe = await db.recipes.find_one({"id": recipe_id, "user_id": user_id})
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    shopping_list = recipe.get('shopping_list', [])
+    encode = _sse_event if format == "sse" else _ndjson_record
+    
+    async def product_results() -> AsyncIterator[Tuple[int, List[WalmartProduct]]]:
+        # Only a stored result; waiting on a precompute still running would hold back every record
+        precomputed = await cart_precompute.get(recipe_id, user_id, _catalog_version(), join_pending=False)
+        if precomputed is None:
+            async for result in _search_ingredients_as_completed(shopping_list):
+                yield result
+            return
+        found = {option["ingredient_name"]: option["options"] for option in precomputed.get("ingredient_options", [])}
+        for index, ingredient in enumerate(shopping_list):
+            yield index, [WalmartProduct(**product) for product in found.get(ingredient, [])]
+    
+    async def record_stream():
+        total_products = 0
+        ingredients_with_products = 0
+        unmatched = []
+        try:
+            async for index, products in product_results():
+                ingredient = shopping_list[index]
+                if not products:
+                    unmatched.append(index)
+                    continue
+                total_products += len(products)
+                ingredients_with_products += 1
+                yield encode("ingredient", {
+                    "index": index,
+                    **IngredientOptions(ingredient_name=ingredient, options=products).dict()
+                })
+            
+            summary = {
                 "recipe_id": recipe_id,
                 "user_id": user_id,
-                "ingredients": [],
-                "message": "No ingredients found in recipe",
-                "total_products": 0
+                "ingredients": len(shopping_list),
+                "ingredients_with_products": ingredients_with_products,
+                # Shopping list order, whatever order the searches finished in
+                "unmatched_ingredients": [shopping_list[index] for index in sorted(unmatched)],
+                "total_products": total_products
             }
+            if total_products == 0:
+                summary["message"] = ("No ingredients found in recipe" if not shopping_list
+                                      else "No Walmart products found for this recipe's ingredients.")
+            yield encode("summary", summary)
+        except Exception as e:
+            print(f"❌ Error streaming cart options: {str(e)}")
+            yield encode("error", {"detail": "Error creating cart options"})
+    
+    return StreamingResponse(
+        record_stream(),
+        media_type=CART_STREAM_FORMATS[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+MULTI_CART_MAX_RECIPES = int(os.environ.get('MULTI_CART_MAX_RECIPES', '10'))
+
+class MultiRecipeCartRequest(BaseModel):
+    user_id: str
+    recipe_ids: List[str]
+
+def _merge_shopping_lists(recipes: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, str]]]:
+    """Group every recipe's shopping list items by normalized ingredient
+    
+    Keys are in first-seen order; each maps to the recipes (and their own
+    wording of the item) that need it.
+    """
+    merged: Dict[str, List[Dict[str, str]]] = {}
+    for recipe in recipes:
+        for item in recipe.get('shopping_list') or []:
+            if not item or not item.strip():
+                continue
+            needed_by = merged.setdefault(_extract_core_ingredient(item), [])
+            if not any(entry["recipe_id"] == recipe["id"] for entry in needed_by):
+                needed_by.append({
+                    "recipe_id": recipe["id"],
+                    "title": recipe.get('title', 'Unknown Recipe'),
+                    "ingredient": item
+                })
+    return merged
+
+@api_router.post("/grocery/multi-cart-options")
+async def get_multi_recipe_cart_options(cart_request: MultiRecipeCartRequest):
+    """Cart options for several recipes at once
+    
+    Shopping lists are merged by normalized ingredient, so an ingredient
+    shared by several recipes (onion, garlic, oil) is searched once. Each
+    ingredient's options list the recipes that need it.
+    """
+    recipe_ids = list(dict.fromkeys(cart_request.recipe_ids))
+    if not recipe_ids:
+        raise HTTPException(status_code=400, detail="No recipes selected")
+    if len(recipe_ids) > MULTI_CART_MAX_RECIPES:
+        raise HTTPException(status_code=400, detail=f"A cart can combine at most {MULTI_CART_MAX_RECIPES} recipes")
+    
+    try:
+        docs = await db.recipes.find(
+            {"id": {"$in": recipe_ids}, "user_id": cart_request.user_id}
+        ).to_list(len(recipe_ids))
+        by_id = {doc["id"]: doc for doc in docs}
+        if not by_id:
+            raise HTTPException(status_code=404, detail="Recipes not found")
+        # Requested order, not database order
+        recipes = [by_id[recipe_id] for recipe_id in recipe_ids if recipe_id in by_id]
+        
+        merged = _merge_shopping_lists(recipes)
+        ingredients = list(merged)
+        results = await _search_ingredients(ingredients)
         
-        # Search for products for each ingredient
         ingredient_options = []
+        unmatched = []
         total_products = 0
-        
-        for ingredient in shopping_list:
-            print(f"🔍 Searching products for: {ingredient}")
-            products = await search_walmart_products(ingredient)
-            
-            if products:
-                ingredient_options.append(IngredientOptions(
-                    ingredient_name=ingredient,
-                    options=products
-                ))
-                total_products += len(products)
-                print(f"✅ Found {len(products)} real Walmart products for {ingredient}")
-            else:
-                print(f"⚠️ No products found for {ingredient}")
-        
-        # Create response - always return structure, even if no products found
-        ingredient_options_list = []
-        for ingredient_option in ingredient_options:
-            ingredient_dict = {
-                "ingredient_name": ingredient_option.ingredient_name,
-                "options": [product.dict() for product in ingredient_option.options]
-            }
-            ingredient_options_list.append(ingredient_dict)
+        for ingredient, products in zip(ingredients, results):
+            if not products:
+                unmatched.append(ingredient)
+                continue
+            ingredient_options.append({
+                "ingredient_name": ingredient,
+                "recipes": merged[ingredient],
+                "options": [product.dict() for product in products]
+            })
+            total_products += len(products)
         
         response_data = {
-            "recipe_id": recipe_id,
-            "user_id": user_id,
-            "ingredient_options": ingredient_options_list,
+            "user_id": cart_request.user_id,
+            "recipe_ids": [recipe["id"] for recipe in recipes],
+            "missing_recipe_ids": [recipe_id for recipe_id in recipe_ids if recipe_id not in by_id],
+            "ingredient_options": ingredient_options,
+            "unmatched_ingredients": unmatched,
+            "shopping_list_items": sum(len(recipe.get('shopping_list') or []) for recipe in recipes),
+            "unique_ingredients": len(ingredients),
             "total_products": total_products
         }
-        
         if total_products == 0:
-            response_data["message"] = "No Walmart products found for this recipe's ingredients."
-            print("⚠️ No Walmart products found for any ingredients")
-        else:
-            print(f"🎉 Cart options created: {total_products} total products for {len(ingredient_options)} ingredients")
-        
+            response_data["message"] = "No Walmart products found for these recipes' ingredients."
         return response_data
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error in cart options: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error creating cart options: {str(e)}")
+        logging.error(f"Error in multi-recipe cart options: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error creating cart options")
+
+def _walmart_cart_url(product_ids: List[str]) -> str:
+    """Walmart cart URL for a list of product ids"""
+    return f"https://walmart.com/cart?items={','.join(product_ids)}"
+
+class CartOptimizeRequest(BaseModel):
+    user_id: str
+    recipe_id: Optional[str] = None
+    # Options as returned by /grocery/cart-options; looked up for recipe_id when omitted
+    ingredient_options: Optional[List[IngredientOptions]] = None
+    # Defaults to the recipe's budget when it was generated as budget friendly
+    max_budget: Optional[float] = None
+    objective: str = "price"  # price, quality
+
+@api_router.post("/grocery/optimize-cart")
+async def optimize_cart(request: CartOptimizeRequest):
+    """Pick one product per ingredient and return the cart, as generate-cart-url does
+    
+    Objective 'price' picks the cheapest cart; 'quality' the cart with the
+    best total quality whose price stays within max_budget. A product's
+    quality is its search relevance: 1 for the top result, 1/2 for the
+    second, and so on. If even the cheapest cart is over budget, that cart
+    is returned with within_budget false.
+    """
+    if request.objective not in OPTIMIZER_OBJECTIVES:
+        raise HTTPException(status_code=400, detail=f"objective must be one of: {', '.join(OPTIMIZER_OBJECTIVES)}")
+    if request.ingredient_options is None and not request.recipe_id:
+        raise HTTPException(status_code=400, detail="Provide recipe_id or ingredient_options")
+    if request.max_budget is not None and request.max_budget <= 0:
+        raise HTTPException(status_code=400, detail="max_budget must be positive")
+    
+    max_budget = request.max_budget
+    ingredient_options = request.ingredient_options
+    if request.recipe_id:
+        recipe = await db.recipes.find_one({"id": request.recipe_id, "user_id": request.user_id})
+        if not recipe:
+            raise HTTPException(status_code=404, detail="Recipe not found")
+        if max_budget is None and recipe.get('is_budget_friendly'):
+            max_budget = recipe.get('max_budget')
+        if ingredient_options is None:
+            catalog_version = _catalog_version()
+            cart_options = await cart_precompute.get(request.recipe_id, request.user_id, catalog_version)
+            if cart_options is None:
+                cart_options = await _build_cart_options(request.recipe_id, request.user_id, recipe.get('shopping_list', []))
+                await cart_precompute.put(request.recipe_id, catalog_version, cart_options)
+            ingredient_options = [IngredientOptions(**option) for option in cart_options.get('ingredient_options', [])]
+    
+    for ingredient_option in ingredient_options:
+        for product in ingredient_option.options:
+            if not math.isfinite(product.price) or product.price < 0:
+                raise HTTPException(status_code=400, detail=f"Invalid price for product {product.product_id}")
+    
+    # Unavailable products can't go in the cart, and a price of 0 means Walmart had none
+    # for the product; ingredients left without any are reported
+    choosable = []
+    skipped_ingredients = []
+    for ingredient_option in ingredient_options:
+        # Quality follows the product's rank in the search results, skipped products included
+        ranked = [(product, 1.0 / (rank + 1)) for rank, product in enumerate(ingredient_option.options)
+                  if product.available and product.price > 0]
+        if ranked:
+            choosable.append((ingredient_option.ingredient_name, ranked))
+        else:
+            skipped_ingredients.append(ingredient_option.ingredient_name)
+    if not choosable:
+        raise HTTPException(status_code=400, detail="No products to choose from")
+    
+    started = time.perf_counter()
+    selection = cart_optimizer.optimize(
+        [[product.price for product, _ in ranked] for _, ranked in choosable],
+        [[quality for _, quality in ranked] for _, ranked in choosable],
+        max_budget=max_budget,
+        objective=request.objective
+    )
+    took_ms = (time.perf_counter() - started) * 1000
+    
+    selections = [
+        {"ingredient_name": ingredient_name, "product": ranked[choice][0].dict()}
+        for (ingredient_name, ranked), choice in zip(choosable, selection.choices)
+    ]
+    products = [entry["product"] for entry in selections]
+    return {
+        "cart_url": _walmart_cart_url([product["product_id"] for product in products]),
+        "total_price": selection.total_price,
+        "product_count": len(products),
+        "products": products,
+        "selections": selections,
+        "skipped_ingredients": skipped_ingredients,
+        "objective": request.objective,
+        "max_budget": max_budget,
+        "within_budget": selection.within_budget,
+        "total_quality": selection.total_quality,
+        "took_ms": round(took_ms, 3)
+    }
 
 @api_router.post("/grocery/generate-cart-url")
 async def generate_cart_url(cart_data: Dict[str, Any]):
@@ -2492,7 +3305,7 @@ async def generate_cart_url(cart_data: Dict[str, Any]):
             total_price += float(product.get('price', 0))
         
         # Simple cart URL format
-        cart_url = f"https://walmart.com/cart?items={','.join(product_ids)}"
+        cart_url = _walmart_cart_url(product_ids)
         
         return {
             "cart_url": cart_url,
@@ -2531,6 +3344,85 @@ async def delete_starbucks_recipe(recipe_id: str):
 # Include the API router
 app.include_router(api_router)
 
+# Popular selections from the generate_recipe / generate_starbucks_drink branches
+WARM_POOL_RECIPE_SELECTIONS = [
+    ("beverage", "boba tea"),
+    ("beverage", "thai tea"),
+    ("beverage", "special lemonades"),
+    ("snack", "acai bowls"),
+    ("snack", "fruit lemon slices chili"),
+    ("snack", "frozen yogurt berry bites"),
+]
+WARM_POOL_STARBUCKS_DRINKS = ["frappuccino", "refresher", "lemonade", "iced_matcha_latte"]
+
+def _register_warm_pool_selections():
+    """Register the popular selections the warm pool keeps stocked
+    
+    Pool entries are generated with default request settings, so they are
+    only served to requests whose cache key matches exactly.
+    """
+    for recipe_category, cuisine_type in WARM_POOL_RECIPE_SELECTIONS:
+        request = RecipeGenRequest(user_id="warm-pool", recipe_category=recipe_category, cuisine_type=cuisine_type)
+        warm_pool.register(
+            _recipe_cache_key(request),
+            f"{recipe_category}:{cuisine_type}",
+            lambda request=request: _generate_recipe_data(request)
+        )
+    
+    for drink_type in WARM_POOL_STARBUCKS_DRINKS:
+        request = StarbucksRequest(user_id="warm-pool", drink_type=drink_type)
+        warm_pool.register(
+            _starbucks_cache_key(request),
+            f"starbucks:{drink_type}",
+            lambda request=request: _generate_starbucks_data(request)
+        )
+
+_register_warm_pool_selections()
+
+def _register_generation_jobs():
+    """Register the handlers generation job workers run"""
+    generation_jobs.register(
+        "recipe",
+        lambda request: _generate_and_save_recipe(RecipeGenRequest(**request))
+    )
+    generation_jobs.register(
+        "starbucks_drink",
+        lambda request: _generate_and_save_starbucks_drink(StarbucksRequest(**request))
+    )
+    generation_jobs.set_error_detail(_generation_error_detail)
+
+_register_generation_jobs()
+
+@app.on_event("startup")
+async def startup_event():
+    """Create indexes used by the caching layers and start background workers"""
+    await generation_cache.ensure_indexes()
+    await warm_pool.ensure_indexes()
+    await llm_metrics.ensure_indexes()
+    await generation_jobs.ensure_indexes()
+    await recipe_dedup.ensure_indexes()
+    await admission_control.ensure_indexes()
+    await product_search_cache.ensure_indexes()
+    await cart_precompute.ensure_indexes()
+    await recipe_dedup.load()
+    await warm_pool.start()
+    await llm_metrics.start()
+    await generation_jobs.start()
+    await walmart_client.start()
+    product_catalog.load()
+    walmart_signer.load()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers, write out pending metrics and close pooled connections"""
+    await warm_pool.stop()
+    await generation_jobs.stop()
+    await llm_metrics.stop()
+    await cart_precompute.stop()
+    await product_search_cache.stop()
+    await product_catalog.stop()
+    await walmart_client.stop()
+
 # ========================================
 # 🧱 WALMART INTEGRATION V2 - CLEAN REBUILD  
 # Following MCP App Development Blueprint
@@ -2567,6 +3459,33 @@ def get_cache_headers():
 
 # V2 Clean API Client
 async def search_walmart_products_v2(query: str, max_results: int = 3) -> List[WalmartProductV2]:
+    """V2 product search
+    
+    Served from the local product catalog when it has a match (its prices
+    kept current in the background, as for search_walmart_products);
+    otherwise the generated products, through the product search cache.
+    """
+    core_ingredient = _extract_core_ingredient(query)
+    if product_catalog.loaded:
+        matches = product_catalog.search(core_ingredient, limit=min(max_results, 3))
+        product_catalog.schedule_price_refresh(matches, _fetch_walmart_prices)
+        matches = [match for match in matches if match["price"] is not None]
+        if matches:
+            return [WalmartProductV2(
+                id=match["product_id"],
+                name=match["name"],
+                price=match["price"],
+                image_url=match["image_url"],
+                available=True
+            ) for match in matches]
+    
+    async def fetch():
+        return [product.dict() for product in await _search_walmart_products_v2(core_ingredient, max_results)]
+    
+    products = await product_search_cache.get_or_fetch(f"walmart_v2:{max_results}", core_ingredient, fetch)
+    return [WalmartProductV2(**product) for product in products]
+
+async def _search_walmart_products_v2(query: str, max_results: int = 3) -> List[WalmartProductV2]:
     """Phase 3: Clean product search with reliable mock data"""
     try:
         # Generate consistent, realistic products
@@ -0,0 +1,42 @@
+import copy
+import asyncio
+from typing import Dict, Any, Callable, Awaitable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one upstream call.
+
+    The first caller for a key starts the call; callers that arrive while it
+    is still running wait for the same result. Each caller gets its own deep
+    copy so nobody can mutate another caller's data. The shared call runs as
+    its own task, so one caller disconnecting does not cancel it for the rest.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        else:
+            self.followers += 1
+
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight_keys": len(self._calls),
+            "upstream_calls": self.leaders,
+            "coalesced_calls": self.followers
+        }
@@ -0,0 +1,251 @@
+import os
+import re
+import time
+import random
+from typing import Dict, Any, List, Callable, Optional
+
+# Drink categories the generator can build, with how many ingredients of
+# each slot go into a drink: (slot, min, max)
+SLOT_PLANS = {
+    "frappuccino": [("syrup", 1, 2), ("mixer", 0, 1), ("foam", 1, 1), ("topping", 1, 2)],
+    "refresher": [("mixer", 0, 1), ("milk", 0, 1), ("syrup", 0, 1), ("inclusion", 1, 2), ("foam", 0, 1)],
+    "lemonade": [("syrup", 1, 2), ("inclusion", 1, 2), ("foam", 0, 1)],
+    "iced_matcha_latte": [("milk", 1, 1), ("syrup", 1, 1), ("inclusion", 0, 1), ("topping", 0, 1), ("foam", 0, 1)],
+}
+# Syrups are available for every drink; other slots only offer what the
+# curated drinks of the same category use
+SHARED_SLOTS = {"syrup"}
+
+MIN_MODIFICATIONS = 3
+MAX_MODIFICATIONS = 5
+
+# Flavor families that never go in the same drink
+_CLASHES = [
+    ({"mocha", "chocolate", "java", "cookie", "espresso", "coffee"},
+     {"lemon", "lime", "orange", "lemonade", "peach", "pineapple", "passionfruit", "dragonfruit", "mango", "apple"}),
+    ({"pumpkin", "molasses", "maple", "cinnamon", "brown", "peppermint"}, {"lemon", "lime", "orange", "lemonade"}),
+    ({"peppermint"}, {"peach", "pineapple", "pumpkin", "lavender"}),
+]
+# Slots where a drink takes at most one option regardless of the plan
+_EXCLUSIVE_SLOTS = {"milk", "foam"}
+# Refreshers are either a lemonade mix or a creamy milk mix, not both
+_EXCLUSIVE_PAIRS = [("mixer", "milk")]
+
+_WORD = re.compile(r"[a-zé]+")
+_NOT_FLAVOR = {"pump", "pumps", "syrup", "sauce", "inclusions", "freeze", "dried", "purée", "blend",
+               "drizzle", "topping", "powder", "sprinkle", "shot", "chips", "crumble", "cold", "foam",
+               "sweet", "cream", "whipped", "milk", "oat", "sea", "base"}
+_NAME_NOUNS = ["Dream", "Cloud", "Swirl", "Bliss", "Glow", "Crush", "Breeze", "Sparkle", "Fizz", "Chill"]
+_VIBES = [
+    "Like {flavor} daydreams on a lazy afternoon.",
+    "A little {flavor} magic in every sip.",
+    "Sweet {flavor} sunshine you can drink.",
+    "Cozy {flavor} vibes with a dreamy finish.",
+    "{Flavor} sparkle for your main-character moment.",
+]
+_DESCRIPTIONS = {
+    "frappuccino": "A blended {flavor} treat, creamy and frosty with a sweet finish.",
+    "refresher": "A bright, fruity {flavor} refresher that's light and thirst-quenching.",
+    "lemonade": "A zesty {flavor} lemonade, tangy, sweet and perfectly chilled.",
+    "iced_matcha_latte": "Earthy matcha meets {flavor} in a smooth, creamy iced latte.",
+}
+
+
+def _slot(ingredient: str) -> str:
+    """Which part of a drink a curated ingredient line is"""
+    lower = ingredient.lower()
+    if lower.endswith(" base") or lower == "matcha powder":
+        return "base"
+    if "cold foam" in lower or "whipped cream" in lower:
+        return "foam"
+    if "milk" in lower:
+        return "milk"
+    if "syrup" in lower or "sauce" in lower or "purée" in lower:
+        return "syrup"
+    if "inclusions" in lower or "freeze-dried" in lower:
+        return "inclusion"
+    if lower == "lemonade" or "espresso" in lower:
+        return "mixer"
+    return "topping"
+
+
+def _flavor_words(ingredient: str) -> List[str]:
+    return [word for word in _WORD.findall(ingredient.lower()) if word not in _NOT_FLAVOR]
+
+
+def _clashes(words: set, chosen_words: set) -> bool:
+    for first, second in _CLASHES:
+        if (words & first and chosen_words & second) or (words & second and chosen_words & first):
+            return True
+    return False
+
+
+def _lower_first(text: str) -> str:
+    return text[:1].lower() + text[1:] if text else text
+
+
+class LocalDrinkGenerator:
+    """Build Starbucks secret-menu drinks locally from the curated corpus.
+
+    Bases, syrups, foams, toppings and inclusions come from the curated
+    drinks, grouped by the category ``categorize`` assigns to each drink's
+    base. A drink recombines them under simple compatibility rules: the
+    category's slot plan, 3-5 modifications, one milk/foam at most, and no
+    clashing flavor families (no mocha with citrus, ...). No LLM call is
+    made, so a drink takes microseconds instead of seconds.
+
+    ``STARBUCKS_LOCAL_SHARE`` is the share of eligible requests served this
+    way; requests with a flavor inspiration always go to the LLM, since the
+    corpus can't follow a free-form flavor.
+    """
+
+    def __init__(self, load_curated: Callable[[], List[Dict[str, Any]]], categorize: Callable[[str], str],
+                 seed: Optional[int] = None):
+        self.share = float(os.environ.get('STARBUCKS_LOCAL_SHARE', '0.0'))
+        self._random = random.Random(seed)
+        # The corpus is indexed on first use, so the generator can be created before its loader is defined
+        self._load_curated = load_curated
+        self._categorize = categorize
+        self._bases: Optional[Dict[str, List[str]]] = None
+        self._options: Optional[Dict[str, Dict[str, List[str]]]] = None
+
+        self.generated = 0
+        self.total_seconds = 0.0
+
+    @property
+    def bases(self) -> Dict[str, List[str]]:
+        if self._bases is None:
+            self._index()
+        return self._bases
+
+    @property
+    def options(self) -> Dict[str, Dict[str, List[str]]]:
+        if self._options is None:
+            self._index()
+        return self._options
+
+    def _index(self):
+        """Group the curated drinks' ingredients into bases and slot options per category"""
+        bases: Dict[str, List[str]] = {category: [] for category in SLOT_PLANS}
+        options: Dict[str, Dict[str, List[str]]] = {category: {} for category in SLOT_PLANS}
+        shared: Dict[str, List[str]] = {slot: [] for slot in SHARED_SLOTS}
+
+        for recipe in self._load_curated():
+            category = self._categorize(recipe["base"])
+            for ingredient in recipe["ingredients"]:
+                slot = _slot(ingredient)
+                if slot in shared:
+                    shared[slot].append(ingredient)
+                if category not in SLOT_PLANS:
+                    continue
+                if slot == "base" or (category == "lemonade" and ingredient == "Lemonade"):
+                    if ingredient not in bases[category]:
+                        bases[category].append(ingredient)
+                    continue
+                options[category].setdefault(slot, []).append(ingredient)
+
+        for category in SLOT_PLANS:
+            for slot in SHARED_SLOTS:
+                options[category].setdefault(slot, []).extend(shared[slot])
+            # One option per flavor ("2 pumps vanilla syrup" ~ "1 pump vanilla syrup")
+            for slot, pool in options[category].items():
+                unique: Dict[tuple, str] = {}
+                for option in pool:
+                    unique.setdefault((tuple(_flavor_words(option)), _slot(option)), option)
+                options[category][slot] = list(unique.values())
+
+        self._bases, self._options = bases, options
+
+    def supports(self, drink_type: str) -> bool:
+        return bool(self.bases.get(drink_type))
+
+    def should_serve(self, drink_type: str, flavor_inspiration: Optional[str]) -> bool:
+        """Whether this request is served locally instead of by the LLM"""
+        if self.share <= 0 or (flavor_inspiration or "").strip() or not self.supports(drink_type):
+            return False
+        return self.share >= 1 or self._random.random() < self.share
+
+    def generate(self, drink_type: str) -> Dict[str, Any]:
+        """A new drink in the same shape as the LLM's parsed output"""
+        started = time.perf_counter()
+        rng = self._random
+        base = rng.choice(self.bases[drink_type])
+
+        modifications: List[str] = []
+        chosen_words: set = set(_flavor_words(base))
+        used_slots: Dict[str, int] = {}
+        for slot, minimum, maximum in SLOT_PLANS[drink_type]:
+            if any(used_slots.get(other) for pair in _EXCLUSIVE_PAIRS if slot in pair for other in pair if other != slot):
+                continue
+            wanted = rng.randint(minimum, maximum)
+            if slot in _EXCLUSIVE_SLOTS:
+                wanted = min(wanted, 1)
+            candidates = list(self.options[drink_type].get(slot, []))
+            rng.shuffle(candidates)
+            for option in candidates:
+                if used_slots.get(slot, 0) >= wanted or len(modifications) >= MAX_MODIFICATIONS:
+                    break
+                words = set(_flavor_words(option))
+                # Skip clashing flavors and repeats of a flavor already in the drink
+                if _clashes(words, chosen_words) or (words and words <= chosen_words):
+                    continue
+                modifications.append(option)
+                chosen_words |= words
+                used_slots[slot] = used_slots.get(slot, 0) + 1
+
+        # Top up with extra syrups until the drink has enough modifications
+        if len(modifications) < MIN_MODIFICATIONS:
+            for option in rng.sample(self.options[drink_type]["syrup"], len(self.options[drink_type]["syrup"])):
+                if len(modifications) >= MIN_MODIFICATIONS:
+                    break
+                words = set(_flavor_words(option))
+                if option in modifications or _clashes(words, chosen_words) or (words and words <= chosen_words):
+                    continue
+                modifications.append(option)
+                chosen_words |= words
+
+        drink = self._describe(drink_type, base, modifications, rng)
+        self.generated += 1
+        self.total_seconds += time.perf_counter() - started
+        return drink
+
+    def _describe(self, drink_type: str, base: str, modifications: List[str], rng: random.Random) -> Dict[str, Any]:
+        if drink_type == "iced_matcha_latte":
+            base_drink = "Iced Matcha Latte"
+        elif base.endswith(" base"):
+            base_drink = base[:-len(" base")]
+        else:
+            base_drink = base
+
+        flavors = []
+        for option in modifications:
+            for word in _flavor_words(option):
+                if word not in flavors and word not in ("vanilla", "lemonade"):
+                    flavors.append(word)
+        flavors = flavors or ["vanilla"]
+        flavor = " ".join(flavors[:2])
+
+        mods = [_lower_first(option) for option in modifications]
+        if len(mods) > 1:
+            mods_text = f"{', '.join(mods[:-1])}, and {mods[-1]}"
+        else:
+            mods_text = mods[0] if mods else ""
+
+        return {
+            "drink_name": f"{flavor.title()} {rng.choice(_NAME_NOUNS)}",
+            "description": _DESCRIPTIONS[drink_type].format(flavor=flavor),
+            "base_drink": base_drink,
+            "modifications": modifications,
+            "ordering_script": f"Hi, can I get a grande {base_drink} with {mods_text}?",
+            "category": drink_type,
+            "vibe": rng.choice(_VIBES).format(flavor=flavor, Flavor=flavor.title()),
+            "ingredients_breakdown": [base] + modifications
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "share": self.share,
+            "categories": {category: len(bases) for category, bases in self.bases.items()},
+            "generated": self.generated,
+            "avg_microseconds": round(self.total_seconds / self.generated * 1e6, 1) if self.generated else 0.0
+        }
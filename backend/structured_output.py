@@ -0,0 +1,191 @@
+import re
+import json
+import logging
+from typing import Dict, Any, List, Type
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Ask for JSON mode so the model cannot wrap the object in prose
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+_FENCE_PATTERN = re.compile(r"```(?:json|JSON)?")
+
+
+class StructuredOutputError(ValueError):
+    """Raised when model output cannot be turned into a valid payload"""
+
+
+def repair_json(text: str) -> str:
+    """Fix the common defects in model-produced JSON.
+
+    Handles Markdown fences and prose around the object, // and /* */
+    comments, trailing commas, and output truncated mid-value. On truncation
+    everything after the last complete value is dropped (a half-written key,
+    string or number is not trusted) and open arrays/objects are closed.
+    """
+    text = _FENCE_PATTERN.sub("", text)
+    start = text.find("{")
+    if start == -1:
+        raise StructuredOutputError("No JSON object found in model output")
+    text = text[start:]
+
+    out: List[str] = []
+    # One entry per open container: [opener, output length after its last complete value]
+    stack: List[List[Any]] = []
+    expecting_key = False
+    in_string = False
+    string_is_key = False
+    escape = False
+    i = 0
+    n = len(text)
+
+    while i < n:
+        ch = text[i]
+
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if not string_is_key:
+                    stack[-1][1] = len(out)
+            i += 1
+            continue
+
+        if ch == "/" and i + 1 < n and text[i + 1] in "/*":
+            if text[i + 1] == "/":
+                end = text.find("\n", i)
+                i = n if end == -1 else end
+            else:
+                end = text.find("*/", i + 2)
+                i = n if end == -1 else end + 2
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_is_key = stack[-1][0] == "{" and expecting_key
+            expecting_key = False
+            out.append(ch)
+        elif ch in "{[":
+            out.append(ch)
+            stack.append([ch, len(out)])
+            expecting_key = ch == "{"
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            out.append(ch)
+            stack.pop()
+            if not stack:
+                return "".join(out)
+            stack[-1][1] = len(out)
+            expecting_key = False
+        elif ch == ",":
+            end = len(out)
+            while end and out[end - 1] in " \t\r\n":
+                end -= 1
+            if end and out[end - 1] not in ',:[{"}]':
+                # A bare scalar (number, true, null...) just ended; strings and containers mark themselves
+                stack[-1][1] = end
+            expecting_key = stack[-1][0] == "{"
+            out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+
+    # Truncated output: keep complete values only, then close what is open
+    del out[stack[-1][1]:]
+    for opener, _ in reversed(stack):
+        _strip_trailing_comma(out)
+        out.append("}" if opener == "{" else "]")
+
+    return "".join(out)
+
+
+def _strip_trailing_comma(out: List[str]):
+    while out and out[-1] in " \t\r\n":
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+class StructuredOutputParser:
+    """Parse model output into a payload, repairing it locally where possible"""
+
+    def __init__(self):
+        self.clean = 0
+        self.repaired = 0
+        self.requeried = 0
+        self.failed = 0
+
+    def parse(self, content: str) -> Dict[str, Any]:
+        """Parse a JSON object from model output, repairing common defects"""
+        text = content.strip()
+        if text.startswith("```json"):
+            text = text[7:]
+        if text.endswith("```"):
+            text = text[:-3]
+        try:
+            data = json.loads(text)
+            if isinstance(data, dict):
+                self.clean += 1
+                return data
+        except ValueError:
+            pass
+
+        try:
+            data = json.loads(repair_json(content))
+        except ValueError as e:
+            self.failed += 1
+            raise StructuredOutputError(f"Unrepairable model output: {str(e)}")
+        if not isinstance(data, dict):
+            self.failed += 1
+            raise StructuredOutputError("Model output is not a JSON object")
+
+        self.repaired += 1
+        logger.info("Repaired malformed JSON from model output")
+        return data
+
+    @staticmethod
+    def invalid_fields(data: Dict[str, Any], model: Type[BaseModel], context: Dict[str, Any]) -> List[str]:
+        """Names of fields that are missing or invalid for the model
+
+        ``context`` holds the fields the server fills in itself; they override
+        the payload and are never reported.
+        """
+        try:
+            model.model_validate({**data, **context})
+        except ValidationError as e:
+            return sorted({
+                str(error["loc"][0]) for error in e.errors()
+                if error["loc"] and error["loc"][0] not in context
+            })
+        return []
+
+    @staticmethod
+    def missing_fields_messages(data: Dict[str, Any], fields: List[str], system_prompt: str) -> List[Dict[str, str]]:
+        """Follow-up prompt asking the model for only the given fields"""
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": (
+                f"Here is a partially generated JSON object:\n{json.dumps(data, ensure_ascii=False)}\n\n"
+                f"Return ONLY a JSON object with exactly these keys, consistent with the object above: "
+                f"{', '.join(fields)}. Use the same types as a complete object would "
+                f"(numbers for times and calories, lists of strings for lists)."
+            )}
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "clean": self.clean,
+            "repaired": self.repaired,
+            "requeried": self.requeried,
+            "failed": self.failed
+        }
+
+
+# Create global structured output parser instance
+structured_output = StructuredOutputParser()
@@ -0,0 +1,202 @@
+import os
+import time
+import base64
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class WalmartClient:
+    """Shared async HTTP client for the Walmart API.
+
+    One httpx.AsyncClient is opened at startup and closed at shutdown, so
+    lookups reuse keep-alive connections instead of paying a TCP/TLS
+    handshake per ingredient and never block the event loop. HTTP/2 is
+    used when the ``h2`` package is installed. Connect, read, write and
+    pool-wait timeouts are separate, and in-flight requests are capped per
+    host on top of the pool's overall connection limit.
+    """
+
+    def __init__(self):
+        self.max_connections = int(os.environ.get('WALMART_HTTP_MAX_CONNECTIONS', '20'))
+        self.max_keepalive = int(os.environ.get('WALMART_HTTP_MAX_KEEPALIVE', '10'))
+        self.keepalive_expiry = float(os.environ.get('WALMART_HTTP_KEEPALIVE_SECONDS', '30'))
+        self.max_per_host = int(os.environ.get('WALMART_HTTP_MAX_PER_HOST', '10'))
+        self.timeout = httpx.Timeout(
+            connect=float(os.environ.get('WALMART_HTTP_CONNECT_TIMEOUT', '3')),
+            read=float(os.environ.get('WALMART_HTTP_READ_TIMEOUT', '8')),
+            write=float(os.environ.get('WALMART_HTTP_WRITE_TIMEOUT', '5')),
+            pool=float(os.environ.get('WALMART_HTTP_POOL_TIMEOUT', '2'))
+        )
+        self.http2 = os.environ.get('WALMART_HTTP2', 'true').lower() == 'true' and _http2_available()
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use too, for scripts that never run the app's startup
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+        return self._client
+
+    async def start(self):
+        self.client
+        logger.info(f"Walmart HTTP client started (http2={self.http2}, max_connections={self.max_connections})")
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[host]
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None,
+                  params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """GET through the shared pool; raises httpx errors like httpx itself"""
+        self.requests += 1
+        try:
+            async with self._host_limit(url):
+                return await self.client.get(url, headers=headers, params=params)
+        except httpx.TimeoutException:
+            self.timeouts += 1
+            raise
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "open": self._client is not None and not self._client.is_closed,
+            "max_connections": self.max_connections,
+            "max_per_host": self.max_per_host,
+            "timeouts_seconds": {
+                "connect": self.timeout.connect,
+                "read": self.timeout.read,
+                "write": self.timeout.write,
+                "pool": self.timeout.pool
+            },
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts
+        }
+
+
+class WalmartSigner:
+    """Walmart API auth headers, without parsing the key or signing per request.
+
+    The PEM key is parsed once (at startup, or on first use). A signature
+    covers consumer id, timestamp and key version only, so the same signed
+    headers are valid for every request within ``reuse_seconds``; a new
+    one is made after that. RSA signing runs in a worker thread so it
+    doesn't hold up the event loop, and concurrent callers needing a new
+    signature share one.
+    """
+
+    def __init__(self):
+        self.reuse_seconds = float(os.environ.get('WALMART_SIGNATURE_REUSE_SECONDS', '30'))
+
+        self._loaded = False
+        self._private_key = None
+        self._consumer_id: Optional[str] = None
+        self._key_version = '1'
+        self._headers: Optional[Dict[str, str]] = None
+        self._signed_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+        self.signatures = 0
+        self.reused = 0
+
+    def load(self):
+        """Read the credentials and parse the private key"""
+        self._loaded = True
+        self._private_key = None
+        self._headers = None
+        self._consumer_id = os.environ.get('WALMART_CONSUMER_ID')
+        self._key_version = os.environ.get('WALMART_KEY_VERSION', '1')
+        private_key_pem = os.environ.get('WALMART_PRIVATE_KEY')
+        if not all([self._consumer_id, private_key_pem]):
+            logger.warning("Missing Walmart API credentials")
+            return
+        try:
+            self._private_key = serialization.load_pem_private_key(private_key_pem.encode(), password=None)
+        except Exception as e:
+            logger.error(f"Failed to load Walmart private key: {str(e)}")
+
+    def _sign(self, timestamp: str) -> str:
+        message = f"{self._consumer_id}\n{timestamp}\n{self._key_version}\n".encode("utf-8")
+        signature = self._private_key.sign(message, padding.PKCS1v15(), hashes.SHA256())
+        return base64.b64encode(signature).decode("utf-8")
+
+    def _fresh(self) -> bool:
+        return self._headers is not None and time.monotonic() - self._signed_at < self.reuse_seconds
+
+    async def headers(self) -> Optional[Dict[str, str]]:
+        """Signed request headers, or None without usable credentials"""
+        if not self._loaded:
+            self.load()
+        if self._private_key is None:
+            return None
+        if self._fresh():
+            self.reused += 1
+            return dict(self._headers)
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._fresh():
+                self.reused += 1
+                return dict(self._headers)
+            signed_at = time.monotonic()
+            timestamp = str(int(time.time() * 1000))
+            signature = await asyncio.to_thread(self._sign, timestamp)
+            self._headers = {
+                "WM_CONSUMER.ID": self._consumer_id,
+                "WM_CONSUMER.INTIMESTAMP": timestamp,
+                "WM_SEC.KEY_VERSION": self._key_version,
+                "WM_SEC.AUTH_SIGNATURE": signature,
+                "Content-Type": "application/json"
+            }
+            self._signed_at = signed_at
+            self.signatures += 1
+            return dict(self._headers)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "key_loaded": self._private_key is not None,
+            "reuse_seconds": self.reuse_seconds,
+            "signatures": self.signatures,
+            "reused": self.reused
+        }
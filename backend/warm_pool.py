@@ -0,0 +1,204 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Async callable returning the parsed generation and the LLM response it came from
+GenerateFn = Callable[[], Awaitable[Tuple[Dict[str, Any], Any]]]
+
+
+class WarmPool:
+    """Inventory of ready-made generations for popular selections.
+
+    A background worker keeps up to ``target_size`` generations per
+    registered key in Mongo. Requests take one instantly; the worker refills
+    the pool asynchronously, but never spends more than the daily OpenAI
+    budget doing so. The day's spend is kept in a Mongo ledger, one document
+    per day updated with ``$inc``, and read before every generation, so all
+    workers draw on the same budget and a restart doesn't reset it.
+    """
+
+    def __init__(self, collection=None, spend_collection=None):
+        self.collection = collection
+        self.spend_collection = spend_collection
+        self.enabled = os.environ.get('WARM_POOL_ENABLED', 'false').lower() == 'true'
+        self.target_size = int(os.environ.get('WARM_POOL_SIZE', '3'))
+        self.refill_interval = float(os.environ.get('WARM_POOL_REFILL_INTERVAL_SECONDS', '60'))
+        self.daily_budget_usd = float(os.environ.get('WARM_POOL_DAILY_BUDGET_USD', '1.00'))
+        # gpt-3.5-turbo list prices per 1K tokens
+        self.prompt_cost_per_1k = float(os.environ.get('WARM_POOL_PROMPT_COST_PER_1K', '0.0005'))
+        self.completion_cost_per_1k = float(os.environ.get('WARM_POOL_COMPLETION_COST_PER_1K', '0.0015'))
+
+        self._generators: Dict[str, GenerateFn] = {}
+        self._labels: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        # Today's spend and generations across all workers, as last read from the ledger
+        self.budget_day = datetime.utcnow().strftime("%Y-%m-%d")
+        self.spent_usd = 0.0
+        self.generated_today = 0
+        self.served = 0
+        self.empty = 0
+        self.generated = 0
+        self.failures = 0
+
+    def register(self, key: str, label: str, generate: GenerateFn):
+        """Register a popular selection the worker should keep stocked"""
+        self._generators[key] = generate
+        self._labels[key] = label
+
+    def is_registered(self, key: str) -> bool:
+        return key in self._generators
+
+    async def take(self, key: str) -> Optional[Dict[str, Any]]:
+        """Remove and return a ready generation for the key, if one is stocked"""
+        if not self.enabled or key not in self._generators or self.collection is None:
+            return None
+        try:
+            doc = await self.collection.find_one_and_delete({"key": key}, sort=[("created_at", 1)])
+        except Exception as e:
+            logger.error(f"Warm pool read failed: {str(e)}")
+            return None
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if doc is None:
+            self.empty += 1
+            return None
+        self.served += 1
+        return doc["data"]
+
+    async def ensure_indexes(self):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.create_index([("key", 1), ("created_at", 1)])
+            if self.spend_collection is not None:
+                await self.spend_collection.create_index("date", unique=True)
+        except Exception as e:
+            logger.error(f"Failed to create warm pool indexes: {str(e)}")
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Warm pool worker started for {len(self._generators)} selections")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def get_stats(self) -> Dict[str, Any]:
+        stock = {}
+        if self.collection is not None:
+            for key, label in self._labels.items():
+                try:
+                    stock[label] = await self.collection.count_documents({"key": key})
+                except Exception:
+                    stock[label] = None
+        try:
+            await self._load_spend()
+        except Exception as e:
+            logger.error(f"Warm pool spend read failed: {str(e)}")
+        return {
+            "enabled": self.enabled,
+            "target_size": self.target_size,
+            "stock": stock,
+            "served": self.served,
+            "empty": self.empty,
+            "generated": self.generated,
+            "failures": self.failures,
+            "spent_usd_today": round(self.spent_usd, 4),
+            "daily_budget_usd": self.daily_budget_usd
+        }
+
+    # Worker
+
+    async def _load_spend(self):
+        """Read today's spend from the ledger"""
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        if today != self.budget_day:
+            self.budget_day = today
+            self.spent_usd = 0.0
+            self.generated_today = 0
+        if self.spend_collection is None:
+            return
+        doc = await self.spend_collection.find_one({"date": today})
+        if doc is not None:
+            self.spent_usd = doc.get("spent_usd", 0.0)
+            self.generated_today = doc.get("generated", 0)
+
+    async def _record_spend(self, cost: float):
+        """Add one generation's cost to today's ledger"""
+        self.spent_usd += cost
+        self.generated_today += 1
+        if self.spend_collection is None:
+            return
+        await self.spend_collection.update_one(
+            {"date": self.budget_day},
+            {"$inc": {"spent_usd": cost, "generated": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def _budget_remaining(self) -> float:
+        await self._load_spend()
+        return self.daily_budget_usd - self.spent_usd
+
+    def _estimated_cost(self) -> float:
+        # Average of what was spent today; before the first call assume a full completion
+        if self.generated_today:
+            return self.spent_usd / self.generated_today if self.spent_usd else 0.0
+        return self.completion_cost_per_1k
+
+    async def _refill_once(self):
+        for key, generate in self._generators.items():
+            stocked = await self.collection.count_documents({"key": key})
+            while stocked < self.target_size:
+                if await self._budget_remaining() < self._estimated_cost():
+                    logger.info("Warm pool daily budget exhausted, pausing refill")
+                    return
+                try:
+                    data, response = await generate()
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"Warm pool generation failed for {self._labels[key]}: {str(e)}")
+                    break
+
+                await self._record_spend(
+                    getattr(response, 'prompt_tokens', 0) / 1000 * self.prompt_cost_per_1k
+                    + getattr(response, 'completion_tokens', 0) / 1000 * self.completion_cost_per_1k
+                )
+                self.generated += 1
+                await self.collection.insert_one({
+                    "key": key,
+                    "label": self._labels[key],
+                    "data": data,
+                    "created_at": datetime.utcnow()
+                })
+                stocked += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self._refill_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Warm pool refill error: {str(e)}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Cart Optimizer Test Script
+Focus: Budget-constrained carts match a brute-force search, and large budgets don't fail
+"""
+
+import os
+import sys
+import random
+import itertools
+from datetime import datetime
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from cart_optimizer import CartOptimizer
+
+class CartOptimizerTester:
+    def __init__(self):
+        self.optimizer = CartOptimizer()
+
+    def log(self, message: str, level: str = "INFO"):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        print(f"[{timestamp}] {level}: {message}")
+
+    def test_matches_brute_force(self):
+        """Test 1: Best quality within budget equals an exhaustive search on small carts"""
+        self.log("=== Testing Against Brute Force ===")
+        rng = random.Random(25)
+        mismatches = 0
+        for _ in range(200):
+            rows = rng.randint(1, 5)
+            prices = [[round(rng.uniform(0.5, 15), 2) for _ in range(rng.randint(1, 3))] for _ in range(rows)]
+            qualities = [[round(rng.random(), 3) for _ in options] for options in prices]
+            budget = round(rng.uniform(5, 40), 2)
+
+            best = None
+            for choice in itertools.product(*(range(len(options)) for options in prices)):
+                price = sum(prices[row][option] for row, option in enumerate(choice))
+                if price <= budget + 1e-9:
+                    quality = round(sum(qualities[row][option] for row, option in enumerate(choice)), 4)
+                    best = quality if best is None else max(best, quality)
+
+            selection = self.optimizer.optimize(prices, qualities, budget, "quality")
+            if best is not None and (not selection.within_budget or abs(selection.total_quality - best) > 1e-3):
+                mismatches += 1
+                self.log(f"❌ Budget {budget}: quality {selection.total_quality}, expected {best}", "ERROR")
+        if mismatches:
+            return False
+        self.log("✅ 200 random carts match")
+        return True
+
+    def test_coarse_unit_budget(self):
+        """Test 2: A large budget whose rounded-up prices exceed it returns the cheapest cart"""
+        self.log("=== Testing Large Budget Rounding ===")
+        prices = [[9.99, 12.0]] * 29 + [[10.28]]
+        qualities = [[1, 0.5]] * 29 + [[1]]
+        try:
+            selection = self.optimizer.optimize(prices, qualities, 300.0, "quality")
+        except Exception as e:
+            self.log(f"❌ optimize raised {type(e).__name__}: {str(e)}", "ERROR")
+            return False
+        if not selection.within_budget or selection.total_price != 299.99:
+            self.log(f"❌ Expected the $299.99 cart within budget, got ${selection.total_price}", "ERROR")
+            return False
+        self.log(f"✅ ${selection.total_price} cart at a {selection.price_unit} price unit")
+        return True
+
+    def run_all_tests(self):
+        self.log("🚀 Starting Cart Optimizer Tests")
+        test_results = {
+            "brute_force": self.test_matches_brute_force(),
+            "coarse_unit_budget": self.test_coarse_unit_budget()
+        }
+
+        self.log("=" * 60)
+        for test_name, result in test_results.items():
+            status = "✅ PASS" if result else "❌ FAIL"
+            self.log(f"{test_name.upper()}: {status}")
+        return all(test_results.values())
+
+if __name__ == "__main__":
+    success = CartOptimizerTester().run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Ingredient Normalizer Test Script
+Focus: Core ingredient names match the golden corpus, and normalizer throughput
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from ingredient_normalizer import IngredientNormalizer
+
+# Ingredient lines and the core names the original regex chain produced for them
+GOLDEN_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ingredient_normalizer_golden.json')
+
+# Passes over the corpus for the throughput numbers
+ROUNDS = 20
+
+class IngredientNormalizerTester:
+    def __init__(self):
+        with open(GOLDEN_CORPUS, encoding="utf-8") as corpus:
+            self.cases = json.load(corpus)
+
+    def log(self, message: str, level: str = "INFO"):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        print(f"[{timestamp}] {level}: {message}")
+
+    def test_golden_corpus(self):
+        """Test 1: Every corpus line normalizes to its expected core name"""
+        self.log(f"=== Testing Golden Corpus ({len(self.cases)} lines) ===")
+        normalizer = IngredientNormalizer()
+        mismatches = [
+            (case["input"], case["expected"], normalizer.normalize(case["input"]))
+            for case in self.cases
+            if normalizer.normalize(case["input"]) != case["expected"]
+        ]
+        for ingredient, expected, found in mismatches[:10]:
+            self.log(f"❌ {ingredient!r} -> {found!r} (expected {expected!r})", "ERROR")
+        if mismatches:
+            self.log(f"❌ {len(mismatches)} of {len(self.cases)} lines differ", "ERROR")
+            return False
+        self.log("✅ All lines match")
+        return True
+
+    def test_throughput(self):
+        """Test 2: Lines normalized per second, without and with the memo"""
+        self.log("=== Measuring Throughput ===")
+        lines = [case["input"] for case in self.cases] * ROUNDS
+
+        normalizer = IngredientNormalizer(cache_size=0)
+        started = time.perf_counter()
+        for line in lines:
+            normalizer.normalize(line)
+        uncached = len(lines) / (time.perf_counter() - started)
+
+        normalizer = IngredientNormalizer()
+        started = time.perf_counter()
+        for line in lines:
+            normalizer.normalize(line)
+        cached = len(lines) / (time.perf_counter() - started)
+
+        self.log(f"Uncached: {uncached:,.0f} lines/s")
+        self.log(f"Memoized: {cached:,.0f} lines/s (hit ratio {normalizer.get_stats()['hit_ratio']})")
+        return True
+
+    def run_all_tests(self):
+        self.log("🚀 Starting Ingredient Normalizer Tests")
+        test_results = {
+            "golden_corpus": self.test_golden_corpus(),
+            "throughput": self.test_throughput()
+        }
+
+        self.log("=" * 60)
+        for test_name, result in test_results.items():
+            status = "✅ PASS" if result else "❌ FAIL"
+            self.log(f"{test_name.upper()}: {status}")
+        return all(test_results.values())
+
+if __name__ == "__main__":
+    success = IngredientNormalizerTester().run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Product Catalog Test Script
+Focus: Singular and plural product names find each other, and feed items are read as given
+"""
+
+import os
+import sys
+import json
+import math
+import tempfile
+from datetime import datetime
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from product_catalog import ProductCatalog
+
+FEED = [
+    {"itemId": 0, "name": "Chocolate Chip Cookies", "salePrice": 3.48},
+    {"itemId": 101, "name": "Fudge Brownie Mix", "salePrice": 2.12},
+    {"itemId": 102, "name": "Berry Blast Smoothies", "salePrice": 4.98},
+    {"itemId": 103, "name": "Running Shoes", "salePrice": 39.99},
+    {"itemId": 104, "name": "Fresh Strawberry Pack"},
+    {"itemId": 105, "name": "Roma Tomatoes", "salePrice": 1.24},
+    {"name": "Item Without An Id", "salePrice": 1.00}
+]
+
+# Query -> product id it must find first
+EXPECTED_MATCHES = {
+    "cookie": "0",
+    "cookies": "0",
+    "brownie": "101",
+    "brownies": "101",
+    "smoothie": "102",
+    "shoe": "103",
+    "shoes": "103",
+    "strawberries": "104",
+    "strawberry": "104",
+    "tomato": "105",
+    "tomatoes": "105"
+}
+
+class ProductCatalogTester:
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix="product_catalog_test_")
+        self.catalog = None
+        self.meta = None
+
+    def log(self, message: str, level: str = "INFO"):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        print(f"[{timestamp}] {level}: {message}")
+
+    def build_catalog(self):
+        """Test 1: Ingest a small feed and load it"""
+        self.log("=== Building Test Catalog ===")
+        feed_path = os.path.join(self.directory, "feed.jsonl")
+        with open(feed_path, "w", encoding="utf-8") as feed:
+            for item in FEED:
+                feed.write(json.dumps(item) + "\n")
+        self.meta = ProductCatalog.ingest(feed_path, os.path.join(self.directory, "catalog"))
+        self.catalog = ProductCatalog(os.path.join(self.directory, "catalog"))
+        self.catalog.load()
+        self.log(f"Catalog: {self.meta['products']} products, {self.meta['terms']} terms, {self.meta['skipped']} skipped")
+        return self.catalog.loaded
+
+    def test_plural_matching(self):
+        """Test 2: Singular and plural queries find the same product"""
+        self.log("=== Testing Singular/Plural Matching ===")
+        passed = True
+        for query, expected in EXPECTED_MATCHES.items():
+            results = self.catalog.search(query)
+            found = results[0]["product_id"] if results else None
+            if found == expected:
+                self.log(f"✅ '{query}' -> {results[0]['name']}")
+            else:
+                self.log(f"❌ '{query}' -> {found} (expected {expected})", "ERROR")
+                passed = False
+        return passed
+
+    def test_feed_fields(self):
+        """Test 3: Id 0 is kept, items without an id are skipped, missing prices are unknown"""
+        self.log("=== Testing Feed Fields ===")
+        passed = True
+        if self.meta["products"] != len(FEED) - 1 or self.meta["skipped"] != 1:
+            self.log(f"❌ Expected {len(FEED) - 1} products and 1 skipped, got {self.meta}", "ERROR")
+            passed = False
+        unpriced = self.catalog.search("strawberry")[0]
+        if unpriced["price"] is not None:
+            self.log(f"❌ Missing price should be unknown, got {unpriced['price']}", "ERROR")
+            passed = False
+        priced = self.catalog.search("cookies")[0]
+        if not math.isclose(priced["price"], 3.48):
+            self.log(f"❌ Expected price 3.48, got {priced['price']}", "ERROR")
+            passed = False
+        if passed:
+            self.log("✅ Feed fields read as given")
+        return passed
+
+    def run_all_tests(self):
+        self.log("🚀 Starting Product Catalog Tests")
+        test_results = {"build": self.build_catalog()}
+        if test_results["build"]:
+            test_results["plural_matching"] = self.test_plural_matching()
+            test_results["feed_fields"] = self.test_feed_fields()
+
+        self.log("=" * 60)
+        for test_name, result in test_results.items():
+            status = "✅ PASS" if result else "❌ FAIL"
+            self.log(f"{test_name.upper()}: {status}")
+        return all(test_results.values())
+
+if __name__ == "__main__":
+    success = ProductCatalogTester().run_all_tests()
+    sys.exit(0 if success else 1)